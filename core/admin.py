@@ -1,11 +1,20 @@
-from django.contrib import admin
-from django.urls import path
+from django.contrib import admin, messages
+from django.urls import path, reverse
 from django.template.response import TemplateResponse
-from .models import EmotionalEntry
-from django.db.models import Count
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from .models import EmotionalEntry, EmotionDailyStat
+from . import export, rollups
 from django.utils import timezone
+import hashlib
 import json
-from django.core.serializers.json import DjangoJSONEncoder
+
+MAX_STATS_DAYS = 3650
+STATS_CACHE_TIMEOUT = 300
+
 
 @admin.register(EmotionalEntry)
 class EmotionalEntryAdmin(admin.ModelAdmin):
@@ -13,41 +22,113 @@ class EmotionalEntryAdmin(admin.ModelAdmin):
     list_filter = ('emocion_primaria', 'emocion_secundaria', 'fecha', 'respuesta_correcta')
     search_fields = ('texto', 'emocion_primaria', 'emocion_secundaria', 'notas_revision')
     date_hierarchy = 'fecha'
-    readonly_fields = ('fecha',)
+    readonly_fields = ('fecha', 'puntuaciones')
+    actions = ('export_csv', 'export_jsonl', 'export_parquet')
     
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('stats/', self.admin_site.admin_view(self.stats_view), name='emotional-stats'),
+            path('stats/data/', self.admin_site.admin_view(self.stats_data_view), name='emotional-stats-data'),
         ]
         return custom_urls + urls
 
+    def _stats_params(self, request):
+        # Rango en días (?days=365) y agrupación (?granularity=day|week|month)
+        try:
+            days = min(max(int(request.GET.get('days', 30)), 1), MAX_STATS_DAYS)
+        except ValueError:
+            days = 30
+        granularity = request.GET.get('granularity', 'day')
+        if granularity not in rollups.GRANULARITIES:
+            granularity = 'day'
+        return days, granularity
+
     def stats_view(self, request):
-        # Obtener estadísticas
-        stats_data = EmotionalEntry.get_stats_data()
-        
-        # Preparar datos para el gráfico
-        dates = sorted(set(stat['dia'].strftime('%Y-%m-%d') for stat in stats_data))
-        emotions = sorted(set(stat['emocion_primaria'] for stat in stats_data))
-        
-        # Crear diccionario de datos
-        data_dict = {date: {emotion: 0 for emotion in emotions} for date in dates}
-        for stat in stats_data:
-            date = stat['dia'].strftime('%Y-%m-%d')
-            data_dict[date][stat['emocion_primaria']] = stat['total']
-        
+        # La página solo dibuja el gráfico; los datos llegan desde stats_data_view
+        days, granularity = self._stats_params(request)
         context = {
-            'stats_data': stats_data,
-            'dates_json': json.dumps(dates, cls=DjangoJSONEncoder),
-            'emotions_json': json.dumps(list(emotions), cls=DjangoJSONEncoder),
-            'data_json': json.dumps(data_dict, cls=DjangoJSONEncoder),
+            'days': days,
+            'granularity': granularity,
+            'data_url': f"{reverse('admin:emotional-stats-data')}?{urlencode({'days': days, 'granularity': granularity})}",
             'title': 'Estadísticas Emocionales',
             'opts': self.model._meta,
         }
         
         return TemplateResponse(request, 'admin/emotional_stats.html', context)
 
+    def stats_data_view(self, request):
+        """
+        Matriz emoción x periodo en JSON columnar. Usa ETag/Last-Modified según la
+        última entrada y la última revisión del resumen diario, responde 304 si no
+        hay cambios y guarda el cuerpo en caché del servidor.
+        """
+        days, granularity = self._stats_params(request)
+
+        newest_entry = EmotionalEntry.objects.aggregate(ultima=Max('fecha'))['ultima']
+        newest_review = EmotionDailyStat.objects.aggregate(ultima=Max('actualizado'))['ultima']
+        last_modified = max(filter(None, [newest_entry, newest_review]), default=None)
+        # El día forma parte de la huella: el rango se desplaza aunque no haya cambios
+        version = f"{days}:{granularity}:{timezone.localdate()}:{last_modified.timestamp() if last_modified else 0}"
+        digest = hashlib.sha1(version.encode()).hexdigest()[:16]
+        etag = f'"{digest}"'
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if response is None:
+            cache_key = f"stats:data:{digest}"
+            body = cache.get(cache_key)
+            if body is None:
+                periods, emotions, series = rollups.get_series(days, granularity)
+                body = json.dumps({
+                    'granularity': granularity,
+                    'days': days,
+                    'periods': periods,
+                    'emotions': emotions,
+                    'series': series,
+                }, separators=(',', ':'))
+                cache.set(cache_key, body, STATS_CACHE_TIMEOUT)
+            response = HttpResponse(body, content_type='application/json')
+
+        response['ETag'] = etag
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+        # Datos de admin: que el navegador revalide siempre con el ETag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def _export(self, request, queryset, fmt):
+        # La selección ya lleva los filtros del listado (fecha, emoción, revisión)
+        try:
+            return export.streaming_response(queryset, fmt)
+        except ImportError:
+            # Sin respuesta el admin vuelve al listado y muestra el mensaje
+            messages.error(
+                request, "La exportación a Parquet requiere pyarrow (pip install -r requirements-optional.txt)"
+            )
+            return None
+
+    @admin.action(description='Exportar seleccionadas a CSV')
+    def export_csv(self, request, queryset):
+        return self._export(request, queryset, 'csv')
+
+    @admin.action(description='Exportar seleccionadas a JSONL')
+    def export_jsonl(self, request, queryset):
+        return self._export(request, queryset, 'jsonl')
+
+    @admin.action(description='Exportar seleccionadas a Parquet')
+    def export_parquet(self, request, queryset):
+        return self._export(request, queryset, 'parquet')
+
     def changelist_view(self, request, extra_context=None):
         extra_context = extra_context or {}
         extra_context['show_stats_link'] = True
         return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(EmotionDailyStat)
+class EmotionDailyStatAdmin(admin.ModelAdmin):
+    list_display = ('dia', 'emocion', 'total', 'correctas', 'actualizado')
+    list_filter = ('emocion',)
+    date_hierarchy = 'dia'
+    readonly_fields = ('dia', 'emocion', 'total', 'correctas', 'actualizado')
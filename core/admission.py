@@ -0,0 +1,189 @@
+"""
+Control de admisión para la inferencia del modelo.
+
+Como mucho ``EMOTION_MAX_CONCURRENCY`` pasadas del modelo se ejecutan a la vez
+en cada proceso. La plaza se toma alrededor de ``backend.predict`` (en el hilo
+del micro-batcher o en la llamada directa), así que un lote completo ocupa una
+sola plaza y las peticiones concurrentes siguen agrupándose en el batcher. Las
+demás pasadas esperan en una cola de ``EMOTION_ADMISSION_QUEUE`` plazas durante
+un máximo de ``EMOTION_ADMISSION_WAIT_MS``; si la cola está llena o vence el
+plazo se lanza ``Overloaded`` a cada petición del lote y la vista aplica
+``EMOTION_OVERLOAD_POLICY``: ``"fallback"`` (análisis por palabras clave) o
+``"reject"`` (503 inmediato). Así la latencia de cola queda acotada aunque
+llegue más tráfico del que cabe.
+
+Con el micro-batcher las peticiones no llegan a esta cola: esperan en la del
+batcher, que se limita al encolar con los mismos ajustes (``EMOTION_ADMISSION_QUEUE``
+lotes y ``EMOTION_ADMISSION_WAIT_MS`` hasta que empieza el lote del texto).
+
+``thread_budget`` reparte los núcleos entre los workers del servidor
+(``WEB_CONCURRENCY``) para que los hilos intra-op de torch y de ONNX Runtime
+no compitan entre sí; ``apply_thread_budget`` lo aplica a torch y el backend
+ONNX lo recibe al crear la sesión. El servidor de modelo es un solo proceso
+para todos los workers y usa ``server_thread_budget``: todos los núcleos.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """No hay capacidad de inferencia disponible a tiempo."""
+
+
+class AdmissionController:
+    """Semáforo con cola de espera acotada y plazo máximo de espera."""
+
+    def __init__(self, max_concurrency=2, max_queue=16, max_wait_ms=200, name="inference"):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000.0)
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+        # Estadísticas
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    @contextmanager
+    def admit(self):
+        """Ocupa una plaza durante el bloque o lanza ``Overloaded``."""
+        self._acquire()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify()
+
+    def _acquire(self):
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                self._admitted += 1
+                return
+
+            if self._waiting >= self.max_queue:
+                self._rejected_queue_full += 1
+                raise Overloaded(f"Cola de {self.name} llena ({self.max_queue} en espera)")
+
+            start = time.monotonic()
+            deadline = start + self.max_wait
+            self._waiting += 1
+            try:
+                while self._active >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected_timeout += 1
+                        raise Overloaded(f"Sin plaza de {self.name} tras {self.max_wait * 1000:.0f} ms")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._active += 1
+            self._admitted += 1
+            self._total_wait += waited
+            self._max_wait_seen = max(self._max_wait_seen, waited)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "avg_wait_ms": (self._total_wait / self._admitted * 1000.0) if self._admitted else 0.0,
+                "max_wait_seen_ms": self._max_wait_seen * 1000.0,
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """Controlador de admisión del proceso, o None si está desactivado."""
+    global _controller
+    if not getattr(settings, "EMOTION_ADMISSION_CONTROL", True):
+        return None
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                max_concurrency=getattr(settings, "EMOTION_MAX_CONCURRENCY", 2),
+                max_queue=getattr(settings, "EMOTION_ADMISSION_QUEUE", 16),
+                max_wait_ms=getattr(settings, "EMOTION_ADMISSION_WAIT_MS", 200),
+            )
+        return _controller
+
+
+@contextmanager
+def admit():
+    """``get_controller().admit()``, o nada si el control está desactivado."""
+    controller = get_controller()
+    if controller is None:
+        yield
+        return
+    with controller.admit():
+        yield
+
+
+def overload_policy():
+    return getattr(settings, "EMOTION_OVERLOAD_POLICY", "fallback")
+
+
+def available_cpus():
+    """Núcleos en los que puede ejecutarse el proceso (respeta taskset), no los de la máquina."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def thread_budget(cpu_count=None, workers=None):
+    """Hilos de cómputo por worker: los núcleos repartidos entre los workers (mínimo 1)."""
+    configured = getattr(settings, "EMOTION_TORCH_THREADS", 0)
+    if configured:
+        return configured
+    if cpu_count is None:
+        cpu_count = available_cpus()
+    workers = workers or getattr(settings, "WEB_CONCURRENCY", 1)
+    return max(1, (cpu_count or 1) // max(1, workers))
+
+
+def server_thread_budget():
+    """Hilos de cómputo del servidor de modelo: ``EMOTION_SERVER_THREADS`` o todos los núcleos."""
+    return getattr(settings, "EMOTION_SERVER_THREADS", 0) or available_cpus()
+
+
+def apply_thread_budget(backend, threads=None):
+    """Limita los hilos de torch del backend PyTorch a ``threads`` o al presupuesto del worker."""
+    if backend.name != "pytorch":
+        return None
+    import torch
+
+    threads = threads or thread_budget()
+    torch.set_num_threads(threads)
+    try:
+        # El paralelismo entre operadores no ayuda con un modelo pequeño y solo compite por CPU
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Solo se puede fijar antes del primer uso en paralelo
+        pass
+    logger.info(f"torch limitado a {threads} hilos por worker")
+    return threads
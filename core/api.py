@@ -0,0 +1,128 @@
+"""
+API JSON de análisis por lotes.
+
+``POST /api/analyze/`` con ``{"texts": ["...", ...], "recommendations": false}``
+valida cada texto, clasifica todos los válidos en una sola llamada al modelo,
+guarda las entradas con ``bulk_create`` y devuelve un resultado por texto, en
+el mismo orden.
+
+``GET /api/recommendations/?emotion=joy&secondary=sadness`` devuelve la
+canción y el libro de un par de emociones. La página de ``mood_match`` lo pide
+tras mostrar el análisis cuando ``MOODMATCH_DEFERRED_RECOMMENDATIONS`` está
+activo, así Spotify no retrasa el resultado principal.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import metrics
+from .admission import Overloaded
+from .models import EmotionalEntry
+from .spotify import get_spotify_client
+from .track_pool import SEARCH_TERMS
+from .views import (
+    DEFAULT_SONG,
+    get_book_recommendation,
+    get_emotions,
+    get_spotify_recommendations,
+    validate_text,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+@csrf_exempt
+@require_POST
+def analyze_api(request):
+    try:
+        payload = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return _error("El cuerpo debe ser JSON válido")
+
+    texts = payload.get("texts") if isinstance(payload, dict) else None
+    if not isinstance(texts, list) or not texts:
+        return _error("'texts' debe ser una lista no vacía de textos")
+
+    max_texts = getattr(settings, "EMOTION_API_MAX_TEXTS", 100)
+    if len(texts) > max_texts:
+        return _error(f"Se admiten como máximo {max_texts} textos por petición", status=413)
+
+    results = [None] * len(texts)
+    valid = []
+    for i, text in enumerate(texts):
+        try:
+            if not isinstance(text, str):
+                raise ValidationError("El texto debe ser una cadena")
+            valid.append((i, validate_text(text)))
+        except ValidationError as e:
+            results[i] = {"error": e.messages[0]}
+
+    try:
+        emotions = get_emotions([text for _, text in valid])
+    except Overloaded:
+        response = _error("Servicio saturado, inténtelo de nuevo en unos segundos", status=503)
+        response["Retry-After"] = "5"
+        return response
+
+    EmotionalEntry.objects.bulk_create([
+        EmotionalEntry(
+            texto=text,
+            emocion_primaria=primary_emotion,
+            emocion_secundaria=secondary_emotion,
+            puntuaciones=scores,
+        )
+        for (_, text), (primary_emotion, secondary_emotion, scores) in zip(valid, emotions)
+    ])
+
+    sp = None
+    with_recommendations = bool(payload.get("recommendations"))
+    if with_recommendations:
+        try:
+            sp = get_spotify_client()
+        except ValueError as e:
+            logger.error(f"Error de configuración: {str(e)}")
+
+    for (i, text), (primary_emotion, secondary_emotion, scores) in zip(valid, emotions):
+        item = {
+            "texto": text,
+            "emotion": primary_emotion,
+            "secondary_emotion": secondary_emotion,
+            "scores": scores,
+            "is_fallback": scores is None,
+        }
+        if with_recommendations:
+            item["song"] = (
+                get_spotify_recommendations(primary_emotion, secondary_emotion, sp)
+                if sp is not None else dict(DEFAULT_SONG)
+            )
+            item["book"] = get_book_recommendation(primary_emotion, secondary_emotion)
+        results[i] = item
+
+    return JsonResponse({"results": results})
+
+
+@require_GET
+def recommendations_api(request):
+    emotion = request.GET.get("emotion", "")
+    secondary_emotion = request.GET.get("secondary") or None
+    if emotion not in SEARCH_TERMS or (secondary_emotion is not None and secondary_emotion not in SEARCH_TERMS):
+        return _error("Emoción desconocida")
+
+    try:
+        sp = get_spotify_client()
+    except ValueError as e:
+        logger.error(f"Error de configuración: {str(e)}")
+        sp = None
+    song = get_spotify_recommendations(emotion, secondary_emotion, sp) if sp is not None else dict(DEFAULT_SONG)
+    with metrics.timed("libro"):
+        book = get_book_recommendation(emotion, secondary_emotion)
+    return JsonResponse({"song": song, "book": book})
@@ -1,6 +1,27 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def is_autoreloader_parent():
+    """Proceso padre de ``runserver`` con autorecarga: solo vigila ficheros, no atiende peticiones."""
+    return (
+        sys.argv[1:2] == ["runserver"]
+        and "--noreload" not in sys.argv
+        and os.environ.get("RUN_MAIN") != "true"
+    )
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Precargar el modelo antes de que el worker acepte tráfico
+        if getattr(settings, "EMOTION_WARMUP_ON_STARTUP", False) and not is_autoreloader_parent():
+            from .inference import get_engine
+            get_engine().warmup()
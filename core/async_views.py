@@ -0,0 +1,156 @@
+"""
+Variante asíncrona de ``mood_match`` para despliegues ASGI.
+
+Tras la clasificación, que se ejecuta en un pool de hilos acotado, las etapas
+independientes (guardado + tendencia, canción y libro) se lanzan a la vez, cada
+una con su propio timeout. La latencia total queda cerca de la etapa más lenta
+en lugar de la suma de todas. Con ``MOODMATCH_DEFERRED_RECOMMENDATIONS`` solo
+se espera al guardado y la tendencia; canción y libro los pide la página.
+"""
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.shortcuts import render
+
+from . import metrics
+from .admission import Overloaded
+from .spotify import get_spotify_client
+from .views import (
+    DEFAULT_SONG,
+    fallback_emotion_analysis,
+    get_book_recommendation,
+    get_emotion,
+    get_psychological_advice,
+    get_spotify_recommendations,
+    overloaded_response,
+    save_entry_and_get_trend,
+    validate_text,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pool acotado para la inferencia: limita cuántas pasadas del modelo compiten por CPU
+_inference_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "EMOTION_INFERENCE_WORKERS", 2),
+    thread_name_prefix="emotion-inference",
+)
+
+
+async def run_stage(name, awaitable, timeout, default=None):
+    """Espera una etapa con timeout; si falla o tarda demasiado devuelve ``default``."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except Overloaded:
+        # Con EMOTION_OVERLOAD_POLICY="reject" la vista responde 503
+        raise
+    except asyncio.TimeoutError:
+        logger.warning(f"Etapa '{name}' superó el timeout de {timeout} s")
+    except Exception:
+        logger.exception(f"Error en la etapa '{name}'")
+    return default
+
+
+def _recommend_song(primary_emotion, secondary_emotion):
+    try:
+        sp = get_spotify_client()
+    except ValueError as e:
+        logger.error(f"Error de configuración: {str(e)}")
+        return dict(DEFAULT_SONG)
+    return get_spotify_recommendations(primary_emotion, secondary_emotion, sp)
+
+
+async def classify(texto):
+    """Clasificación en el pool de inferencia; si no responde a tiempo se usa el fallback."""
+    loop = asyncio.get_running_loop()
+    result = await run_stage(
+        "inferencia",
+        # Copiar el contexto para que las etapas medidas se atribuyan a esta petición
+        loop.run_in_executor(_inference_executor, contextvars.copy_context().run, get_emotion, texto),
+        getattr(settings, "MOODMATCH_INFERENCE_TIMEOUT", 5.0),
+    )
+    if result is None:
+        primary_emotion, secondary_emotion = fallback_emotion_analysis(texto)
+        return primary_emotion, secondary_emotion, None
+    return result
+
+
+async def mood_match_async(request):
+    # Inicializar contexto vacío para peticiones GET
+    if request.method == "GET":
+        return await sync_to_async(render)(request, "core/moodmatch.html", {})
+
+    context = {}
+
+    if request.method == "POST":
+        texto = request.POST.get("texto", "").strip()
+
+        try:
+            texto = validate_text(texto)
+            with metrics.timed("clasificacion"):
+                primary_emotion, secondary_emotion, scores = await classify(texto)
+            context["is_fallback"] = scores is None
+
+            db_timeout = getattr(settings, "MOODMATCH_DB_TIMEOUT", 3.0)
+            recommendation_timeout = getattr(settings, "MOODMATCH_RECOMMENDATION_TIMEOUT", 3.0)
+
+            deferred = getattr(settings, "MOODMATCH_DEFERRED_RECOMMENDATIONS", True)
+            stages = [
+                run_stage(
+                    "guardado y tendencia",
+                    sync_to_async(save_entry_and_get_trend)(
+                        texto, primary_emotion, secondary_emotion, scores
+                    ),
+                    db_timeout,
+                ),
+            ]
+            if not deferred:
+                stages += [
+                    run_stage(
+                        "canción",
+                        sync_to_async(_recommend_song, thread_sensitive=False)(
+                            primary_emotion, secondary_emotion
+                        ),
+                        recommendation_timeout,
+                        default=dict(DEFAULT_SONG),
+                    ),
+                    run_stage(
+                        "libro",
+                        sync_to_async(get_book_recommendation, thread_sensitive=False)(
+                            primary_emotion, secondary_emotion
+                        ),
+                        recommendation_timeout,
+                    ),
+                ]
+
+            # Etapas independientes en paralelo
+            trend_message, *recommendations = await asyncio.gather(*stages)
+
+            if trend_message:
+                context["trend_message"] = trend_message
+            context["advice"] = get_psychological_advice(primary_emotion)
+            if deferred:
+                # La página pide canción y libro a /api/recommendations/ tras mostrar el análisis
+                context["deferred_recommendations"] = True
+            else:
+                context["song"], context["book"] = recommendations
+
+            context["emotion"] = primary_emotion
+            context["secondary_emotion"] = secondary_emotion
+            context["success"] = True
+
+        except ValidationError as e:
+            logger.warning(f"Error de validación: {str(e)}")
+            context["error"] = str(e)
+        except Overloaded:
+            return await sync_to_async(overloaded_response)(request)
+        except Exception:
+            logger.exception("Error inesperado")
+            context["error"] = "Lo sentimos, ha ocurrido un error inesperado"
+
+    with metrics.timed("plantilla"):
+        return await sync_to_async(render)(request, "core/moodmatch.html", context)
@@ -0,0 +1,179 @@
+"""
+Backends intercambiables para el clasificador de emociones.
+
+Todos los backends exponen ``predict(texts)``, que recibe una lista de textos y
+devuelve, para cada uno, la distribución completa de etiquetas como una lista
+de diccionarios ``{"label": ..., "score": ...}`` ordenada de mayor a menor
+probabilidad (el mismo formato que el pipeline de transformers con
+``top_k=None``).
+
+El backend se elige con el setting ``EMOTION_BACKEND``:
+
+- ``"pytorch"``: pipeline de transformers en fp32 sobre CPU (por defecto).
+- ``"onnx"``: modelo exportado con ``manage.py export_onnx_model`` y servido
+  con ONNX Runtime, opcionalmente cuantizado a int8. Requiere ``onnxruntime``
+  y ``numpy`` (``requirements-optional.txt``).
+- ``"remote"``: cliente del servidor local de inferencia
+  (``manage.py runmodelserver``), que carga a su vez el backend indicado en
+  ``EMOTION_SERVER_BACKEND``.
+- Una ruta de clase (``"paquete.modulo.Clase"``) para backends propios, como
+  el clasificador determinista de los benchmarks.
+"""
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .admission import thread_budget
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "pysentimiento/robertuito-emotion-analysis"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model.int8.onnx"
+MAX_LENGTH = 128
+
+
+class PipelineBackend:
+    """Pipeline de transformers con PyTorch en CPU."""
+
+    name = "pytorch"
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
+        from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+
+        self.model_name = model_name
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.pipeline = pipeline(
+            "text-classification",
+            model=model,
+            tokenizer=tokenizer,
+            device="cpu"  # Forzar CPU para evitar errores de CUDA
+        )
+
+    @property
+    def version(self):
+        return f"{self.name}:{self.model_name}"
+
+    def predict(self, texts):
+        return self.pipeline(list(texts), batch_size=len(texts), truncation=True, top_k=None)
+
+
+class OnnxBackend:
+    """Modelo exportado a ONNX servido con ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, model_dir, quantized=False, num_threads=0):
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self._np = np
+        self.model_dir = str(model_dir)
+        self.quantized = quantized
+        model_file = ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        model_path = os.path.join(self.model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"No existe {model_path}. Ejecute 'manage.py export_onnx_model' primero."
+            )
+
+        with open(os.path.join(self.model_dir, "config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        self.id2label = {int(i): label for i, label in config["id2label"].items()}
+        self.model_name = config.get("_name_or_path", self.model_dir)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+    @property
+    def version(self):
+        precision = "int8" if self.quantized else "fp32"
+        return f"{self.name}-{precision}:{self.model_name}"
+
+    def predict(self, texts):
+        np = self._np
+        encoded = self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np"
+        )
+        inputs = {
+            name: value.astype(np.int64)
+            for name, value in encoded.items()
+            if name in self.input_names
+        }
+        logits = self.session.run(None, inputs)[0]
+
+        # Softmax estable numéricamente
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        results = []
+        for row in probs:
+            order = row.argsort()[::-1]
+            results.append([
+                {"label": self.id2label[int(i)], "score": float(row[i])} for i in order
+            ])
+        return results
+
+
+class RemoteBackend:
+    """Cliente ligero del servidor de inferencia sobre socket Unix."""
+
+    name = "remote"
+
+    def __init__(self, socket_path, timeout=2.0, server_backend="pytorch", model_name=DEFAULT_MODEL_NAME):
+        from .model_server import ModelServerClient
+
+        self.client = ModelServerClient(socket_path, timeout=timeout)
+        self.server_backend = server_backend
+        self.model_name = model_name
+
+    @property
+    def version(self):
+        # El servidor usa la misma configuración, así que no hace falta consultarlo
+        return f"{self.name}-{self.server_backend}:{self.model_name}"
+
+    def predict(self, texts):
+        return self.client.classify(texts)
+
+
+def load_backend(name=None, num_threads=None):
+    """
+    Crea el backend configurado en ``EMOTION_BACKEND`` (o el indicado).
+    ``num_threads`` sustituye a ``EMOTION_ONNX_THREADS`` en el backend ONNX; si
+    ninguno está fijado se usa el presupuesto de hilos del worker.
+    """
+    name = name or getattr(settings, "EMOTION_BACKEND", "pytorch")
+    model_name = getattr(settings, "EMOTION_MODEL_NAME", DEFAULT_MODEL_NAME)
+
+    if name == "pytorch":
+        return PipelineBackend(model_name)
+    if name == "onnx":
+        return OnnxBackend(
+            getattr(settings, "EMOTION_ONNX_MODEL_DIR"),
+            quantized=getattr(settings, "EMOTION_ONNX_QUANTIZED", False),
+            num_threads=num_threads or getattr(settings, "EMOTION_ONNX_THREADS", 0) or thread_budget(),
+        )
+    if name == "remote":
+        return RemoteBackend(
+            getattr(settings, "EMOTION_SERVER_SOCKET"),
+            timeout=getattr(settings, "EMOTION_SERVER_TIMEOUT", 2.0),
+            server_backend=getattr(settings, "EMOTION_SERVER_BACKEND", "pytorch"),
+            model_name=model_name,
+        )
+    if "." in name:
+        # Backend propio indicado por su ruta (p. ej. core.benchmarks.stub.StubBackend)
+        return import_string(name)()
+    raise ValueError(f"Backend de emociones desconocido: {name}")
@@ -0,0 +1,196 @@
+"""
+Planificador de micro-lotes para la inferencia del modelo de emociones.
+
+Las peticiones concurrentes a ``get_emotion`` se encolan y un hilo de fondo
+las agrupa durante una ventana corta (o hasta llenar el lote) para ejecutar
+una sola pasada del modelo con padding, devolviendo a cada llamador su
+resultado.
+
+Con ``max_queue`` y ``max_queue_wait_ms`` la cola queda acotada: si no caben
+los textos, o su lote no empieza dentro del plazo, se retiran de la cola y se
+lanza ``Overloaded`` al llamador, igual que en el control de admisión.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from .admission import Overloaded
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas concurrentes en lotes para ``predict_batch``.
+
+    ``predict_batch`` recibe una lista de textos y debe devolver una lista de
+    resultados del mismo tamaño y en el mismo orden. ``max_queue`` (textos en
+    espera, 0 sin límite) y ``max_queue_wait_ms`` (None sin plazo) acotan la cola.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=8, max_wait_ms=10, name="emotion",
+                 max_queue=0, max_queue_wait_ms=None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000.0)
+        self.name = name
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_wait = None if max_queue_wait_ms is None else max(0.0, float(max_queue_wait_ms) / 1000.0)
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._pid = None
+
+        # Estadísticas
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+        self._total_queue_wait = 0.0
+        self._max_queue_wait = 0.0
+        self._batch_sizes = Counter()
+
+    def submit(self, text, timeout=None):
+        """Encola un texto y espera su resultado."""
+        return self.submit_many([text], timeout=timeout)[0]
+
+    def submit_many(self, texts, timeout=None):
+        """
+        Encola varios textos y espera todos sus resultados (en orden). Lanza
+        ``Overloaded`` si la cola está llena o el lote no empieza a tiempo.
+        """
+        futures = []
+        enqueued_at = time.monotonic()
+        with self._cond:
+            if self.max_queue and len(self._queue) + len(texts) > self.max_queue:
+                with self._stats_lock:
+                    self._rejected_queue_full += 1
+                raise Overloaded(f"Cola del batcher {self.name} llena ({len(self._queue)} textos en espera)")
+            self._ensure_worker()
+            for text in texts:
+                future = Future()
+                self._queue.append((text, future, enqueued_at))
+                futures.append(future)
+            self._cond.notify()
+
+        if self.max_queue_wait is None:
+            return [future.result(timeout=timeout) for future in futures]
+
+        deadline = enqueued_at + self.max_queue_wait
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeout:
+                if not future.cancel():
+                    # Su lote ya está en marcha: la pasada está acotada y se espera
+                    results.append(future.result(timeout=timeout))
+                    continue
+                self._withdraw(futures)
+                raise Overloaded(f"El lote de {self.name} no empezó en {self.max_queue_wait * 1000:.0f} ms")
+        return results
+
+    def _withdraw(self, futures):
+        """Cancela los textos de una llamada que aún no están en un lote y los saca de la cola."""
+        for future in futures:
+            future.cancel()
+        with self._cond:
+            self._queue = deque(item for item in self._queue if not item[1].cancelled())
+        with self._stats_lock:
+            self._rejected_timeout += 1
+
+    def stats(self):
+        """Devuelve estadísticas de tamaño de lote y espera en cola."""
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "batches": batches,
+                "items": items,
+                "errors": self._errors,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+                "queue_depth": len(self._queue),
+                "avg_batch_size": items / batches if batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "avg_queue_wait_ms": (self._total_queue_wait / items * 1000.0) if items else 0.0,
+                "max_queue_wait_ms": self._max_queue_wait * 1000.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            }
+
+    def _ensure_worker(self):
+        # Se llama con self._cond tomado. Tras un fork (gunicorn --preload)
+        # el hilo del proceso padre no existe en el hijo, así que se recrea.
+        if self._worker is not None and self._worker.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._worker = threading.Thread(
+            target=self._run, name=f"microbatcher-{self.name}", daemon=True
+        )
+        self._worker.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            # Esperar hasta completar el lote o agotar la ventana del primero
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._queue and len(batch) < self.max_batch_size:
+                item = self._queue.popleft()
+                # Los textos retirados por plazo se descartan
+                if item[1].set_running_or_notify_cancel():
+                    batch.append(item)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            texts = [text for text, _, _ in batch]
+
+            try:
+                results = self.predict_batch(texts)
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"predict_batch devolvió {len(results)} resultados para {len(batch)} textos"
+                    )
+            except Exception as e:
+                logger.error(f"Error en lote de inferencia ({len(batch)} textos): {str(e)}")
+                with self._stats_lock:
+                    self._errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+            waits = [started - enqueued_at for _, _, enqueued_at in batch]
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._total_queue_wait += sum(waits)
+                self._max_queue_wait = max(self._max_queue_wait, max(waits))
+
+            logger.debug(
+                f"Lote {self.name}: {len(batch)} textos, espera máx {max(waits) * 1000:.1f} ms, "
+                f"inferencia {(time.monotonic() - started) * 1000:.1f} ms"
+            )
@@ -0,0 +1,59 @@
+"""
+Benchmarks de rendimiento (``manage.py benchmark``).
+
+- ``load``: lanza peticiones concurrentes contra ``mood_match`` y la API de
+  análisis por lotes, con un servidor HTTP local que imita Spotify
+  (``fake_spotify``) y un clasificador determinista (``stub``), o con el
+  modelo real.
+- ``micro``: mide ``fallback_emotion_analysis``, la tendencia emocional y los
+  datos de estadísticas del admin sobre tablas sembradas de 10k a 1M filas.
+
+Todo se ejecuta en una base de datos de prueba desechable y los resultados se
+guardan en JSON para comparar entre ramas.
+"""
+import math
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+
+def summarize(samples_ms):
+    """Media, percentiles y máximo de una lista de duraciones en milisegundos."""
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(q):
+        # Rango más cercano
+        return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": ordered[-1],
+    }
+
+
+def environment():
+    """Datos para saber con qué se obtuvieron los resultados."""
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
@@ -0,0 +1,113 @@
+"""
+Servidor HTTP local que imita los endpoints de Spotify que usa la app:
+``POST /api/token`` (client credentials) y ``GET /v1/search``.
+
+Las respuestas son deterministas para cada término de búsqueda y se puede
+añadir una latencia fija para aproximarse a la red real. Con ``search_status``
+las búsquedas responden con ese error (p. ej. 429 con ``Retry-After``) y con
+``token_status``, las peticiones de token.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_tracks(query, limit):
+    seed = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+    return [
+        {
+            "id": f"{seed}{i:04d}",
+            "name": f"Canción {seed} {i}",
+            "artists": [{"name": f"Artista {i % 7}"}],
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{seed}{i:04d}"},
+            "preview_url": f"https://p.scdn.co/mp3-preview/{seed}{i:04d}" if i % 3 else None,
+        }
+        for i in range(limit)
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self._delay()
+        if urlparse(self.path).path == "/api/token":
+            self.server.count("token")
+            if self.server.token_status:
+                self._send(self.server.token_status, {"error": "server_error", "error_description": "prueba"})
+                return
+            self._send(200, {"access_token": "benchmark", "token_type": "Bearer", "expires_in": 3600})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._delay()
+        if url.path == "/v1/search":
+            self.server.count("search")
+            if self.server.search_status:
+                headers = {"Retry-After": str(self.server.retry_after)} if self.server.retry_after else None
+                self._send(self.server.search_status, {"error": {"status": self.server.search_status}}, headers)
+                return
+            params = parse_qs(url.query)
+            query = params.get("q", [""])[0]
+            limit = int(params.get("limit", ["10"])[0])
+            offset = int(params.get("offset", ["0"])[0])
+            self._send(200, {"tracks": {"items": fake_tracks(f"{query}:{offset}", limit), "total": 1000}})
+        else:
+            self._send(404, {"error": {"status": 404, "message": "not found"}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0.0, host="127.0.0.1", port=0, search_status=None, retry_after=None,
+                 token_status=None):
+        super().__init__((host, port), _Handler)
+        self.latency_ms = latency_ms
+        self.search_status = search_status
+        self.token_status = token_status
+        self.retry_after = retry_after
+        self.requests = {"token": 0, "search": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-spotify", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
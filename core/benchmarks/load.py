@@ -0,0 +1,145 @@
+"""
+Prueba de carga de extremo a extremo con el cliente de pruebas de Django.
+
+Cada hilo tiene su propio ``Client`` y su conexión a la base de datos; las
+peticiones pasan por todos los middlewares, la vista, la base de datos y el
+cliente de Spotify (apuntando al servidor falso), igual que en producción.
+Con ``MOODMATCH_DEFERRED_RECOMMENDATIONS`` cada petición de mood_match hace
+además la segunda petición a ``/api/recommendations/`` que hace el JavaScript
+de la página, y la latencia medida es la de ambas.
+"""
+import html
+import json
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+
+from core.emotion_cache import EmotionResultCache
+
+from . import summarize
+
+OPENINGS = ["Hoy me siento", "Esta semana estoy", "Últimamente me noto", "Ahora mismo estoy", "Desde ayer me siento"]
+FEELINGS = [
+    "muy feliz", "bastante triste", "con mucha rabia", "con miedo", "enamorado",
+    "agradecido", "preocupado", "furioso", "tranquilo", "nervioso",
+]
+REASONS = [
+    "por el trabajo", "por mi familia", "por los exámenes", "sin motivo claro",
+    "después de hablar con un amigo", "por el viaje", "porque llueve", "por una noticia",
+]
+
+ENDPOINTS = ("mood_match", "api_analyze")
+
+DEFERRED_URL = re.compile(r'id="recommendations"\s+data-url="([^"]+)"')
+
+
+def make_texts(count, unique_ratio=0.5, seed=0):
+    """
+    Textos de prueba; ``unique_ratio`` controla cuántos son distintos (el resto
+    se repite y ejercita la caché de resultados).
+    """
+    rng = random.Random(seed)
+    unique = max(1, int(count * unique_ratio))
+    pool = [
+        f"{rng.choice(OPENINGS)} {rng.choice(FEELINGS)} {rng.choice(REASONS)} #{i}"
+        for i in range(unique)
+    ]
+    return [pool[i] if i < unique else rng.choice(pool) for i in range(count)]
+
+
+def _request(client, endpoint, texts):
+    if endpoint == "mood_match":
+        response = client.post("/", {"texto": texts[0]})
+        match = DEFERRED_URL.search(response.content.decode()) if response.status_code == 200 else None
+        if match:
+            # Como la página: la canción y el libro llegan en una segunda petición
+            response = client.get(html.unescape(match.group(1)))
+        return response
+    return client.post(
+        "/api/analyze/", json.dumps({"texts": texts, "recommendations": True}), content_type="application/json"
+    )
+
+
+def run_load(endpoint, concurrency, total_requests, texts, batch_size=1):
+    """
+    Lanza ``total_requests`` peticiones repartidas entre ``concurrency`` hilos
+    y devuelve rendimiento, percentiles de latencia y errores.
+    """
+    if endpoint not in ENDPOINTS:
+        raise ValueError(f"Endpoint desconocido: {endpoint}")
+    batch_size = batch_size if endpoint == "api_analyze" else 1
+
+    counter = iter(range(total_requests))
+    counter_lock = threading.Lock()
+    latencies = []
+    errors = []
+    results_lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker():
+        client = Client()
+        barrier.wait()
+        local_latencies = []
+        local_errors = []
+        try:
+            while True:
+                with counter_lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                chunk = [texts[(i * batch_size + k) % len(texts)] for k in range(batch_size)]
+                start = time.perf_counter()
+                try:
+                    response = _request(client, endpoint, chunk)
+                    if response.status_code != 200:
+                        local_errors.append(f"HTTP {response.status_code}")
+                except Exception as e:
+                    local_errors.append(repr(e))
+                local_latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()
+            with results_lock:
+                latencies.extend(local_latencies)
+                errors.extend(local_errors)
+
+    threads = [threading.Thread(target=worker, name=f"bench-{n}") for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "texts_per_request": batch_size,
+        "deferred_recommendations": endpoint == "mood_match"
+        and getattr(settings, "MOODMATCH_DEFERRED_RECOMMENDATIONS", True),
+        "elapsed_s": elapsed,
+        "throughput_rps": total_requests / elapsed if elapsed else 0.0,
+        "texts_per_s": total_requests * batch_size / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "latency_ms": summarize(latencies),
+    }
+
+
+def reset_state(engine):
+    """
+    Vacía la caché compartida (resultados, pools y tendencia) y la caché local
+    de resultados del motor, para que cada ejecución empiece en frío.
+    """
+    cache.clear()
+    if engine.cache is not None:
+        engine.cache = EmotionResultCache(
+            engine.cache.version, max_entries=engine.cache.local.max_entries, timeout=engine.cache.timeout
+        )
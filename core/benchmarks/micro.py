@@ -0,0 +1,97 @@
+"""
+Microbenchmarks sobre tablas sembradas.
+
+``seed_entries`` rellena ``EmotionalEntry`` hasta el número de filas pedido
+(los resúmenes diarios se mantienen con las señales de ``bulk_create``) y cada
+benchmark mide una función con varias repeticiones tras un calentamiento.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from core import trends
+from core.models import EmotionalEntry
+
+from . import summarize
+from .load import make_texts
+
+EMOTIONS = ["joy", "sadness", "anger", "fear", "love"]
+
+
+def seed_entries(rows, seed=0, batch_size=5000):
+    """Añade entradas hasta tener ``rows`` filas, repartidas en el último año."""
+    rng = random.Random(seed + EmotionalEntry.objects.count())
+    now = timezone.now()
+    missing = rows - EmotionalEntry.objects.count()
+    texts = make_texts(min(max(missing, 1), 1000), unique_ratio=1.0, seed=seed)
+    while missing > 0:
+        size = min(batch_size, missing)
+        EmotionalEntry.objects.bulk_create([
+            EmotionalEntry(
+                texto=rng.choice(texts),
+                emocion_primaria=rng.choice(EMOTIONS),
+                emocion_secundaria=rng.choice(EMOTIONS),
+                respuesta_correcta=rng.random() < 0.8,
+                fecha=now - timedelta(seconds=rng.randrange(365 * 86400)),
+            )
+            for _ in range(size)
+        ])
+        missing -= size
+    trends.invalidate()
+
+
+def measure(fn, iterations, warmup=5, setup=None):
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def fallback_benchmarks(iterations):
+    from core.views import fallback_emotion_analysis
+
+    texts = make_texts(256, unique_ratio=1.0, seed=1)
+    position = iter(range(10 ** 9))
+    return {
+        "fallback_emotion_analysis": measure(
+            lambda: fallback_emotion_analysis(texts[next(position) % len(texts)]), iterations
+        ),
+    }
+
+
+def table_benchmarks(iterations):
+    """Benchmarks que dependen del tamaño de la tabla."""
+    user_model = get_user_model()
+    user = user_model.objects.filter(username="benchmark").first()
+    if user is None:
+        user = user_model.objects.create_superuser("benchmark", "benchmark@example.com", "benchmark")
+    client = Client()
+    client.force_login(user)
+
+    stats_url = reverse("admin:emotional-stats")
+    data_url = f"{reverse('admin:emotional-stats-data')}?days=365&granularity=week"
+    etag = client.get(data_url)["ETag"]
+
+    return {
+        "get_tendencia_db": measure(EmotionalEntry.get_tendencia, iterations),
+        "get_tendencia_incremental": measure(trends.get_tendencia, iterations),
+        "trend_state_rebuild": measure(trends.build_state, max(iterations // 10, 5)),
+        "stats_view": measure(lambda: client.get(stats_url), iterations),
+        "stats_data_cold": measure(lambda: client.get(data_url), iterations, setup=cache.clear),
+        "stats_data_cached": measure(lambda: client.get(data_url), iterations),
+        "stats_data_not_modified": measure(lambda: client.get(data_url, HTTP_IF_NONE_MATCH=etag), iterations),
+    }
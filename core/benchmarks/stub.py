@@ -0,0 +1,34 @@
+"""
+Clasificador determinista para los benchmarks.
+
+Devuelve siempre la misma distribución para el mismo texto (derivada de un
+hash) y simula el coste del modelo con una pausa fija por pasada más otra por
+texto, de modo que el batching y la caché se comportan como con el modelo real.
+"""
+import hashlib
+import time
+
+LABELS = ("joy", "sadness", "anger", "fear", "surprise", "others")
+
+
+class StubBackend:
+    name = "stub"
+    # Ajustables por el comando de benchmark antes de cargar el motor
+    batch_latency_ms = 20.0
+    item_latency_ms = 2.0
+
+    @property
+    def version(self):
+        return f"{self.name}:{self.batch_latency_ms}:{self.item_latency_ms}"
+
+    def _distribution(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        weights = [digest[i] + 1 for i in range(len(LABELS))]
+        total = sum(weights)
+        ranked = sorted(zip(LABELS, weights), key=lambda x: x[1], reverse=True)
+        return [{"label": label, "score": weight / total} for label, weight in ranked]
+
+    def predict(self, texts):
+        texts = list(texts)
+        time.sleep((self.batch_latency_ms + self.item_latency_ms * len(texts)) / 1000)
+        return [self._distribution(text) for text in texts]
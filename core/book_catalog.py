@@ -0,0 +1,281 @@
+"""
+Catálogo local de libros por emoción (``manage.py build_book_catalog``).
+
+El comando lee volcados de libros (JSON de la API de Google Books, JSON/JSONL
+con campos planos o CSV), etiqueta cada libro con una emoción primaria y otra
+secundaria y escribe en ``BOOK_CATALOG_PATH`` un índice compacto:
+
+    {"version": 1, "books": [[título, autor, url, descripción], ...],
+     "index": {"joy|love": [0, 7, ...], "joy|": [...], ...},
+     "stats": {"records": ..., "invalid": ..., "untagged": ..., ...}}
+
+Los registros mal formados (no son objetos, sin título, campos de otro tipo o
+líneas JSONL ilegibles) se saltan y se cuentan en ``stats["invalid"]``.
+
+Para etiquetar se usa el léxico del fallback (``core.lexicon``) sobre título y
+descripción, más unas pistas por categoría o género en inglés y español, que
+pesan más. En la petición solo se consulta el índice en memoria; no hay
+llamadas externas. El fichero se vuelve a leer cuando cambia en disco.
+"""
+import csv
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .lexicon import get_lexicon, tokenize
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION = 1
+DESCRIPTION_MAX_LENGTH = 300
+# Peso de una pista encontrada en las categorías frente a una palabra del texto
+CATEGORY_WEIGHT = 3
+
+# Pistas por categoría, género o palabra clave (normalizadas, sin tildes)
+HINTS = {
+    "joy": [
+        "humor", "humour", "comedy", "comedia", "funny", "happiness", "happy", "felicidad",
+        "alegria", "optimism", "optimismo", "joy", "celebration",
+    ],
+    "sadness": [
+        "grief", "duelo", "loss", "perdida", "sadness", "tristeza", "tragedy", "tragedia",
+        "depression", "depresion", "loneliness", "soledad", "melancholy",
+    ],
+    "anger": [
+        "anger", "ira", "rabia", "rage", "revenge", "venganza", "injustice", "injusticia",
+        "conflict", "conflicto", "rebellion", "rebelion",
+    ],
+    "fear": [
+        "horror", "terror", "fear", "miedo", "thriller", "suspense", "anxiety", "ansiedad",
+        "ghost", "ghosts", "fantasmas", "mystery", "misterio",
+    ],
+    "love": [
+        "romance", "romantic", "romantica", "romantico", "love", "amor", "relationships",
+        "relaciones", "wedding", "boda",
+    ],
+}
+HINT_INDEX = {word: emotion for emotion, words in HINTS.items() for word in words}
+
+
+def catalog_key(emotion, secondary_emotion=None):
+    if secondary_emotion and secondary_emotion != emotion:
+        return f"{emotion}|{secondary_emotion}"
+    return f"{emotion}|"
+
+
+def _first(value):
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else ""
+    return value or ""
+
+
+def _text(value):
+    if not isinstance(value, str):
+        raise TypeError(f"Se esperaba texto y no {type(value).__name__}")
+    return value.strip()
+
+
+def _text_list(value):
+    if isinstance(value, str):
+        return [item.strip() for item in value.replace(";", ",").split(",") if item.strip()]
+    if not isinstance(value, (list, tuple)):
+        raise TypeError(f"Se esperaba una lista y no {type(value).__name__}")
+    return [_text(item) for item in value if item]
+
+
+def normalize_book(record):
+    """
+    Libro de un registro de Google Books (``volumeInfo``) o con campos planos;
+    None si no sirve (no es un objeto, no tiene título o sus campos no son texto).
+    """
+    info = record.get("volumeInfo", record) if isinstance(record, dict) else None
+    if not isinstance(info, dict):
+        return None
+    try:
+        title = _text(info.get("title") or "")
+        if not title:
+            return None
+        authors = _text_list(info.get("authors") or info.get("author") or "")
+        categories = _text_list(info.get("categories") or info.get("genres") or info.get("category") or [])
+        return {
+            "title": title,
+            "author": ", ".join(authors[:2]) or "Autor desconocido",
+            "url": _text(_first(info.get("infoLink") or info.get("canonicalVolumeLink") or info.get("url"))) or "#",
+            "description": _text(info.get("description") or ""),
+            "categories": categories,
+            "language": _text(info.get("language") or ""),
+        }
+    except TypeError:
+        return None
+
+
+def read_books(path):
+    """
+    Registros de un volcado JSON (respuesta de la API o lista), JSONL o CSV.
+    Una línea JSONL ilegible produce None, que se cuenta como registro inválido.
+    """
+    path = str(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif path.endswith(".jsonl"):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"{path}:{number}: línea JSON inválida ({e})")
+                    yield None
+        else:
+            data = json.load(f)
+            yield from data.get("items", []) if isinstance(data, dict) else data
+
+
+def tag_book(book, lexicon):
+    """Puntuación por emoción: pistas de las categorías y palabras del léxico en el texto."""
+    scores = Counter()
+    for category in book["categories"]:
+        for word in tokenize(category):
+            emotion = HINT_INDEX.get(word)
+            if emotion:
+                scores[emotion] += CATEGORY_WEIGHT
+    for word in tokenize(f"{book['title']} {book['description']}"):
+        emotion = HINT_INDEX.get(word) or lexicon.lookup(word)
+        if emotion:
+            scores[emotion] += 1
+    return scores
+
+
+def build_catalog(records, per_key=50, min_score=1, language=None):
+    """
+    Etiqueta los libros y construye el índice. Cada clave guarda como mucho
+    ``per_key`` libros, los de mayor puntuación primero.
+    """
+    lexicon = get_lexicon()
+    books = []
+    seen = set()
+    candidates = {}
+    stats = Counter()
+    for record in records:
+        stats["records"] += 1
+        book = normalize_book(record)
+        if book is None:
+            stats["invalid"] += 1
+            continue
+        if language and book["language"] and book["language"] != language:
+            stats["other_language"] += 1
+            continue
+        dedup = (book["title"].lower(), book["author"].lower())
+        if dedup in seen:
+            stats["duplicates"] += 1
+            continue
+        ranked = [(emotion, score) for emotion, score in tag_book(book, lexicon).most_common(2) if score >= min_score]
+        if not ranked:
+            stats["untagged"] += 1
+            continue
+        seen.add(dedup)
+        i = len(books)
+        description = book["description"]
+        if len(description) > DESCRIPTION_MAX_LENGTH:
+            description = description[:DESCRIPTION_MAX_LENGTH].rsplit(" ", 1)[0] + "…"
+        books.append([book["title"], book["author"], book["url"], description])
+
+        primary, primary_score = ranked[0]
+        candidates.setdefault(catalog_key(primary), []).append((primary_score, i))
+        if len(ranked) > 1:
+            candidates.setdefault(catalog_key(primary, ranked[1][0]), []).append((primary_score + ranked[1][1], i))
+
+    index = {
+        key: [i for _, i in sorted(items, key=lambda item: -item[0])[:per_key]]
+        for key, items in sorted(candidates.items())
+    }
+    # Solo se guardan los libros referenciados por el índice
+    used = sorted({i for ids in index.values() for i in ids})
+    remap = {old: new for new, old in enumerate(used)}
+    return {
+        "version": CATALOG_VERSION,
+        "built_at": time.time(),
+        "books": [books[i] for i in used],
+        "index": {key: [remap[i] for i in ids] for key, ids in index.items()},
+        "stats": {key: stats[key] for key in ("records", "invalid", "other_language", "duplicates", "untagged")},
+    }
+
+
+def write_catalog(catalog, path):
+    """Escribe el catálogo de forma atómica (fichero temporal + rename)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+class BookCatalog:
+    """Índice cargado en memoria: cada clave apunta a tuplas (título, autor, url, descripción)."""
+
+    def __init__(self, data):
+        if data.get("version") != CATALOG_VERSION:
+            raise ValueError(f"Versión de catálogo no soportada: {data.get('version')}")
+        books = [tuple(book) for book in data["books"]]
+        self.index = {key: [books[i] for i in ids] for key, ids in data["index"].items()}
+        self.size = len(books)
+
+    def recommend(self, emotion, secondary_emotion=None):
+        """Libro del par, o si no hay, de la emoción primaria; None si no hay ninguno."""
+        for key in (catalog_key(emotion, secondary_emotion), catalog_key(emotion)):
+            books = self.index.get(key)
+            if books:
+                title, author, url, description = random.choice(books)
+                return {"title": title, "author": author, "url": url, "description": description}
+        return None
+
+
+_catalog = None
+_catalog_mtime = None
+_checked_at = None  # monotonic() puede ser menor que el intervalo recién arrancada la máquina
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Catálogo del proceso, o None si no existe. Se comprueba si el fichero ha
+    cambiado como mucho cada ``BOOK_CATALOG_CHECK_INTERVAL`` segundos.
+    """
+    global _catalog, _catalog_mtime, _checked_at
+    interval = getattr(settings, "BOOK_CATALOG_CHECK_INTERVAL", 60)
+    if _checked_at is not None and time.monotonic() - _checked_at < interval:
+        return _catalog
+
+    with _catalog_lock:
+        if _checked_at is not None and time.monotonic() - _checked_at < interval:
+            return _catalog
+        _checked_at = time.monotonic()
+        path = getattr(settings, "BOOK_CATALOG_PATH", None)
+        try:
+            mtime = os.stat(path).st_mtime if path else None
+        except OSError:
+            mtime = None
+        if mtime is None:
+            _catalog, _catalog_mtime = None, None
+        elif mtime != _catalog_mtime:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    _catalog = BookCatalog(json.load(f))
+                _catalog_mtime = mtime
+                logger.info(f"Catálogo de libros cargado con {_catalog.size} libros")
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                # Se mantiene el catálogo anterior, si lo había
+                logger.error(f"Error al cargar el catálogo de libros {path}: {str(e)}")
+        return _catalog
+
+
+def recommend_book(emotion, secondary_emotion=None):
+    """Libro del catálogo local para el par de emociones, o None."""
+    catalog = get_catalog()
+    return catalog.recommend(emotion, secondary_emotion) if catalog is not None else None
@@ -0,0 +1,240 @@
+"""
+Cortocircuito (circuit breaker) y plazo por petición para las llamadas externas.
+
+``CircuitBreaker`` cuenta los fallos seguidos de un servicio. Al llegar a
+``CIRCUIT_BREAKER_FAILURE_THRESHOLD`` se abre: durante
+``CIRCUIT_BREAKER_RESET_TIMEOUT`` segundos las llamadas fallan al instante con
+``CircuitOpen`` y la vista usa la respuesta por defecto sin esperar al
+timeout HTTP. Pasado ese tiempo queda semiabierto y deja pasar una llamada de
+prueba: si responde se cierra, si falla se vuelve a abrir. El estado es del
+proceso y lo comparten todos sus hilos.
+
+``request_deadline_middleware`` fija al empezar cada petición un plazo de
+``MOODMATCH_REQUEST_BUDGET`` segundos (``contextvars``). ``call_timeout``
+recorta el timeout de cada llamada externa a lo que queda de ese plazo y lanza
+``DeadlineExceeded`` si ya no queda tiempo útil, así una petición que ha
+gastado su presupuesto en la inferencia no espera además a Spotify.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+_deadline = ContextVar("request_deadline", default=None)
+
+
+class CircuitOpen(Exception):
+    """El servicio ha fallado demasiadas veces seguidas y no se le llama."""
+
+
+class DeadlineExceeded(Exception):
+    """No queda tiempo de la petición para hacer la llamada."""
+
+
+class CircuitBreaker:
+    """Cortocircuito con estados cerrado, abierto y semiabierto."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1, is_failure=None):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = max(0.0, float(reset_timeout))
+        self.half_open_max_calls = max(1, int(half_open_max_calls))
+        # Clasifica una excepción: True es un fallo del servicio, False una respuesta
+        # válida (p. ej. un 404) y None algo ajeno al servicio que no cuenta (por defecto, todas fallan)
+        self.is_failure = is_failure or (lambda exc: True)
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+
+        # Estadísticas
+        self._calls = 0
+        self._failures = 0
+        self._trips = 0
+        self._short_circuits = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        # Se llama con self._lock tomado; el paso a semiabierto se evalúa al consultar
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_calls = 0
+            logger.info(f"Cortocircuito '{self.name}' semiabierto: se prueba una llamada")
+        return self._state
+
+    def call(self, fn, *args, **kwargs):
+        """Llama a ``fn`` si el circuito lo permite; si no, lanza ``CircuitOpen``."""
+        trial = self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            outcome = self.is_failure(e)
+            if outcome is None:
+                # El servicio no llegó a responder (p. ej. sin tiempo de la petición)
+                self._on_neutral(trial)
+            elif outcome:
+                self._on_failure(trial)
+            else:
+                # El servicio respondió (p. ej. un 404): no es un fallo de disponibilidad
+                self._on_success(trial)
+            raise
+        self._on_success(trial)
+        return result
+
+    def _before_call(self):
+        """Reserva la llamada; devuelve True si es la llamada de prueba del estado semiabierto."""
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._trial_calls >= self.half_open_max_calls):
+                self._short_circuits += 1
+                raise CircuitOpen(f"Cortocircuito '{self.name}' abierto")
+            self._calls += 1
+            if state == HALF_OPEN:
+                self._trial_calls += 1
+                return True
+            return False
+
+    def _on_success(self, trial=False):
+        with self._lock:
+            self._consecutive_failures = 0
+            if trial and self._state == HALF_OPEN:
+                self._state = CLOSED
+                logger.info(f"Cortocircuito '{self.name}' cerrado: el servicio vuelve a responder")
+
+    def _on_neutral(self, trial=False):
+        with self._lock:
+            if trial and self._state == HALF_OPEN:
+                # Libera la plaza de prueba sin decidir el estado
+                self._trial_calls = max(0, self._trial_calls - 1)
+
+    def _on_failure(self, trial=False):
+        with self._lock:
+            self._failures += 1
+            self._consecutive_failures += 1
+            if (trial and self._state == HALF_OPEN) or (
+                self._state == CLOSED and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trips += 1
+                logger.warning(
+                    f"Cortocircuito '{self.name}' abierto tras {self._consecutive_failures} fallos seguidos; "
+                    f"nuevo intento en {self.reset_timeout:.0f} s"
+                )
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._trial_calls = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "calls": self._calls,
+                "failures": self._failures,
+                "trips": self._trips,
+                "short_circuits": self._short_circuits,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, is_failure=None):
+    """Cortocircuito del proceso para el servicio ``name``; se crea en el primer uso."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=getattr(settings, "CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5),
+                reset_timeout=getattr(settings, "CIRCUIT_BREAKER_RESET_TIMEOUT", 30.0),
+                is_failure=is_failure,
+            )
+        return breaker
+
+
+def all_breakers():
+    with _breakers_lock:
+        return dict(_breakers)
+
+
+@contextmanager
+def deadline(seconds):
+    """Limita el bloque a ``seconds`` segundos; un plazo exterior más corto se mantiene."""
+    current = _deadline.get()
+    new = time.monotonic() + seconds
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Segundos que le quedan a la petición en curso, o None si no hay plazo."""
+    current = _deadline.get()
+    if current is None:
+        return None
+    return max(0.0, current - time.monotonic())
+
+
+def call_timeout(timeout):
+    """
+    Timeout para una llamada externa: ``timeout`` recortado a lo que queda de la
+    petición. Lanza ``DeadlineExceeded`` si queda menos de ``MOODMATCH_MIN_CALL_TIMEOUT``.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left < getattr(settings, "MOODMATCH_MIN_CALL_TIMEOUT", 0.1):
+        raise DeadlineExceeded(f"Quedan {left * 1000:.0f} ms de la petición")
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        # (conexión, lectura) como en requests
+        return tuple(min(part, left) if part is not None else left for part in timeout)
+    return min(timeout, left)
+
+
+@sync_and_async_middleware
+def request_deadline_middleware(get_response):
+    """Fija el plazo de ``MOODMATCH_REQUEST_BUDGET`` segundos para las llamadas externas de la petición."""
+    budget = getattr(settings, "MOODMATCH_REQUEST_BUDGET", 4.0)
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not budget:
+                return await get_response(request)
+            with deadline(budget):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            if not budget:
+                return get_response(request)
+            with deadline(budget):
+                return get_response(request)
+
+    return middleware
@@ -0,0 +1,143 @@
+"""
+Caché de resultados de clasificación de emociones en dos niveles.
+
+1. Un LRU acotado en memoria del proceso.
+2. El backend de caché configurado en Django (``CACHES``), compartido entre
+   los workers de gunicorn cuando es Redis/Memcached.
+
+Las claves se derivan del hash del texto normalizado y de la versión del
+modelo/backend y del mapeo de etiquetas, así que cualquier cambio en ellos
+invalida automáticamente los resultados anteriores.
+"""
+import hashlib
+import json
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "emotion"
+
+
+def cache_is_shared(alias="default"):
+    """False si la caché de Django es local del proceso (o no guarda nada)."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def normalize_text(text):
+    """Normaliza el texto para que frases equivalentes compartan entrada."""
+    text = unicodedata.normalize("NFC", text).lower()
+    return " ".join(text.split())
+
+
+def model_version(backend_version, label_mapping):
+    """Huella corta del modelo/backend y del mapeo de etiquetas."""
+    payload = json.dumps([backend_version, label_mapping], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class LRUCache:
+    """Diccionario acotado con política LRU, seguro entre hilos."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max(1, int(max_entries))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class EmotionResultCache:
+    """Caché de resultados (primaria, secundaria, puntuaciones) por texto."""
+
+    def __init__(self, version, max_entries=1024, timeout=86400, alias="default"):
+        self.version = version
+        self.timeout = timeout
+        self.alias = alias
+        self.local = LRUCache(max_entries)
+
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def make_key(self, text):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}:{self.version}:{digest}"
+
+    def get(self, text):
+        key = self.make_key(text)
+        result = self.local.get(key)
+        if result is not None:
+            self._count("local_hits")
+            return result
+
+        try:
+            result = caches[self.alias].get(key)
+        except Exception as e:
+            logger.warning(f"Error leyendo la caché compartida de emociones: {str(e)}")
+            result = None
+
+        if result is None:
+            self._count("misses")
+            return None
+
+        result = tuple(result)
+        self.local.set(key, result)
+        self._count("shared_hits")
+        return result
+
+    def set(self, text, result):
+        key = self.make_key(text)
+        result = tuple(result)
+        self.local.set(key, result)
+        try:
+            caches[self.alias].set(key, result, self.timeout)
+        except Exception as e:
+            logger.warning(f"Error escribiendo en la caché compartida de emociones: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                "version": self.version,
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.local.evictions,
+                "local_size": len(self.local),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
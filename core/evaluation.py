@@ -0,0 +1,196 @@
+"""
+Evaluación de los clasificadores con las entradas revisadas
+(``manage.py evaluate_classifiers``).
+
+Etiquetas de referencia:
+
+- Entradas marcadas como incorrectas cuya nota de revisión nombra una sola
+  emoción conocida (p. ej. "era sadness"): esa emoción, corregida por el usuario.
+- El resto de incorrectas solo dice qué etiqueta *no* es; se usan para medir
+  cuántas veces un clasificador repite la etiqueta rechazada.
+- Solo con ``include_confirmed``: entradas marcadas como correctas, con la
+  emoción primaria guardada. Esa etiqueta es la salida del propio modelo y el
+  revisor solo la confirmó, así que favorece al modelo que la produjo y no
+  recoge sus errores no revisados. Como ``respuesta_correcta`` vale True por
+  defecto, se toman las que tienen notas de revisión (o todas con
+  ``include_unreviewed``).
+
+Cada ruta de clasificación (pytorch, onnx, onnx-int8, remote, fallback o un
+backend propio) se ejecuta en un proceso nuevo, así el pico de memoria (RSS)
+medido es el suyo y no el de las rutas anteriores.
+"""
+import logging
+import multiprocessing
+import re
+import resource
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.db.models import Q
+
+from .benchmarks import summarize
+from .inference import EMOTION_MAPPING
+
+FALLBACK = "fallback"
+KNOWN_EMOTIONS = sorted(set(EMOTION_MAPPING.values()) | {"love"})
+
+
+def label_from_notes(notes):
+    """Emoción correcta indicada en la nota de revisión, si nombra exactamente una."""
+    if not notes:
+        return None
+    found = {token for token in re.findall(r"[a-z]+", notes.lower()) if token in KNOWN_EMOTIONS}
+    return found.pop() if len(found) == 1 else None
+
+
+def load_dataset(limit=None, include_unreviewed=False, include_confirmed=False):
+    """
+    Devuelve (etiquetadas, rechazadas, confirmadas): listas de (texto, emoción)
+    con la etiqueta correcta y con la etiqueta rechazada por el revisor, y
+    cuántas de las etiquetadas (las últimas) son salida confirmada del modelo.
+    ``include_unreviewed`` implica ``include_confirmed``.
+    """
+    # Importación diferida: el proceso hijo importa este módulo antes de django.setup()
+    from .models import EmotionalEntry
+
+    include_confirmed = include_confirmed or include_unreviewed
+    if include_unreviewed:
+        queryset = EmotionalEntry.objects.all()
+    elif include_confirmed:
+        reviewed = Q(respuesta_correcta=False) | (Q(notas_revision__isnull=False) & ~Q(notas_revision=""))
+        queryset = EmotionalEntry.objects.filter(reviewed)
+    else:
+        queryset = EmotionalEntry.objects.filter(respuesta_correcta=False)
+    rows = queryset.order_by("-fecha").values_list("texto", "emocion_primaria", "respuesta_correcta", "notas_revision")
+    if limit:
+        rows = rows[:limit]
+
+    corrected, confirmed, rejected = [], [], []
+    for texto, emocion, correcta, notas in rows.iterator(chunk_size=2000):
+        if correcta:
+            confirmed.append((texto, emocion))
+            continue
+        gold = label_from_notes(notas)
+        if gold is not None and gold != emocion:
+            corrected.append((texto, gold))
+        else:
+            rejected.append((texto, emocion))
+    return corrected + confirmed, rejected, len(confirmed)
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB en Linux, bytes en macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _make_backend(path):
+    from django.conf import settings
+
+    from .backends import OnnxBackend, load_backend
+
+    if path in ("onnx", "onnx-int8"):
+        return OnnxBackend(
+            getattr(settings, "EMOTION_ONNX_MODEL_DIR"),
+            quantized=path == "onnx-int8",
+            num_threads=getattr(settings, "EMOTION_ONNX_THREADS", 0),
+        )
+    return load_backend(path)
+
+
+def run_path(path, texts, batch_size=32, latency_samples=100):
+    """
+    Se ejecuta en el proceso hijo: carga la ruta, mide latencia por texto y
+    rendimiento por lotes, y devuelve las emociones primarias predichas.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    # Los logs por texto del fallback distorsionan la latencia
+    logging.disable(logging.INFO)
+    from .inference import interpret_prediction
+    from .views import fallback_emotion_analysis
+
+    result = {"path": path, "rss_before_mb": _peak_rss_mb()}
+    start = time.perf_counter()
+    try:
+        if path == FALLBACK:
+            def classify(batch):
+                return [fallback_emotion_analysis(text)[0] for text in batch]
+            result["version"] = FALLBACK
+        else:
+            backend = _make_backend(path)
+
+            def classify(batch):
+                return [interpret_prediction(dist)[0] for dist in backend.predict(batch)]
+            result["version"] = backend.version
+        classify(texts[:1] or ["Hoy me siento bien"])
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    result["load_ms"] = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for text in texts[:latency_samples]:
+        t = time.perf_counter()
+        classify([text])
+        latencies.append((time.perf_counter() - t) * 1000)
+    result["latency_ms"] = summarize(latencies)
+
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        predictions.extend(classify(texts[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    result["batch_size"] = batch_size
+    result["throughput_texts_per_s"] = len(texts) / elapsed if elapsed else 0.0
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["predictions"] = predictions
+    return result
+
+
+def run_path_isolated(path, texts, batch_size=32, latency_samples=100):
+    """``run_path`` en un proceso nuevo (spawn) para aislar memoria y carga."""
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(run_path, path, texts, batch_size, latency_samples).result()
+    except BrokenProcessPool as e:
+        return {"path": path, "error": f"El proceso de evaluación terminó de forma inesperada: {e}"}
+
+
+def score(predictions, labelled, rejected):
+    """Exactitud, matriz de confusión, recall por emoción y tasa de etiquetas rechazadas repetidas."""
+    gold = [emotion for _, emotion in labelled]
+    predicted = predictions[:len(labelled)]
+    confusion = defaultdict(Counter)
+    for expected, got in zip(gold, predicted):
+        confusion[expected][got] += 1
+
+    correct = sum(1 for expected, got in zip(gold, predicted) if expected == got)
+    per_class = {
+        emotion: {
+            "support": sum(row.values()),
+            "recall": row[emotion] / sum(row.values()),
+            "precision": (
+                row[emotion] / sum(confusion[e][emotion] for e in confusion)
+                if any(confusion[e][emotion] for e in confusion) else 0.0
+            ),
+        }
+        for emotion, row in sorted(confusion.items())
+    }
+    repeated = sum(
+        1 for (_, emotion), got in zip(rejected, predictions[len(labelled):]) if emotion == got
+    )
+    return {
+        "samples": len(gold),
+        "accuracy": correct / len(gold) if gold else None,
+        "per_class": per_class,
+        "confusion": {expected: dict(row) for expected, row in sorted(confusion.items())},
+        "rejected_samples": len(rejected),
+        "rejected_label_repeat_rate": repeated / len(rejected) if rejected else None,
+    }
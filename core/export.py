@@ -0,0 +1,179 @@
+"""
+Exportación en streaming de ``EmotionalEntry`` (CSV, JSONL o Parquet).
+
+Las filas se leen con ``values_list(...).iterator(chunk_size)`` y se escriben
+por bloques, así que la memoria no depende del número de entradas. Lo usan la
+acción del admin (``StreamingHttpResponse``) y ``manage.py export_entries``,
+que es la opción recomendada para exportaciones muy grandes porque no depende
+del timeout del worker web. Parquet requiere ``pyarrow`` (opcional, en
+``requirements-optional.txt``).
+"""
+import csv
+import io
+import json
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import EmotionalEntry
+
+FIELDS = (
+    "id",
+    "texto",
+    "emocion_primaria",
+    "emocion_secundaria",
+    "fecha",
+    "respuesta_correcta",
+    "notas_revision",
+    "puntuaciones",
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def filter_entries(queryset=None, start=None, end=None, emotion=None, correct=None, reviewed=None):
+    """
+    Aplica los filtros de exportación: rango de días (incluidos), emoción
+    primaria, ``respuesta_correcta`` y si tienen notas de revisión.
+    """
+    queryset = EmotionalEntry.objects.all() if queryset is None else queryset
+    if start:
+        queryset = queryset.filter(fecha__date__gte=start)
+    if end:
+        queryset = queryset.filter(fecha__date__lte=end)
+    if emotion:
+        queryset = queryset.filter(emocion_primaria=emotion)
+    if correct is not None:
+        queryset = queryset.filter(respuesta_correcta=correct)
+    if reviewed is True:
+        queryset = queryset.exclude(notas_revision__isnull=True).exclude(notas_revision="")
+    elif reviewed is False:
+        queryset = queryset.filter(Q(notas_revision__isnull=True) | Q(notas_revision=""))
+    return queryset
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Tuplas con ``FIELDS`` en orden de id, sin crear instancias del modelo."""
+    return queryset.order_by("id").values_list(*FIELDS).iterator(chunk_size=chunk_size)
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iso(fecha):
+    return timezone.localtime(fecha).isoformat() if timezone.is_aware(fecha) else fecha.isoformat()
+
+
+def iter_csv(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for chunk in _chunks(rows, chunk_size):
+        for row in chunk:
+            row = list(row)
+            row[4] = _iso(row[4])
+            row[7] = json.dumps(row[7]) if row[7] is not None else ""
+            writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    for chunk in _chunks(rows, chunk_size):
+        lines = []
+        for row in chunk:
+            item = dict(zip(FIELDS, row))
+            item["fecha"] = _iso(item["fecha"])
+            lines.append(json.dumps(item, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Destino de ParquetWriter que acumula los bytes escritos para ir enviándolos."""
+
+    def __init__(self):
+        self.pending = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.pending.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data, self.pending = b"".join(self.pending), []
+        return data
+
+
+def iter_parquet(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Un row group por bloque; cada bloque se envía en cuanto se escribe."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("La exportación a Parquet requiere pyarrow (pip install -r requirements-optional.txt)")
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("texto", pa.string()),
+        ("emocion_primaria", pa.string()),
+        ("emocion_secundaria", pa.string()),
+        ("fecha", pa.timestamp("us", tz="UTC")),
+        ("respuesta_correcta", pa.bool_()),
+        ("notas_revision", pa.string()),
+        ("puntuaciones", pa.string()),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for chunk in _chunks(rows, chunk_size):
+        columns = list(zip(*chunk))
+        columns[7] = [json.dumps(value) if value is not None else None for value in columns[7]]
+        writer.write_table(pa.Table.from_arrays([list(column) for column in columns], schema=schema))
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
+
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", iter_csv),
+    "jsonl": ("application/x-ndjson; charset=utf-8", iter_jsonl),
+    "parquet": ("application/vnd.apache.parquet", iter_parquet),
+}
+
+
+def export_chunks(queryset, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Bloques de bytes del fichero exportado en el formato ``fmt``."""
+    _, writer = FORMATS[fmt]
+    return writer(iter_rows(queryset, chunk_size), chunk_size)
+
+
+def streaming_response(queryset, fmt, filename=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    content_type, _ = FORMATS[fmt]
+    if fmt == "parquet":
+        # Fallar antes de empezar a responder si falta la dependencia
+        import pyarrow  # noqa: F401
+    filename = filename or f"entradas_{timezone.localdate():%Y%m%d}.{fmt}"
+    response = StreamingHttpResponse(export_chunks(queryset, fmt, chunk_size), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,163 @@
+"""
+Subsistema de inferencia del modelo de emociones con carga diferida.
+
+El modelo (y con él torch/transformers) no se importa al importar las vistas:
+se carga en el primer uso o de forma explícita con ``warmup()``, que llama
+``CoreConfig.ready`` cuando ``EMOTION_WARMUP_ON_STARTUP`` está activo o el
+comando ``manage.py warmup``.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .admission import admit, apply_thread_budget, get_controller
+from .backends import load_backend
+from .batching import MicroBatcher
+from .emotion_cache import EmotionResultCache, model_version
+
+logger = logging.getLogger(__name__)
+
+# Mapear las etiquetas del modelo a nuestras categorías
+EMOTION_MAPPING = {
+    "joy": "joy",
+    "sadness": "sadness",
+    "anger": "anger",
+    "fear": "fear",
+    "surprise": "joy",  # Mapeamos surprise a joy por defecto
+    "disgust": "anger",
+    "others": "joy"     # Cualquier otra emoción la mapeamos a joy
+}
+
+WARMUP_TEXT = "Hoy me siento bien"
+
+
+def interpret_prediction(distribution):
+    """
+    Convierte la distribución completa del modelo en (primaria, secundaria, puntuaciones).
+    La primaria es la categoría de la etiqueta más probable y la secundaria la de
+    la siguiente etiqueta con otra categoría. Las probabilidades no se suman: varias
+    etiquetas menores mapeadas a la misma categoría no deben superar a la principal.
+    """
+    scores = {item["label"]: round(float(item["score"]), 4) for item in distribution}
+
+    ranked = []
+    for item in sorted(distribution, key=lambda x: float(x["score"]), reverse=True):
+        emotion = EMOTION_MAPPING.get(item["label"], "joy")
+        if emotion not in ranked:
+            ranked.append(emotion)
+    primary = ranked[0]
+    secondary = ranked[1] if len(ranked) > 1 else primary
+    return primary, secondary, scores
+
+
+class InferenceEngine:
+    """Backend, micro-batcher y caché del clasificador, creados en el primer uso."""
+
+    def __init__(self, backend_name=None, num_threads=None):
+        self.backend_name = backend_name
+        # Hilos de cómputo del backend; por defecto, el presupuesto del worker
+        self.num_threads = num_threads
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.backend = None
+        self.batcher = None
+        self.cache = None
+        self.load_error = None
+        self.timings = {}
+
+    @property
+    def available(self):
+        """Carga el modelo si hace falta e indica si está disponible."""
+        if not self._loaded:
+            self.load()
+        return self.backend is not None
+
+    def load(self):
+        """Carga el modelo una sola vez por proceso (seguro entre hilos)."""
+        with self._lock:
+            if self._loaded:
+                return self.backend is not None
+
+            start = time.perf_counter()
+            try:
+                logger.info("Cargando modelo de Hugging Face...")
+                self.backend = load_backend(self.backend_name, num_threads=self.num_threads)
+                apply_thread_budget(self.backend, self.num_threads)
+                logger.info(f"Modelo de Hugging Face cargado correctamente ({self.backend.version})")
+            except Exception as e:
+                logger.error(f"Error al cargar el modelo de Hugging Face: {str(e)}", exc_info=True)
+                self.load_error = str(e)
+                self.backend = None
+            self.timings["load_ms"] = (time.perf_counter() - start) * 1000
+
+            if self.backend is not None:
+                # Agrupar llamadas concurrentes en una sola pasada del modelo
+                # (con el backend remoto el lote se forma en el servidor)
+                if getattr(settings, "EMOTION_BATCHING", True) and self.backend.name != "remote":
+                    max_batch_size = getattr(settings, "EMOTION_BATCH_MAX_SIZE", 8)
+                    controller = get_controller()
+                    # La admisión se decide al encolar: la cola del batcher admite tantos
+                    # lotes como pasadas la cola de admisión, con el mismo plazo de espera
+                    self.batcher = MicroBatcher(
+                        self._predict_admitted,
+                        max_batch_size=max_batch_size,
+                        max_wait_ms=getattr(settings, "EMOTION_BATCH_MAX_WAIT_MS", 10),
+                        max_queue=controller.max_queue * max_batch_size if controller else 0,
+                        max_queue_wait_ms=controller.max_wait * 1000.0 if controller else None,
+                    )
+                # Caché de resultados; la versión incluye el modelo y el mapeo de etiquetas
+                if getattr(settings, "EMOTION_CACHE_ENABLED", True):
+                    self.cache = EmotionResultCache(
+                        model_version(self.backend.version, EMOTION_MAPPING),
+                        max_entries=getattr(settings, "EMOTION_CACHE_MAX_ENTRIES", 1024),
+                        timeout=getattr(settings, "EMOTION_CACHE_TIMEOUT", 86400),
+                    )
+
+            self._loaded = True
+            return self.backend is not None
+
+    def _predict_admitted(self, texts):
+        # Una plaza de admisión por pasada del modelo (un lote completo), no por petición
+        with admit():
+            return self.backend.predict(texts)
+
+    def predict(self, text):
+        """Distribución completa de etiquetas para un texto; lanza ``Overloaded`` si no hay plaza."""
+        if self.batcher is not None:
+            return self.batcher.submit(text)
+        return self._predict_admitted([text])[0]
+
+    def predict_many(self, texts):
+        """Distribuciones para varios textos, en una sola pasada si es posible."""
+        texts = list(texts)
+        if self.batcher is not None and len(texts) <= self.batcher.max_batch_size:
+            # Lotes pequeños se agrupan con las peticiones concurrentes
+            return self.batcher.submit_many(texts)
+        return self._predict_admitted(texts)
+
+    def warmup(self):
+        """Carga el modelo y ejecuta una inferencia de prueba."""
+        if not self.load():
+            return False
+        start = time.perf_counter()
+        try:
+            self.backend.predict([WARMUP_TEXT])
+        except Exception as e:
+            logger.error(f"Error en la inferencia de precalentamiento: {str(e)}")
+            self.load_error = str(e)
+            return False
+        self.timings["warmup_inference_ms"] = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"Modelo precalentado: carga {self.timings['load_ms']:.0f} ms, "
+            f"primera inferencia {self.timings['warmup_inference_ms']:.0f} ms"
+        )
+        return True
+
+
+engine = InferenceEngine()
+
+
+def get_engine():
+    return engine
@@ -0,0 +1,174 @@
+"""
+Léxico compilado para el análisis de emociones por palabras clave.
+
+El léxico se compila una sola vez en un índice hash palabra -> emoción, con
+normalización insensible a tildes y mayúsculas, eliminación de puntuación y
+un tratamiento sencillo de la flexión del español (plurales y género) para
+los adjetivos y participios. Los términos de ``UNINFLECTED`` (adverbios y
+verbos) no se flexionan y los de ``NO_GENDER`` (sustantivos) solo forman el
+plural, porque sus otras formas son palabras distintas: bienes, males, amos,
+bronco. Puede ampliarse con un fichero externo indicado en ``EMOTION_LEXICON_PATH``:
+
+- JSON: ``{"joy": ["feliz", ...], "sadness": [...]}``
+- CSV/TSV: una fila ``palabra,emoción`` por término.
+"""
+import csv
+import json
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Diccionario simplificado de emociones y palabras clave
+DEFAULT_KEYWORDS = {
+    "joy": [
+        "feliz", "contento", "contenta", "alegre", "genial",
+        "fantástico", "fantástica", "excelente", "bien", "bueno", "buena"
+    ],
+    "sadness": [
+        "triste", "mal", "deprimido", "deprimida", "dolor",
+        "pena", "melancolía", "melancolico", "melancolica"
+    ],
+    "anger": [
+        "enojado", "enojada", "molesto", "molesta", "furioso",
+        "furiosa", "rabia", "ira", "bronca"
+    ],
+    "fear": [
+        "miedo", "asustado", "asustada", "temor", "terror",
+        "preocupado", "preocupada", "ansioso", "ansiosa"
+    ],
+    "love": [
+        "amor", "enamorado", "enamorada", "quiero", "adoro",
+        "cariño", "amo"
+    ]
+}
+
+# Formas normalizadas (sin tildes ni eñes)
+UNINFLECTED = {"bien", "mal", "quiero", "adoro", "amo"}
+NO_GENDER = {
+    "dolor", "pena", "melancolia", "rabia", "ira", "bronca",
+    "miedo", "temor", "terror", "amor", "carino",
+}
+
+WORD_RE = re.compile(r"\w+")
+
+# Tabla precalculada para quitar tildes sin descomponer cada carácter
+_ACCENTED = "áéíóúüàèìòùâêîôûäëïöñç"
+ACCENT_TABLE = str.maketrans(
+    _ACCENTED,
+    "".join(unicodedata.normalize("NFD", c)[0] for c in _ACCENTED),
+)
+
+
+def normalize(text):
+    """Minúsculas y sin tildes ni diacríticos."""
+    text = text.lower().translate(ACCENT_TABLE)
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFD", text)
+        text = "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+    return text
+
+
+def tokenize(text):
+    """Divide el texto en palabras normalizadas, descartando la puntuación."""
+    return WORD_RE.findall(normalize(text))
+
+
+def plural(word):
+    if word.endswith("z"):
+        return word[:-1] + "ces"
+    if word[-1] in "aeiou":
+        return word + "s"
+    return word + "es"
+
+
+def inflections(word):
+    """
+    Formas flexionadas de un término (género y número):
+    enojado -> enojado, enojada, enojados, enojadas; feliz -> feliz, felices;
+    pena -> pena, penas; bien -> bien.
+    """
+    forms = {word}
+    if word in UNINFLECTED:
+        return forms
+    if len(word) > 3 and word[-1] in "oa" and word not in NO_GENDER:
+        forms.add(word[:-1] + ("a" if word[-1] == "o" else "o"))
+    forms.update([plural(form) for form in forms])
+    return forms
+
+
+class Lexicon:
+    """Índice compilado palabra -> emoción, con las formas flexionadas precalculadas."""
+
+    def __init__(self, keywords):
+        self.emotions = list(keywords)
+        self.terms = 0
+        self.index = {}
+        for emotion, words in keywords.items():
+            for word in words:
+                word = normalize(word.strip())
+                if not word:
+                    continue
+                self.terms += 1
+                # Las formas exactas tienen prioridad sobre las flexionadas
+                self.index[word] = emotion
+                for form in inflections(word):
+                    self.index.setdefault(form, emotion)
+
+    def __len__(self):
+        return self.terms
+
+    def lookup(self, word):
+        """Emoción de una palabra ya normalizada, o None."""
+        return self.index.get(word)
+
+    def score(self, text):
+        """Cuenta las coincidencias de cada emoción en el texto."""
+        scores = dict.fromkeys(self.emotions, 0)
+        index = self.index
+        for word in tokenize(text):
+            emotion = index.get(word)
+            if emotion is not None:
+                scores[emotion] += 1
+        return scores
+
+
+def read_lexicon_file(path):
+    """Lee un léxico externo en JSON o CSV/TSV."""
+    path = str(path)
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    keywords = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        dialect = "excel-tab" if path.endswith(".tsv") else "excel"
+        for row in csv.reader(f, dialect=dialect):
+            if len(row) < 2 or not row[0].strip() or row[0].startswith("#"):
+                continue
+            keywords.setdefault(row[1].strip(), []).append(row[0])
+    return keywords
+
+
+def build_lexicon(path=None):
+    """Combina el léxico por defecto con el fichero externo, si existe."""
+    keywords = {emotion: list(words) for emotion, words in DEFAULT_KEYWORDS.items()}
+    if path:
+        try:
+            for emotion, words in read_lexicon_file(path).items():
+                keywords.setdefault(emotion, []).extend(words)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error al cargar el léxico {path}: {str(e)}")
+    lexicon = Lexicon(keywords)
+    logger.info(f"Léxico de emociones compilado con {len(lexicon)} términos")
+    return lexicon
+
+
+@lru_cache(maxsize=None)
+def get_lexicon():
+    """Léxico del proceso, compilado en el primer uso."""
+    return build_lexicon(getattr(settings, "EMOTION_LEXICON_PATH", None))
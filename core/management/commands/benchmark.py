@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import inference
+from core.benchmarks import environment, load, micro
+from core.benchmarks.fake_spotify import FakeSpotifyServer
+from core.benchmarks.stub import StubBackend
+from core.inference import InferenceEngine
+from core.spotify import reset_spotify_client
+
+STUB_BACKEND = "core.benchmarks.stub.StubBackend"
+
+
+def int_list(value):
+    try:
+        return [int(item) for item in value.split(",") if item]
+    except ValueError:
+        raise CommandError(f"Lista de enteros inválida: {value}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los benchmarks de carga (mood_match y API) y los microbenchmarks sobre "
+        "una base de datos desechable y guarda los resultados en JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suite", choices=["load", "micro", "all"], default="all")
+        parser.add_argument("--output", "-o", default="benchmark-results.json", help="Fichero JSON de resultados")
+
+        load_group = parser.add_argument_group("carga")
+        load_group.add_argument("--endpoints", default=",".join(load.ENDPOINTS),
+                                help="Endpoints separados por comas (mood_match, api_analyze)")
+        load_group.add_argument("--concurrency", default="1,4,16", help="Niveles de concurrencia, p. ej. 1,4,16")
+        load_group.add_argument("--requests", type=int, default=200, help="Peticiones por nivel de concurrencia")
+        load_group.add_argument("--batch-size", type=int, default=16, help="Textos por petición de la API")
+        load_group.add_argument("--unique-ratio", type=float, default=0.5,
+                                help="Proporción de textos distintos (el resto repite y usa la caché)")
+        load_group.add_argument("--real-model", action="store_true",
+                                help="Usar el modelo configurado en lugar del clasificador determinista")
+        load_group.add_argument("--backend", help="Backend con --real-model; por defecto EMOTION_BACKEND")
+        load_group.add_argument("--stub-batch-latency-ms", type=float, default=StubBackend.batch_latency_ms)
+        load_group.add_argument("--stub-item-latency-ms", type=float, default=StubBackend.item_latency_ms)
+        load_group.add_argument("--spotify-latency-ms", type=float, default=30.0,
+                                help="Latencia del servidor de Spotify simulado")
+
+        micro_group = parser.add_argument_group("micro")
+        micro_group.add_argument("--rows", default="10000,100000,1000000",
+                                 help="Tamaños de tabla para los microbenchmarks")
+        micro_group.add_argument("--iterations", type=int, default=200, help="Repeticiones por microbenchmark")
+
+    def handle(self, *args, **options):
+        concurrency = int_list(options["concurrency"])
+        rows = sorted(int_list(options["rows"]))
+        endpoints = [e for e in options["endpoints"].split(",") if e]
+        unknown = set(endpoints) - set(load.ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Endpoints desconocidos: {', '.join(sorted(unknown))}")
+
+        # Los logs por petición distorsionan las medidas
+        logging.disable(logging.INFO)
+        old_name = connection.settings_dict["NAME"]
+        tmpdir = None
+        if connection.vendor == "sqlite":
+            # Fichero en disco: compartido entre hilos y comparable con producción
+            tmpdir = tempfile.TemporaryDirectory(prefix="moodmatch-bench-")
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tmpdir.name, "bench.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        results = {"environment": environment(), "options": {
+            key: options[key] for key in (
+                "suite", "endpoints", "concurrency", "requests", "batch_size", "unique_ratio",
+                "real_model", "backend", "stub_batch_latency_ms", "stub_item_latency_ms",
+                "spotify_latency_ms", "rows", "iterations",
+            )
+        }}
+        try:
+            # Host del cliente de pruebas de Django
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                if options["suite"] in ("load", "all"):
+                    results["load"] = self.run_load(options, endpoints, concurrency)
+                if options["suite"] in ("micro", "all"):
+                    results["micro"] = self.run_micro(rows, options["iterations"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir is not None:
+                tmpdir.cleanup()
+            logging.disable(logging.NOTSET)
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+    def run_load(self, options, endpoints, concurrency):
+        if options["real_model"]:
+            backend_name = options["backend"] or getattr(settings, "EMOTION_BACKEND", "pytorch")
+        else:
+            backend_name = STUB_BACKEND
+            StubBackend.batch_latency_ms = options["stub_batch_latency_ms"]
+            StubBackend.item_latency_ms = options["stub_item_latency_ms"]
+
+        previous_engine = inference.engine
+        engine = InferenceEngine(backend_name)
+        if not engine.warmup():
+            raise CommandError(f"No se pudo cargar el backend {backend_name}: {engine.load_error}")
+        inference.engine = engine
+
+        server = FakeSpotifyServer(latency_ms=options["spotify_latency_ms"]).start()
+        previous_env = {key: os.environ.get(key) for key in ("SPOTIPY_CLIENT_ID", "SPOTIPY_CLIENT_SECRET")}
+        os.environ.update(SPOTIPY_CLIENT_ID="benchmark", SPOTIPY_CLIENT_SECRET="benchmark")
+        runs = []
+        try:
+            with override_settings(
+                SPOTIFY_API_PREFIX=f"{server.base_url}/v1/",
+                SPOTIFY_TOKEN_URL=f"{server.base_url}/api/token",
+            ):
+                reset_spotify_client()
+                for endpoint in endpoints:
+                    for level in concurrency:
+                        load.reset_state(inference.engine)
+                        batch_size = options["batch_size"]
+                        texts = load.make_texts(
+                            options["requests"] * (batch_size if endpoint == "api_analyze" else 1),
+                            options["unique_ratio"],
+                        )
+                        run = load.run_load(endpoint, level, options["requests"], texts, batch_size)
+                        run["backend"] = inference.engine.backend.version
+                        if inference.engine.cache is not None:
+                            run["emotion_cache"] = inference.engine.cache.stats()
+                        run["spotify_requests"] = dict(server.requests)
+                        runs.append(run)
+                        latency = run["latency_ms"]
+                        self.stdout.write(
+                            f"{endpoint} c={level}: {run['throughput_rps']:.1f} req/s, "
+                            f"p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+                            f"p99 {latency['p99']:.1f} ms, errores {run['errors']}"
+                        )
+        finally:
+            reset_spotify_client()
+            server.stop()
+            for key, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            inference.engine = previous_engine
+        return runs
+
+    def run_micro(self, rows, iterations):
+        results = [{"rows": 0, "benchmarks": micro.fallback_benchmarks(iterations * 10)}]
+        for size in rows:
+            self.stdout.write(f"Sembrando {size} filas...")
+            micro.seed_entries(size)
+            benchmarks = micro.table_benchmarks(iterations)
+            results.append({"rows": size, "benchmarks": benchmarks})
+            for name, stats in benchmarks.items():
+                self.stdout.write(f"  {name} ({size} filas): p50 {stats['p50']:.3f} ms, p95 {stats['p95']:.3f} ms")
+        return results
@@ -0,0 +1,74 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.lexicon import DEFAULT_KEYWORDS, Lexicon
+
+SAMPLE_TEXTS = [
+    "Hoy me siento muy feliz y contento con todo",
+    "Estoy triste, deprimido y con mucho dolor",
+    "Me da rabia, estoy furioso y molesto",
+    "Tengo miedo, estoy preocupada y ansiosa por mañana",
+    "Te quiero, te adoro, eres mi amor",
+    "No sé muy bien cómo me siento hoy la verdad",
+    "Estoy bien pero a la vez un poco mal, con pena y temor",
+]
+
+
+def legacy_fallback_scores(text, emotion_keywords):
+    """Copia del algoritmo original: búsqueda lineal en cada lista por palabra."""
+    text = text.lower().strip()
+    emotion_keywords = {emotion: list(words) for emotion, words in emotion_keywords.items()}
+    emotion_scores = {emotion: 0 for emotion in emotion_keywords}
+    for word in text.split():
+        for emotion, keywords in emotion_keywords.items():
+            if word in keywords:
+                emotion_scores[emotion] += 1
+    return emotion_scores
+
+
+class Command(BaseCommand):
+    help = "Compara el análisis fallback original con el léxico compilado"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument(
+            "--extra-terms",
+            type=int,
+            default=0,
+            help="Términos sintéticos adicionales por emoción para simular un léxico grande",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        keywords = {emotion: list(words) for emotion, words in DEFAULT_KEYWORDS.items()}
+        rng = random.Random(42)
+        for words in keywords.values():
+            for _ in range(options["extra_terms"]):
+                words.append("".join(rng.choices(string.ascii_lowercase, k=8)))
+
+        total_terms = sum(len(words) for words in keywords.values())
+        self.stdout.write(f"Léxico: {total_terms} términos, {iterations} iteraciones por texto")
+
+        # El original no incluye aquí el coste de los logs INFO por palabra
+        legacy = self._measure(lambda text: legacy_fallback_scores(text, keywords), iterations)
+
+        build_start = time.perf_counter()
+        lexicon = Lexicon(keywords)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        compiled = self._measure(lexicon.score, iterations)
+
+        self.stdout.write(f"Compilación del índice (una vez por proceso): {build_ms:.2f} ms")
+        self.stdout.write(f"Original:  {legacy:.2f} µs por texto")
+        self.stdout.write(f"Compilado: {compiled:.2f} µs por texto")
+        self.stdout.write(self.style.SUCCESS(f"Aceleración: x{legacy / compiled:.1f}"))
+
+    def _measure(self, func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for text in SAMPLE_TEXTS:
+                func(text)
+        elapsed = time.perf_counter() - start
+        return elapsed / (iterations * len(SAMPLE_TEXTS)) * 1e6
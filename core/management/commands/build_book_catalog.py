@@ -0,0 +1,56 @@
+import itertools
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.book_catalog import build_catalog, read_books, write_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Construye el catálogo local de libros por emoción a partir de volcados "
+        "JSON/JSONL (p. ej. respuestas de Google Books) o CSV"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("sources", nargs="+", help="Ficheros .json, .jsonl o .csv con libros")
+        parser.add_argument("--output", "-o", help="Fichero del catálogo; por defecto BOOK_CATALOG_PATH")
+        parser.add_argument("--per-key", type=int, default=50,
+                            help="Libros como mucho por emoción o par de emociones")
+        parser.add_argument("--min-score", type=int, default=1,
+                            help="Puntuación mínima para etiquetar un libro con una emoción")
+        parser.add_argument("--language", help="Solo libros en este idioma (p. ej. es); sin idioma se aceptan")
+
+    def handle(self, *args, **options):
+        output = options["output"] or getattr(settings, "BOOK_CATALOG_PATH", None)
+        if not output:
+            raise CommandError("Indique --output o configure BOOK_CATALOG_PATH")
+
+        start = time.perf_counter()
+        try:
+            records = itertools.chain.from_iterable(read_books(path) for path in options["sources"])
+            catalog = build_catalog(
+                records,
+                per_key=options["per_key"],
+                min_score=options["min_score"],
+                language=options["language"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Error leyendo los libros: {e}")
+
+        if not catalog["books"]:
+            raise CommandError("Ningún libro se pudo etiquetar con una emoción; no se escribe el catálogo")
+        write_catalog(catalog, output)
+
+        for key, ids in catalog["index"].items():
+            self.stdout.write(f"{key}: {len(ids)} libros")
+        stats = catalog["stats"]
+        self.stdout.write(
+            f"{stats['records']} registros: {stats['invalid']} inválidos, {stats['duplicates']} duplicados, "
+            f"{stats['other_language']} en otro idioma y {stats['untagged']} sin emoción"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Catálogo con {len(catalog['books'])} libros escrito en {output} "
+            f"({time.perf_counter() - start:.1f} s)"
+        ))
@@ -0,0 +1,313 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.admission import thread_budget
+from core.models import EmotionalEntry
+
+# Backend cargado una vez en cada proceso del pool (o en el propio proceso con --workers 0)
+_backend = None
+_backend_error = None
+
+
+def default_workers():
+    # Cada proceso carga su copia del modelo: pocos procesos con varios hilos cada uno
+    return max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def _init_worker(backend_name, use_model, threads=None):
+    global _backend, _backend_error
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        # Con el método "spawn" el proceso hijo empieza sin Django configurado
+        django.setup()
+    if not use_model:
+        return
+    from core.admission import apply_thread_budget
+    from core.backends import load_backend
+
+    try:
+        _backend = load_backend(backend_name, num_threads=threads)
+        apply_thread_budget(_backend, threads)
+    except Exception as e:
+        _backend_error = str(e)
+
+
+def _classify_batch(texts, use_model=True):
+    """
+    Clasifica un lote; devuelve (resultados, problema). Los resultados son
+    (primaria, secundaria, puntuaciones) por texto; ``problema`` es None si
+    clasificó el modelo (o no se pidió) y si no ``("unavailable" | "error", mensaje)``
+    y el lote se ha clasificado con el fallback.
+    """
+    from core.inference import interpret_prediction
+    from core.views import fallback_emotion_analysis
+
+    problem = None
+    if use_model and _backend is not None:
+        try:
+            return [interpret_prediction(dist) for dist in _backend.predict(texts)], None
+        except Exception as e:
+            problem = ("error", f"{type(e).__name__}: {e}")
+    elif use_model:
+        problem = ("unavailable", _backend_error or "modelo no cargado")
+    return [(*fallback_emotion_analysis(text), None) for text in texts], problem
+
+
+def read_records(path, fmt, text_field, date_field):
+    """Lee el fichero en streaming; produce (texto, fecha) sin cargarlo entero."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            if text_field not in (reader.fieldnames or []):
+                raise CommandError(f"La columna '{text_field}' no existe en {path}")
+            for row in reader:
+                yield row.get(text_field), row.get(date_field) if date_field else None
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield None, None
+                    continue
+                if not isinstance(row, dict):
+                    yield None, None
+                    continue
+                yield row.get(text_field), row.get(date_field) if date_field else None
+
+
+def parse_fecha(value):
+    if not value:
+        return None
+    fecha = parse_datetime(str(value))
+    if fecha is not None and timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+class Command(BaseCommand):
+    help = (
+        "Clasifica un corpus CSV/JSONL por lotes con un pool de procesos y guarda las "
+        "entradas con bulk_create; se puede reanudar desde un punto de control"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichero CSV (con cabecera) o JSONL")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Por defecto según la extensión")
+        parser.add_argument("--text-field", default="texto", help="Columna o clave con el texto")
+        parser.add_argument("--date-field", help="Columna o clave con la fecha (ISO 8601); por defecto ahora")
+        parser.add_argument("--workers", type=int, default=default_workers(),
+                            help="Procesos de clasificación (cada uno con su copia del modelo); "
+                                 "0 clasifica en este proceso")
+        parser.add_argument("--batch-size", type=int, default=64, help="Textos por pasada del modelo")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Filas por bulk_create y punto de control")
+        parser.add_argument("--backend", help="Backend del modelo (pytorch, onnx, remote); por defecto EMOTION_BACKEND")
+        parser.add_argument("--fallback-only", action="store_true", help="Usar solo el análisis por palabras clave")
+        parser.add_argument("--strict", action="store_true",
+                            help="Abortar (conservando el punto de control) si el modelo no está disponible "
+                                 "o falla un lote, en lugar de usar el fallback")
+        parser.add_argument("--checkpoint", help="Fichero de control; por defecto <path>.checkpoint")
+        parser.add_argument("--restart", action="store_true", help="Ignorar el punto de control y empezar de cero")
+        parser.add_argument("--progress-every", type=float, default=5.0, help="Segundos entre líneas de progreso")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No existe el fichero {path}")
+        fmt = options["format"] or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        batch_size = options["batch_size"]
+        chunk_size = options["chunk_size"]
+        if batch_size < 1 or chunk_size < 1 or options["workers"] < 0:
+            raise CommandError("--batch-size y --chunk-size deben ser positivos y --workers no negativo")
+
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint"
+        skip = 0
+        if os.path.exists(checkpoint) and not options["restart"]:
+            skip = self._load_checkpoint(checkpoint)
+            self.stdout.write(f"Reanudando desde el registro {skip} ({checkpoint})")
+
+        self.stats = {"processed": skip, "saved": 0, "invalid": 0, "fallback": 0, "model_errors": 0}
+        self.strict = options["strict"]
+        self.reported_problems = set()
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.progress_every = options["progress_every"]
+
+        records = islice(read_records(path, fmt, options["text_field"], options["date_field"]), skip, None)
+        batches = self._batches(records, batch_size)
+        use_model = not options["fallback_only"]
+
+        pending_rows = []
+        workers = options["workers"]
+        # Núcleos repartidos entre los procesos para que sus hilos de cómputo no compitan
+        threads = thread_budget(workers=max(1, workers))
+        if workers == 0:
+            _init_worker(options["backend"], use_model, threads)
+            for rows, texts in batches:
+                pending_rows.extend(self._merge(rows, texts, _classify_batch(texts, use_model)))
+                pending_rows = self._flush(pending_rows, chunk_size, checkpoint)
+        else:
+            # No heredar conexiones abiertas en los procesos hijos
+            connections.close_all()
+            max_in_flight = workers * 2
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(options["backend"], use_model, threads)
+            ) as pool:
+                try:
+                    # Cola acotada y resultados en orden: memoria constante y punto de control exacto
+                    in_flight = deque()
+                    for rows, texts in batches:
+                        in_flight.append((rows, texts, pool.submit(_classify_batch, texts, use_model)))
+                        if len(in_flight) >= max_in_flight:
+                            rows, texts, future = in_flight.popleft()
+                            pending_rows.extend(self._merge(rows, texts, future.result()))
+                            pending_rows = self._flush(pending_rows, chunk_size, checkpoint)
+                    while in_flight:
+                        rows, texts, future = in_flight.popleft()
+                        pending_rows.extend(self._merge(rows, texts, future.result()))
+                        pending_rows = self._flush(pending_rows, chunk_size, checkpoint)
+                except CommandError:
+                    # --strict: no esperar a los lotes pendientes
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+
+        self._flush(pending_rows, chunk_size, checkpoint, force=True)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self._report(final=True)
+
+    def _batches(self, records, batch_size):
+        """
+        Agrupa los registros en lotes de textos válidos. Cada lote lleva todas las
+        filas leídas (también las inválidas) para que el punto de control avance.
+        """
+        from core.views import validate_text
+
+        rows, texts = [], []
+        for texto, fecha in records:
+            try:
+                if not isinstance(texto, str):
+                    raise ValidationError("Texto ausente")
+                rows.append((validate_text(texto), parse_fecha(fecha)))
+                texts.append(rows[-1][0])
+            except (ValidationError, ValueError):
+                rows.append(None)
+            if len(texts) >= batch_size:
+                yield rows, texts
+                rows, texts = [], []
+        if rows:
+            yield rows, texts
+
+    def _check(self, texts, problem):
+        """Informa de un lote clasificado con el fallback por culpa del modelo; con --strict aborta."""
+        kind, message = problem
+        if kind == "error":
+            self.stats["model_errors"] += len(texts)
+        if self.strict:
+            raise CommandError(
+                f"{'Modelo no disponible' if kind == 'unavailable' else 'Error del modelo en un lote'}: {message}. "
+                f"Se puede reanudar desde el registro {self.stats['processed']}"
+            )
+        # Cada problema distinto se informa una vez; el total sale en el progreso
+        if message not in self.reported_problems:
+            self.reported_problems.add(message)
+            prefix = "Modelo no disponible" if kind == "unavailable" else "Error del modelo en un lote"
+            self.stderr.write(f"{prefix}, se usa el fallback: {message}")
+
+    def _merge(self, rows, texts, outcome):
+        results, problem = outcome
+        if problem is not None:
+            self._check(texts, problem)
+        results = iter(results)
+        merged = []
+        for row in rows:
+            if row is None:
+                merged.append(None)
+                continue
+            primary, secondary, scores = next(results)
+            merged.append((row, primary, secondary, scores))
+        return merged
+
+    def _flush(self, rows, chunk_size, checkpoint, force=False):
+        while len(rows) >= chunk_size or (force and rows):
+            chunk, rows = rows[:chunk_size], rows[chunk_size:]
+            entries = []
+            for item in chunk:
+                if item is None:
+                    self.stats["invalid"] += 1
+                    continue
+                (texto, fecha), primary, secondary, scores = item
+                if scores is None:
+                    self.stats["fallback"] += 1
+                entry = EmotionalEntry(
+                    texto=texto,
+                    emocion_primaria=primary,
+                    emocion_secundaria=secondary,
+                    puntuaciones=scores,
+                )
+                if fecha is not None:
+                    entry.fecha = fecha
+                entries.append(entry)
+            previous = self.stats["processed"]
+            with transaction.atomic():
+                if entries:
+                    EmotionalEntry.objects.bulk_create(entries)
+                # Dentro de la transacción: si el proceso muere antes del commit, el punto
+                # de control nombra una fila que no existe y al reanudar se repite el bloque
+                self._save_checkpoint(checkpoint, previous + len(chunk), previous, entries[-1] if entries else None)
+            self.stats["saved"] += len(entries)
+            self.stats["processed"] = previous + len(chunk)
+            self._report()
+        return rows
+
+    def _save_checkpoint(self, checkpoint, processed, previous, last_entry):
+        data = {"processed": processed, "previous": previous}
+        if last_entry is not None and last_entry.pk is not None:
+            data.update(last_pk=last_entry.pk, last_texto=last_entry.texto)
+        tmp = f"{checkpoint}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, checkpoint)
+
+    def _load_checkpoint(self, checkpoint):
+        """Registros ya guardados según el punto de control, comprobando que su último bloque se confirmó."""
+        with open(checkpoint, encoding="utf-8") as f:
+            data = json.load(f)
+        last_pk = data.get("last_pk")
+        if last_pk is not None and not EmotionalEntry.objects.filter(pk=last_pk, texto=data.get("last_texto")).exists():
+            self.stderr.write("El último bloque del punto de control no llegó a guardarse; se repite")
+            return data.get("previous", 0)
+        return data.get("processed", 0)
+
+    def _report(self, final=False):
+        now = time.perf_counter()
+        if not final and now - self.last_report < self.progress_every:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        rate = self.stats["saved"] / elapsed if elapsed > 0 else 0.0
+        line = (
+            f"{self.stats['processed']} registros, {self.stats['saved']} guardados, "
+            f"{self.stats['invalid']} inválidos, {self.stats['fallback']} con fallback "
+            f"({self.stats['model_errors']} por errores del modelo), {rate:.0f} filas/s"
+        )
+        if final:
+            self.stdout.write(self.style.SUCCESS(f"Completado: {line}"))
+        else:
+            self.stdout.write(line)
+            self.stdout.flush()
@@ -0,0 +1,115 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.evaluation import FALLBACK, load_dataset, run_path_isolated, score
+
+
+def available_paths():
+    """Rutas que tiene sentido probar con la configuración actual."""
+    paths = [getattr(settings, "EMOTION_BACKEND", "pytorch")]
+    onnx_dir = getattr(settings, "EMOTION_ONNX_MODEL_DIR", None)
+    if onnx_dir and os.path.isdir(onnx_dir):
+        paths += ["onnx", "onnx-int8"]
+    socket_path = getattr(settings, "EMOTION_SERVER_SOCKET", None)
+    if socket_path and os.path.exists(socket_path):
+        paths.append("remote")
+    paths.append(FALLBACK)
+    return list(dict.fromkeys(paths))
+
+
+class Command(BaseCommand):
+    help = (
+        "Evalúa cada ruta de clasificación (modelo, backends alternativos y fallback) con las "
+        "entradas revisadas: exactitud, matriz de confusión, latencia, rendimiento y memoria"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paths", help="Rutas separadas por comas (pytorch, onnx, onnx-int8, remote, "
+                                            "fallback o ruta de clase); por defecto las disponibles")
+        parser.add_argument("--limit", type=int, help="Máximo de entradas (las más recientes)")
+        parser.add_argument("--include-confirmed", action="store_true",
+                            help="Usar también como referencia la emoción de las entradas revisadas y "
+                                 "marcadas como correctas (salida del propio modelo: sesgada a su favor)")
+        parser.add_argument("--include-unreviewed", action="store_true",
+                            help="Como --include-confirmed, tomando como correctas también las entradas "
+                                 "sin notas de revisión")
+        parser.add_argument("--batch-size", type=int, default=32, help="Textos por lote al medir el rendimiento")
+        parser.add_argument("--latency-samples", type=int, default=100, help="Textos clasificados uno a uno")
+        parser.add_argument("--min-accuracy", type=float, default=0.0,
+                            help="Exactitud mínima para recomendar una ruta")
+        parser.add_argument("--output", "-o", help="Guardar el informe completo en JSON")
+
+    def handle(self, *args, **options):
+        paths = [p for p in (options["paths"] or "").split(",") if p] or available_paths()
+        labelled, rejected, confirmed = load_dataset(
+            options["limit"], options["include_unreviewed"], options["include_confirmed"]
+        )
+        if not labelled and not rejected:
+            raise CommandError(
+                "No hay entradas corregidas. Añada notas de revisión con la emoción correcta "
+                "o use --include-confirmed"
+            )
+        self.stdout.write(
+            f"{len(labelled) - confirmed} entradas con etiqueta corregida, {confirmed} con etiqueta "
+            f"confirmada y {len(rejected)} con etiqueta rechazada"
+        )
+        if confirmed:
+            self.stdout.write(self.style.WARNING(
+                f"{confirmed} etiquetas de referencia son la salida del modelo que clasificó las entradas: "
+                "la exactitud está sesgada a favor de ese modelo y no incluye sus errores sin revisar"
+            ))
+        texts = [texto for texto, _ in labelled + rejected]
+
+        report = {
+            "samples": len(labelled), "confirmed_samples": confirmed, "rejected_samples": len(rejected), "paths": [],
+        }
+        for path in paths:
+            self.stdout.write(f"Evaluando {path}...")
+            result = run_path_isolated(path, texts, options["batch_size"], options["latency_samples"])
+            if "error" in result:
+                self.stderr.write(f"  {path} no disponible: {result['error']}")
+                report["paths"].append(result)
+                continue
+            result.update(score(result.pop("predictions"), labelled, rejected))
+            report["paths"].append(result)
+            self._print(result)
+
+        candidates = [
+            r for r in report["paths"]
+            if "error" not in r and r["accuracy"] is not None and r["accuracy"] >= options["min_accuracy"]
+        ]
+        if candidates:
+            best = max(candidates, key=lambda r: r["throughput_texts_per_s"])
+            report["recommended"] = best["path"]
+            self.stdout.write(self.style.SUCCESS(
+                f"Ruta más rápida con exactitud >= {options['min_accuracy']:.2f}: {best['path']}"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING("Ninguna ruta alcanza la exactitud mínima"))
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Informe guardado en {options['output']}")
+
+    def _print(self, result):
+        accuracy = f"{result['accuracy']:.3f}" if result["accuracy"] is not None else "n/d"
+        latency = result["latency_ms"]
+        self.stdout.write(
+            f"  {result['version']}: exactitud {accuracy}, "
+            f"latencia p50 {latency.get('p50', 0):.2f} ms / p95 {latency.get('p95', 0):.2f} ms, "
+            f"{result['throughput_texts_per_s']:.0f} textos/s (lote {result['batch_size']}), "
+            f"carga {result['load_ms']:.0f} ms, RSS pico {result['peak_rss_mb']:.0f} MB"
+        )
+        if result["rejected_label_repeat_rate"] is not None:
+            self.stdout.write(f"  repite la etiqueta rechazada en {result['rejected_label_repeat_rate']:.1%}")
+        emotions = sorted(set(result["confusion"]) | {p for row in result["confusion"].values() for p in row})
+        if emotions:
+            width = max(len(e) for e in emotions) + 2
+            self.stdout.write("  " + " " * width + "".join(e.rjust(width) for e in emotions))
+            for expected in sorted(result["confusion"]):
+                row = result["confusion"][expected]
+                self.stdout.write("  " + expected.ljust(width) + "".join(str(row.get(e, 0)).rjust(width) for e in emotions))
@@ -0,0 +1,63 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import DEFAULT_CHUNK_SIZE, FORMATS, export_chunks, filter_entries
+
+
+class Command(BaseCommand):
+    help = "Exporta las entradas emocionales en streaming a CSV, JSONL o Parquet (p. ej. para reentrenar el modelo)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="Fichero de salida; por defecto la salida estándar")
+        parser.add_argument("--start", help="Primer día a exportar (AAAA-MM-DD)")
+        parser.add_argument("--end", help="Último día a exportar (AAAA-MM-DD)")
+        parser.add_argument("--emotion", help="Solo entradas con esta emoción primaria")
+        review = parser.add_mutually_exclusive_group()
+        review.add_argument("--correct", dest="correct", action="store_const", const=True,
+                            help="Solo entradas marcadas como correctas")
+        review.add_argument("--incorrect", dest="correct", action="store_const", const=False,
+                            help="Solo entradas marcadas como incorrectas")
+        notes = parser.add_mutually_exclusive_group()
+        notes.add_argument("--reviewed", dest="reviewed", action="store_const", const=True,
+                           help="Solo entradas con notas de revisión")
+        notes.add_argument("--unreviewed", dest="reviewed", action="store_const", const=False,
+                           help="Solo entradas sin notas de revisión")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Filas leídas por consulta")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size debe ser positivo")
+
+        queryset = filter_entries(
+            start=start,
+            end=end,
+            emotion=options["emotion"],
+            correct=options["correct"],
+            reviewed=options["reviewed"],
+        )
+        chunks = export_chunks(queryset, options["format"], options["chunk_size"])
+
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Exportados {written} bytes a {options['output']}"))
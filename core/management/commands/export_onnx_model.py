@@ -0,0 +1,159 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backends import (
+    DEFAULT_MODEL_NAME,
+    MAX_LENGTH,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MODEL_FILE,
+    OnnxBackend,
+    PipelineBackend,
+)
+
+# Frases de ejemplo para comprobar que ONNX y PyTorch coinciden
+SAMPLE_TEXTS = [
+    "Hoy me siento muy feliz, todo me sale bien",
+    "Estoy triste porque extraño a mi familia",
+    "Me da mucha rabia que nadie me escuche",
+    "Tengo miedo de no aprobar el examen",
+    "¡No me lo puedo creer, qué sorpresa!",
+    "Te quiero mucho, eres lo mejor que me ha pasado",
+    "No sé qué pensar de todo esto",
+    "Estoy preocupado por el trabajo y no duermo bien",
+    "Qué asco me da la gente que miente",
+    "Estoy contento pero también un poco nervioso",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta el modelo de emociones a ONNX (opcionalmente cuantizado a int8) "
+        "y verifica que sus etiquetas coinciden con el pipeline de PyTorch"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            default=getattr(settings, "EMOTION_MODEL_NAME", DEFAULT_MODEL_NAME),
+            help="Modelo de Hugging Face a exportar",
+        )
+        parser.add_argument(
+            "--output",
+            default=getattr(settings, "EMOTION_ONNX_MODEL_DIR", "onnx_model"),
+            help="Directorio de salida",
+        )
+        parser.add_argument(
+            "--no-quantize",
+            action="store_true",
+            help="No generar la variante cuantizada a int8",
+        )
+        parser.add_argument(
+            "--samples",
+            help="Fichero de texto con frases de verificación (una por línea)",
+        )
+        parser.add_argument(
+            "--min-agreement",
+            type=float,
+            default=1.0,
+            help="Proporción mínima de etiquetas iguales para aceptar la exportación",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import torch
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        except ImportError as e:
+            raise CommandError(f"Faltan dependencias para exportar: {e}")
+
+        model_name = options["model"]
+        output = options["output"]
+        os.makedirs(output, exist_ok=True)
+
+        self.stdout.write(f"Cargando {model_name}...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+
+        # El directorio de salida contiene todo lo que necesita OnnxBackend
+        tokenizer.save_pretrained(output)
+        model.config.save_pretrained(output)
+
+        model_path = os.path.join(output, ONNX_MODEL_FILE)
+        dummy = tokenizer(
+            ["texto de ejemplo"], padding=True, truncation=True,
+            max_length=MAX_LENGTH, return_tensors="pt"
+        )
+        self.stdout.write(f"Exportando a {model_path}...")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy["input_ids"], dummy["attention_mask"]),
+                model_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=14,
+            )
+
+        variants = [(False, model_path)]
+        if not options["no_quantize"]:
+            try:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+            except ImportError as e:
+                raise CommandError(f"onnxruntime no está instalado (pip install -r requirements-optional.txt): {e}")
+            quantized_path = os.path.join(output, ONNX_QUANTIZED_MODEL_FILE)
+            self.stdout.write(f"Cuantizando a int8 en {quantized_path}...")
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+            variants.append((True, quantized_path))
+
+        texts = self._load_samples(options["samples"])
+        reference = PipelineBackend(model_name)
+        expected = self._timed_predict(reference, texts, "pytorch")
+
+        for quantized, path in variants:
+            backend = OnnxBackend(output, quantized=quantized)
+            predicted = self._timed_predict(backend, texts, backend.version)
+            matches = sum(
+                1 for exp, pred in zip(expected, predicted) if exp[0]["label"] == pred[0]["label"]
+            )
+            agreement = matches / len(texts)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            self.stdout.write(
+                f"{backend.version}: {matches}/{len(texts)} etiquetas coinciden "
+                f"({agreement:.0%}), {size_mb:.1f} MB"
+            )
+            for text, exp, pred in zip(texts, expected, predicted):
+                if exp[0]["label"] != pred[0]["label"]:
+                    self.stdout.write(
+                        f"  - '{text}': pytorch={exp[0]['label']} onnx={pred[0]['label']}"
+                    )
+            if agreement < options["min_agreement"]:
+                raise CommandError(
+                    f"{backend.version} no alcanza la concordancia mínima "
+                    f"({agreement:.0%} < {options['min_agreement']:.0%})"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Modelo exportado correctamente en {output}"))
+
+    def _load_samples(self, path):
+        if not path:
+            return SAMPLE_TEXTS
+        with open(path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        if not texts:
+            raise CommandError(f"El fichero {path} no contiene frases")
+        return texts
+
+    def _timed_predict(self, backend, texts, label):
+        start = time.perf_counter()
+        results = [backend.predict([text])[0] for text in texts]
+        elapsed = (time.perf_counter() - start) * 1000 / len(texts)
+        self.stdout.write(f"{label}: {elapsed:.1f} ms por texto")
+        return results
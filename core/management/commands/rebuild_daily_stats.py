@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el resumen diario de emociones (EmotionDailyStat) para un rango de fechas; "
+        "para un resultado exacto, ejecutar con las escrituras de entradas paradas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Primer día a recalcular (AAAA-MM-DD); por defecto el primero")
+        parser.add_argument("--end", help="Último día a recalcular (AAAA-MM-DD); por defecto el último")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+        if start and end and start > end:
+            raise CommandError("--start no puede ser posterior a --end")
+
+        rows = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario recalculado: {rows} filas"))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.spotify import get_spotify_client
+from core.emotion_cache import cache_is_shared
+from core.track_pool import refresh_all
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los pools de canciones de Spotify por emoción y por par de emociones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=2, help="Páginas de 50 resultados por búsqueda")
+        parser.add_argument("--no-pairs", action="store_true", help="No construir pools por par de emociones")
+        parser.add_argument(
+            "--loop",
+            type=int,
+            metavar="SEGUNDOS",
+            help="Repetir la renovación cada SEGUNDOS (refresco periódico)",
+        )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            # Los pools quedarían en la memoria de este proceso y los workers no los verían
+            raise CommandError(
+                "La caché de Django es local del proceso; configure una caché compartida "
+                "(p. ej. CACHE_URL=rediscache://127.0.0.1:6379/1) para que los workers vean los pools"
+            )
+        try:
+            sp = get_spotify_client()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        while True:
+            start = time.perf_counter()
+            sizes = refresh_all(sp, pairs=not options["no_pairs"], pages=options["pages"])
+            for key, size in sizes.items():
+                if size is None:
+                    self.stdout.write(self.style.WARNING(f"{key}: error (se mantiene el pool anterior)"))
+                else:
+                    self.stdout.write(f"{key}: {size} canciones")
+            self.stdout.write(self.style.SUCCESS(
+                f"Pools renovados en {time.perf_counter() - start:.1f} s"
+            ))
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
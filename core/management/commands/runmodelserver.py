@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.admission import server_thread_budget
+from core.inference import InferenceEngine
+from core.model_server import ModelServer
+
+
+class Command(BaseCommand):
+    help = "Arranca el servidor local de inferencia que comparten los workers web"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=getattr(settings, "EMOTION_SERVER_SOCKET", "/tmp/moodmatch-model.sock"),
+            help="Ruta del socket Unix",
+        )
+        parser.add_argument(
+            "--backend",
+            default=getattr(settings, "EMOTION_SERVER_BACKEND", "pytorch"),
+            help="Backend local que carga el servidor (pytorch u onnx)",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            help="Hilos de cómputo del modelo; por defecto EMOTION_SERVER_THREADS o todos los núcleos",
+        )
+
+    def handle(self, *args, **options):
+        if options["backend"] == "remote":
+            raise CommandError("El servidor de modelo necesita un backend local")
+
+        threads = options["threads"] or server_thread_budget()
+        engine = InferenceEngine(backend_name=options["backend"], num_threads=threads)
+        if not engine.warmup():
+            raise CommandError(f"No se pudo cargar el modelo: {engine.load_error}")
+
+        server = ModelServer(options["socket"], engine)
+        self.stdout.write(self.style.SUCCESS(
+            f"Servidor de modelo ({engine.backend.version}, {threads} hilos) escuchando en {options['socket']}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,25 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inference import get_engine
+
+
+class Command(BaseCommand):
+    help = "Carga el modelo de emociones y ejecuta una inferencia de prueba, mostrando los tiempos"
+
+    def handle(self, *args, **options):
+        already_imported = "torch" in sys.modules
+        start = time.perf_counter()
+        engine = get_engine()
+        if not engine.warmup():
+            raise CommandError(f"No se pudo cargar el modelo: {engine.load_error}")
+        total_ms = (time.perf_counter() - start) * 1000
+
+        self.stdout.write(f"Backend: {engine.backend.version}")
+        if already_imported:
+            self.stdout.write("torch ya estaba importado antes del precalentamiento")
+        self.stdout.write(f"Carga del modelo (incluye importar torch/transformers): {engine.timings['load_ms']:.0f} ms")
+        self.stdout.write(f"Primera inferencia: {engine.timings['warmup_inference_ms']:.0f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Precalentamiento completado en {total_ms:.0f} ms"))
@@ -0,0 +1,281 @@
+"""
+Instrumentación de latencia por etapa.
+
+``timed("etapa")`` mide un bloque y registra la duración en dos sitios:
+
+- la lista de la petición en curso (``contextvars``), que
+  ``server_timing_middleware`` devuelve en la cabecera ``Server-Timing``;
+- un histograma del proceso (ventana con las últimas muestras de cada etapa)
+  que ``metrics_view`` publica en formato de texto de Prometheus con
+  p50/p95/p99, junto a los contadores de fallback, caché, batcher y Spotify.
+
+Las métricas son por proceso: con varios workers, Prometheus debe consultar
+cada uno o agregarlas por instancia. ``/metrics`` exige la cabecera
+``Authorization: Bearer <MOODMATCH_METRICS_TOKEN>`` o un usuario de staff;
+sin token configurado solo lo ve el staff.
+"""
+import asyncio
+import hmac
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class Reservoir:
+    """
+    Ventana deslizante con las últimas ``size`` muestras, más contador y suma
+    exactos de toda la vida del proceso. Los percentiles reflejan el tráfico
+    reciente y no se diluyen con las horas de funcionamiento.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in quantiles}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in quantiles}
+
+
+class Registry:
+    def __init__(self, reservoir_size=1024):
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = Counter()
+
+    def observe(self, stage, ms):
+        with self._lock:
+            reservoir = self.stages.get(stage)
+            if reservoir is None:
+                reservoir = self.stages[stage] = Reservoir(self.reservoir_size)
+            reservoir.add(ms)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                stage: (reservoir.quantiles(), reservoir.count, reservoir.total)
+                for stage, reservoir in self.stages.items()
+            }
+            return stages, dict(self.counters)
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+
+registry = Registry(getattr(settings, "MOODMATCH_METRICS_RESERVOIR_SIZE", 1024))
+
+
+def record(stage, ms):
+    registry.observe(stage, ms)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, ms))
+
+
+def increment(name, amount=1):
+    registry.increment(name, amount)
+
+
+@contextmanager
+def timed(stage):
+    """Mide el bloque como ``stage`` (nombre corto sin espacios ni acentos)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - start) * 1000)
+
+
+def record_classification(scores):
+    """Cuenta una clasificación; sin puntuaciones es que vino del fallback."""
+    increment("classifications")
+    if scores is None:
+        increment("fallbacks")
+
+
+def server_timing_header(timings):
+    # Varias mediciones de la misma etapa (p. ej. dos búsquedas) se suman
+    totals = {}
+    for stage, ms in timings:
+        totals[stage] = totals.get(stage, 0.0) + ms
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in totals.items())
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Recoge las etapas de la petición y las añade en la cabecera ``Server-Timing``."""
+
+    def finish(response, timings, start):
+        ms = (time.perf_counter() - start) * 1000
+        registry.observe("total", ms)
+        timings.append(("total", ms))
+        response["Server-Timing"] = server_timing_header(timings)
+        return response
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = []
+            token = _request_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _request_timings.reset(token)
+            return finish(response, timings, start)
+    else:
+        def middleware(request):
+            timings = []
+            token = _request_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _request_timings.reset(token)
+            return finish(response, timings, start)
+
+    return middleware
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus():
+    """Todas las métricas del proceso en formato de texto de Prometheus."""
+    # Importaciones diferidas: no cargar el modelo ni Spotify al importar este módulo
+    from .admission import get_controller
+    from .circuit_breaker import STATES, all_breakers
+    from .inference import get_engine
+    from .persistence import get_buffer
+    from .spotify import spotify_stats
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {value}")
+
+    stages, counters = registry.snapshot()
+    samples = []
+    for stage in sorted(stages):
+        quantiles, count, total = stages[stage]
+        for q in QUANTILES:
+            samples.append(("", {"stage": stage, "quantile": q}, f"{quantiles[q]:.3f}"))
+        samples.append(("_sum", {"stage": stage}, f"{total:.3f}"))
+        samples.append(("_count", {"stage": stage}, count))
+    metric("moodmatch_stage_duration_ms", "summary", "Duración por etapa en milisegundos", samples)
+
+    classifications = counters.get("classifications", 0)
+    fallbacks = counters.get("fallbacks", 0)
+    metric("moodmatch_classifications_total", "counter", "Textos clasificados", [("", None, classifications)])
+    metric("moodmatch_fallback_total", "counter", "Clasificaciones resueltas con el fallback", [("", None, fallbacks)])
+    metric(
+        "moodmatch_fallback_ratio", "gauge", "Proporción de clasificaciones con fallback",
+        [("", None, f"{fallbacks / classifications if classifications else 0.0:.4f}")],
+    )
+    for name in sorted(set(counters) - {"classifications", "fallbacks"}):
+        metric(f"moodmatch_{name}_total", "counter", f"Contador {name}", [("", None, counters[name])])
+
+    # Solo si el modelo ya está cargado: consultar métricas no debe cargarlo
+    engine = get_engine()
+    metric("moodmatch_model_loaded", "gauge", "1 si el modelo está cargado", [("", None, int(engine.backend is not None))])
+    if engine.cache is not None:
+        cache_stats = engine.cache.stats()
+        for key in ("local_hits", "shared_hits", "misses", "evictions"):
+            metric(f"moodmatch_emotion_cache_{key}_total", "counter", f"Caché de emociones: {key}",
+                   [("", None, cache_stats[key])])
+        metric("moodmatch_emotion_cache_hit_ratio", "gauge", "Tasa de aciertos de la caché de emociones",
+               [("", None, f"{cache_stats['hit_rate']:.4f}")])
+    if engine.batcher is not None:
+        batch_stats = engine.batcher.stats()
+        metric("moodmatch_batcher_batches_total", "counter", "Lotes ejecutados", [("", None, batch_stats["batches"])])
+        metric("moodmatch_batcher_items_total", "counter", "Textos procesados en lote", [("", None, batch_stats["items"])])
+        metric("moodmatch_batcher_queue_depth", "gauge", "Textos esperando lote", [("", None, batch_stats["queue_depth"])])
+        metric("moodmatch_batcher_avg_queue_wait_ms", "gauge", "Espera media en cola (ms)",
+               [("", None, f"{batch_stats['avg_queue_wait_ms']:.3f}")])
+        metric("moodmatch_batcher_rejected_total", "counter", "Llamadas rechazadas por la cola del batcher", [
+            ("", {"reason": "queue_full"}, batch_stats["rejected_queue_full"]),
+            ("", {"reason": "timeout"}, batch_stats["rejected_timeout"]),
+        ])
+
+    controller = get_controller()
+    if controller is not None:
+        admission = controller.stats()
+        metric("moodmatch_inference_active", "gauge", "Pasadas del modelo en curso", [("", None, admission["active"])])
+        metric("moodmatch_inference_waiting", "gauge", "Pasadas del modelo esperando plaza",
+               [("", None, admission["waiting"])])
+        metric("moodmatch_inference_admitted_total", "counter", "Pasadas del modelo admitidas",
+               [("", None, admission["admitted"])])
+        metric("moodmatch_inference_rejected_total", "counter", "Pasadas del modelo sin plaza", [
+            ("", {"reason": "queue_full"}, admission["rejected_queue_full"]),
+            ("", {"reason": "timeout"}, admission["rejected_timeout"]),
+        ])
+
+    buffer = get_buffer()
+    if buffer is not None:
+        write_stats = buffer.stats()
+        metric("moodmatch_write_behind_queue_depth", "gauge", "Entradas pendientes de guardar",
+               [("", None, write_stats["queue_depth"])])
+        for key in ("written", "batches", "overflow", "failed"):
+            metric(f"moodmatch_write_behind_{key}_total", "counter", f"Escritura diferida: {key}",
+                   [("", None, write_stats[key])])
+
+    breakers = sorted(all_breakers().items())
+    if breakers:
+        breaker_stats = [(name, breaker.stats()) for name, breaker in breakers]
+        metric("moodmatch_circuit_state", "gauge", "1 en el estado actual de cada cortocircuito", [
+            ("", {"service": name, "state": state}, int(stats["state"] == state))
+            for name, stats in breaker_stats for state in STATES
+        ])
+        for key in ("calls", "failures", "trips", "short_circuits"):
+            metric(f"moodmatch_circuit_{key}_total", "counter", f"Cortocircuito: {key}",
+                   [("", {"service": name}, stats[key]) for name, stats in breaker_stats])
+
+    for key, value in sorted(spotify_stats().items()):
+        metric(f"moodmatch_spotify_{key}_total", "counter", f"Spotify: {key}", [("", None, value)])
+
+    return "\n".join(lines) + "\n"
+
+
+def _metrics_allowed(request):
+    token = getattr(settings, "MOODMATCH_METRICS_TOKEN", "")
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def metrics_view(request):
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
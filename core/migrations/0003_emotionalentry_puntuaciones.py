@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_emotionalentry_notas_revision_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emotionalentry",
+            name="puntuaciones",
+            field=models.JSONField(
+                blank=True, null=True, verbose_name="Puntuaciones del modelo"
+            ),
+        ),
+    ]
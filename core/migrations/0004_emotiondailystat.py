@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    EmotionalEntry = apps.get_model('core', 'EmotionalEntry')
+    EmotionDailyStat = apps.get_model('core', 'EmotionDailyStat')
+    rows = EmotionalEntry.objects.order_by().annotate(dia=TruncDate('fecha')).values(
+        'dia', 'emocion_primaria'
+    ).annotate(
+        total=Count('id'),
+        correctas=Count('id', filter=Q(respuesta_correcta=True)),
+    )
+    EmotionDailyStat.objects.bulk_create(
+        [
+            EmotionDailyStat(
+                dia=row['dia'],
+                emocion=row['emocion_primaria'],
+                total=row['total'],
+                correctas=row['correctas'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_emotionalentry_puntuaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Día')),
+                ('emocion', models.CharField(max_length=50, verbose_name='Emoción primaria')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Entradas')),
+                ('correctas', models.PositiveIntegerField(default=0, verbose_name='Entradas correctas')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Última actualización')),
+            ],
+            options={
+                'verbose_name': 'Estadística diaria',
+                'verbose_name_plural': 'Estadísticas diarias',
+                'ordering': ['dia', 'emocion'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emotiondailystat',
+            constraint=models.UniqueConstraint(fields=('dia', 'emocion'), name='unique_dia_emocion'),
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
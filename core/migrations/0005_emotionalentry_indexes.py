@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_emotiondailystat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emotionalentry',
+            index=models.Index(fields=['-fecha'], name='core_entrada_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emotionalentry',
+            index=models.Index(fields=['respuesta_correcta', '-fecha'], name='core_entrada_correcta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emotionalentry',
+            index=models.Index(fields=['emocion_primaria', 'fecha'], name='core_entrada_emocion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emotionalentry',
+            index=models.Index(fields=['emocion_secundaria', 'fecha'], name='core_entrada_secundaria_idx'),
+        ),
+    ]
@@ -0,0 +1,147 @@
+"""
+Servidor local de inferencia sobre un socket Unix.
+
+Un único proceso (``manage.py runmodelserver``) mantiene el modelo en memoria y
+atiende a los workers web, que usan ``RemoteBackend`` como cliente ligero.
+Así la memoria del modelo no se multiplica por el número de workers.
+
+Protocolo: cada mensaje es un JSON en UTF-8 precedido de su longitud como
+entero de 4 bytes big-endian.
+
+- Petición: ``{"texts": ["...", ...]}``
+- Respuesta: ``{"results": [[{"label": ..., "score": ...}, ...], ...]}``
+  o ``{"error": "..."}``.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Conexión cerrada por el otro extremo")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, payload):
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"Mensaje demasiado grande: {size} bytes")
+    return json.loads(_recv_exactly(sock, size).decode("utf-8"))
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Conexiones persistentes: atender peticiones hasta que el cliente cierre
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            except (ProtocolError, ValueError) as e:
+                logger.warning(f"Petición inválida al servidor de modelo: {str(e)}")
+                return
+
+            try:
+                texts = request["texts"]
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError("'texts' debe ser una lista de cadenas")
+                response = {"results": self.server.engine.predict_many(texts)}
+            except Exception as e:
+                logger.error(f"Error en el servidor de modelo: {str(e)}")
+                response = {"error": str(e)}
+
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Servidor de inferencia; las peticiones concurrentes se agrupan en el micro-batcher."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, engine):
+        self.engine = engine
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o660)
+
+
+class ModelServerClient:
+    """Cliente con una conexión persistente por hilo."""
+
+    def __init__(self, socket_path, timeout=2.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def classify(self, texts):
+        sock = getattr(self._local, "sock", None)
+        reused = sock is not None
+        try:
+            if sock is None:
+                sock = self._connect()
+            send_message(sock, {"texts": list(texts)})
+            response = recv_message(sock)
+        except (ConnectionError, BrokenPipeError) as e:
+            self._close()
+            if not reused:
+                raise
+            # La conexión reutilizada pudo quedar obsoleta (p. ej. reinicio del servidor)
+            logger.info(f"Reconectando con el servidor de modelo: {str(e)}")
+            sock = self._connect()
+            try:
+                send_message(sock, {"texts": list(texts)})
+                response = recv_message(sock)
+            except Exception:
+                self._close()
+                raise
+        except Exception:
+            self._close()
+            raise
+
+        if "error" in response:
+            raise RuntimeError(f"El servidor de modelo devolvió un error: {response['error']}")
+        return response["results"]
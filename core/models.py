@@ -1,6 +1,41 @@
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.dispatch import Signal
 from django.utils import timezone
 
+# bulk_create no envía post_save; este aviso permite mantener los resúmenes
+entradas_creadas_en_bloque = Signal()
+
+
+class EmotionalEntryManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = self.bulk_insert(objs, *args, **kwargs)
+        entradas_creadas_en_bloque.send(sender=self.model, entries=objs)
+        return objs
+
+    def bulk_insert(self, objs, *args, **kwargs):
+        """``bulk_create`` con los ids asignados, sin enviar ``entradas_creadas_en_bloque``."""
+        objs = list(objs)
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        if (
+            connection.vendor != "sqlite"
+            or connection.features.can_return_rows_from_bulk_insert
+            or kwargs.get("ignore_conflicts")
+            or any(obj.pk is not None for obj in objs)
+        ):
+            objs = super().bulk_create(objs, *args, **kwargs)
+        else:
+            # SQLite no devuelve los ids insertados; la tendencia los necesita para
+            # ordenar su ventana. Dentro de la transacción nadie más puede escribir,
+            # así que los ids más altos son los recién insertados, en orden.
+            with transaction.atomic(using=db):
+                objs = super().bulk_create(objs, *args, **kwargs)
+                ids = list(self.using(db).order_by("-pk").values_list("pk", flat=True)[:len(objs)])
+            if len(ids) == len(objs):
+                for obj, pk in zip(objs, reversed(ids)):
+                    obj.pk = pk
+        return objs
+
 # Create your models here.
 
 class EmotionalEntry(models.Model):
@@ -10,22 +45,48 @@ class EmotionalEntry(models.Model):
     fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha de registro")
     respuesta_correcta = models.BooleanField(default=True, verbose_name="¿Respuesta correcta?")
     notas_revision = models.TextField(blank=True, null=True, verbose_name="Notas de revisión")
+    puntuaciones = models.JSONField(blank=True, null=True, verbose_name="Puntuaciones del modelo")
+
+    objects = EmotionalEntryManager()
     
     class Meta:
         verbose_name = "Entrada Emocional"
         verbose_name_plural = "Entradas Emocionales"
         ordering = ['-fecha']  # Ordenar por fecha descendente
+        indexes = [
+            # Últimas entradas, Max(fecha) y filtros por fecha del admin
+            models.Index(fields=['-fecha'], name='core_entrada_fecha_idx'),
+            # Tendencia: entradas correctas más recientes y estadísticas por rango
+            models.Index(fields=['respuesta_correcta', '-fecha'], name='core_entrada_correcta_idx'),
+            # GROUP BY de emoción primaria y filtros del admin
+            models.Index(fields=['emocion_primaria', 'fecha'], name='core_entrada_emocion_idx'),
+            models.Index(fields=['emocion_secundaria', 'fecha'], name='core_entrada_secundaria_idx'),
+        ]
     
     def __str__(self):
         return f"{self.emocion_primaria} - {self.fecha.strftime('%d/%m/%Y %H:%M')}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardar los valores cargados para detectar cambios de revisión al guardar
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
+
     @classmethod
     def get_tendencia(cls):
         """Analiza la tendencia emocional basada en las últimas entradas"""
         ultimas_entradas = cls.objects.filter(respuesta_correcta=True).order_by('-fecha')[:5]
         if not ultimas_entradas:
             return None
-            
+        return cls.calcular_tendencia([entrada.emocion_primaria for entrada in ultimas_entradas])
+
+    @staticmethod
+    def calcular_tendencia(emociones):
+        """Tendencia a partir de las emociones primarias, de la más reciente a la más antigua"""
+        if not emociones:
+            return None
+
         # Mapeo de emociones a valores numéricos (simplificado)
         emocion_valor = {
             'joy': 1,
@@ -38,7 +99,7 @@ class EmotionalEntry(models.Model):
             'disgust': -1
         }
         
-        valores = [emocion_valor.get(entrada.emocion_primaria.lower(), 0) for entrada in ultimas_entradas]
+        valores = [emocion_valor.get(emocion.lower(), 0) for emocion in emociones]
         if len(valores) >= 2:
             tendencia = sum(valores[:3]) / len(valores[:3]) - sum(valores[-2:]) / len(valores[-2:])
             if tendencia > 0.3:
@@ -68,3 +129,23 @@ class EmotionalEntry(models.Model):
         ).order_by('dia', 'emocion_primaria')
         
         return stats
+
+
+class EmotionDailyStat(models.Model):
+    """Resumen diario por emoción primaria, mantenido de forma incremental"""
+    dia = models.DateField(verbose_name="Día")
+    emocion = models.CharField(max_length=50, verbose_name="Emoción primaria")
+    total = models.PositiveIntegerField(default=0, verbose_name="Entradas")
+    correctas = models.PositiveIntegerField(default=0, verbose_name="Entradas correctas")
+    actualizado = models.DateTimeField(auto_now=True, verbose_name="Última actualización")
+
+    class Meta:
+        verbose_name = "Estadística diaria"
+        verbose_name_plural = "Estadísticas diarias"
+        ordering = ['dia', 'emocion']
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'emocion'], name='unique_dia_emocion'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia:%d/%m/%Y} - {self.emocion}: {self.correctas}/{self.total}"
@@ -0,0 +1,205 @@
+"""
+Persistencia de ``EmotionalEntry`` con escritura diferida opcional.
+
+Con ``EMOTION_WRITE_BEHIND`` activo, ``save_entry`` no escribe en la petición:
+encola la entrada y un hilo de fondo la guarda con ``bulk_create`` cuando se
+llena el lote o pasa ``EMOTION_WRITE_BEHIND_FLUSH_INTERVAL``. La cola está
+acotada; si se llena, la entrada se escribe en la propia petición en lugar de
+perderse. Al terminar el proceso se vacía la cola (``atexit``).
+
+Las señales de ``bulk_create`` mantienen la tendencia y el resumen diario, así
+que reflejan la entrada cuando el hilo la escribe (normalmente en menos de un
+segundo), no en la misma petición.
+
+``configure_sqlite`` ajusta cada conexión SQLite nueva (WAL, ``synchronous``
+y ``busy_timeout``) para que lectores y escritor no se bloqueen entre sí.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import EmotionalEntry, entradas_creadas_en_bloque
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Cola acotada de entradas que un hilo de fondo guarda por lotes."""
+
+    def __init__(self, max_queue=10000, batch_size=200, flush_interval=1.0, name="entries"):
+        self.max_queue = max(1, int(max_queue))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_interval))
+        self.name = name
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._pending = 0  # encoladas o en escritura
+        self._flush_requested = False
+        self._worker = None
+        self._pid = None
+
+        # Estadísticas
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._batches = 0
+        self._overflow = 0
+        self._failed = 0
+
+        atexit.register(self.flush)
+
+    def submit(self, entry):
+        """Encola una entrada sin guardar; si la cola está llena la guarda ya."""
+        with self._cond:
+            if len(self._queue) < self.max_queue:
+                self._ensure_worker()
+                self._queue.append((entry, time.monotonic()))
+                self._pending += 1
+                self._cond.notify_all()
+                return entry
+
+        with self._stats_lock:
+            self._overflow += 1
+            overflow = self._overflow
+        if overflow == 1 or overflow % 100 == 0:
+            logger.warning(f"Cola de escritura diferida llena, guardando en la petición ({overflow} veces)")
+        entry.save()
+        return entry
+
+    def flush(self, timeout=10.0):
+        """Pide escribir ya lo encolado y espera a que termine. Devuelve False si no acaba a tiempo."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._pending:
+                return True
+            self._ensure_worker()
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error(f"Quedan {self._pending} entradas sin guardar tras {timeout} s")
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": len(self._queue),
+                "written": self._written,
+                "batches": self._batches,
+                "overflow": self._overflow,
+                "failed": self._failed,
+                "max_queue": self.max_queue,
+                "batch_size": self.batch_size,
+                "flush_interval_s": self.flush_interval,
+            }
+
+    def _ensure_worker(self):
+        # Se llama con self._cond tomado; tras un fork el hilo del padre no existe
+        if self._worker is not None and self._worker.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._worker = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+        self._worker.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            # Esperar a completar el lote, a que venza el intervalo o a un flush()
+            deadline = self._queue[0][1] + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._flush_requested:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft()[0])
+            if not self._queue:
+                self._flush_requested = False
+            return batch
+
+    def _write(self, batch):
+        # Solo se reintenta la inserción: repetirla tras guardar duplicaría las filas
+        for attempt in (1, 2):
+            close_old_connections()
+            try:
+                EmotionalEntry.objects.bulk_insert(batch)
+                break
+            except Exception as e:
+                logger.error(f"Error guardando {len(batch)} entradas (intento {attempt}): {str(e)}")
+                time.sleep(0.5)
+        else:
+            return False
+
+        # Tendencia y resumen diario: un fallo se registra, las entradas ya están guardadas
+        for receiver, result in entradas_creadas_en_bloque.send_robust(sender=EmotionalEntry, entries=batch):
+            if isinstance(result, Exception):
+                logger.error(f"Error actualizando los resúmenes de {len(batch)} entradas guardadas: {str(result)}")
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            ok = self._write(batch)
+            with self._stats_lock:
+                if ok:
+                    self._written += len(batch)
+                    self._batches += 1
+                else:
+                    self._failed += len(batch)
+            if not ok:
+                logger.error(f"Se descartan {len(batch)} entradas tras fallar la escritura")
+            with self._cond:
+                self._pending -= len(batch)
+                self._cond.notify_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Cola de escritura diferida del proceso, o None si no está activada."""
+    global _buffer
+    if not getattr(settings, "EMOTION_WRITE_BEHIND", False):
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(
+                max_queue=getattr(settings, "EMOTION_WRITE_BEHIND_MAX_QUEUE", 10000),
+                batch_size=getattr(settings, "EMOTION_WRITE_BEHIND_BATCH_SIZE", 200),
+                flush_interval=getattr(settings, "EMOTION_WRITE_BEHIND_FLUSH_INTERVAL", 1.0),
+            )
+        return _buffer
+
+
+def save_entry(**fields):
+    """Crea una ``EmotionalEntry``: en diferido si está activado, si no en el momento."""
+    buffer = get_buffer()
+    if buffer is None:
+        return EmotionalEntry.objects.create(**fields)
+    return buffer.submit(EmotionalEntry(**fields))
+
+
+def configure_sqlite(connection):
+    """WAL, escritura menos estricta y espera ante bloqueos para una conexión SQLite nueva."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        if getattr(settings, "SQLITE_WAL", True):
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Con WAL, NORMAL sigue siendo seguro ante caídas de la aplicación
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 5000))}")
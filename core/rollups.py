@@ -0,0 +1,162 @@
+"""
+Resumen diario de emociones (``EmotionDailyStat``).
+
+Cada fila cuenta, para un día y una emoción primaria, las entradas totales y
+las marcadas como correctas. Se actualiza de forma incremental desde las
+señales de ``EmotionalEntry`` (alta, revisión y borrado), y ``rebuild`` lo
+recalcula para cualquier rango de fechas (``manage.py rebuild_daily_stats``).
+El gráfico de estadísticas del admin lee directamente de aquí.
+
+``rebuild`` bloquea las escrituras de entradas mientras recalcula (en
+PostgreSQL con ``LOCK TABLE ... IN SHARE MODE``; en SQLite el borrado toma el
+cerrojo de escritura antes de contar). Una entrada guardada justo antes pero
+cuyo incremento llega después puede contarse dos veces, así que para un
+resultado exacto conviene ejecutarlo con las escrituras paradas.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import EmotionalEntry, EmotionDailyStat
+
+
+def day_of(fecha):
+    return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+
+
+def _bump(dia, emocion, total=0, correctas=0):
+    if not total and not correctas:
+        return
+    # Los contadores no bajan de 0 aunque el resumen se haya desviado (son PositiveIntegerField)
+    updated = EmotionDailyStat.objects.filter(dia=dia, emocion=emocion).update(
+        total=Greatest(F("total") + total, 0),
+        correctas=Greatest(F("correctas") + correctas, 0),
+        actualizado=timezone.now(),
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            EmotionDailyStat.objects.create(
+                dia=dia, emocion=emocion, total=max(total, 0), correctas=max(correctas, 0)
+            )
+    except IntegrityError:
+        # Otro proceso creó la fila a la vez: aplicar el incremento sobre ella
+        _bump(dia, emocion, total, correctas)
+
+
+def record_entries(entries):
+    """Suma entradas nuevas (creadas una a una o con bulk_create)."""
+    totals = Counter()
+    correct = Counter()
+    for entry in entries:
+        key = (day_of(entry.fecha), entry.emocion_primaria)
+        totals[key] += 1
+        if entry.respuesta_correcta:
+            correct[key] += 1
+    for (dia, emocion), total in totals.items():
+        _bump(dia, emocion, total, correct[(dia, emocion)])
+
+
+def record_change(entry, previous):
+    """Mueve una entrada revisada de su fila anterior a la nueva."""
+    old_key = (
+        day_of(previous.get("fecha", entry.fecha)),
+        previous.get("emocion_primaria", entry.emocion_primaria),
+    )
+    old_correct = previous.get("respuesta_correcta", entry.respuesta_correcta)
+    new_key = (day_of(entry.fecha), entry.emocion_primaria)
+    if old_key == new_key and old_correct == entry.respuesta_correcta:
+        return
+
+    if old_key == new_key:
+        _bump(*new_key, correctas=1 if entry.respuesta_correcta else -1)
+        return
+    _bump(*old_key, total=-1, correctas=-1 if old_correct else 0)
+    _bump(*new_key, total=1, correctas=1 if entry.respuesta_correcta else 0)
+
+
+def record_deletion(entry):
+    _bump(day_of(entry.fecha), entry.emocion_primaria, total=-1,
+          correctas=-1 if entry.respuesta_correcta else 0)
+
+
+def _lock_entries():
+    # Bloquea altas, revisiones y borrados de entradas (no las lecturas) hasta el commit
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {connection.ops.quote_name(EmotionalEntry._meta.db_table)} IN SHARE MODE"
+            )
+
+
+def rebuild(start=None, end=None):
+    """Recalcula el resumen entre ``start`` y ``end`` (fechas incluidas). Devuelve las filas creadas."""
+    entries = EmotionalEntry.objects.order_by()
+    stats = EmotionDailyStat.objects.all()
+    if start:
+        entries = entries.filter(fecha__date__gte=start)
+        stats = stats.filter(dia__gte=start)
+    if end:
+        entries = entries.filter(fecha__date__lte=end)
+        stats = stats.filter(dia__lte=end)
+
+    rows = entries.annotate(dia=TruncDate("fecha")).values("dia", "emocion_primaria").annotate(
+        total=Count("id"),
+        correctas=Count("id", filter=Q(respuesta_correcta=True)),
+    )
+    with transaction.atomic():
+        _lock_entries()
+        # El recuento (``rows`` se evalúa aquí) va después del borrado, ya con el cerrojo
+        stats.delete()
+        created = EmotionDailyStat.objects.bulk_create(
+            [
+                EmotionDailyStat(
+                    dia=row["dia"],
+                    emocion=row["emocion_primaria"],
+                    total=row["total"],
+                    correctas=row["correctas"],
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+    return len(created)
+
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def period_start(dia, granularity):
+    """Primer día del periodo (día, semana ISO desde el lunes o mes) que contiene ``dia``."""
+    if granularity == "week":
+        return dia - timedelta(days=dia.weekday())
+    if granularity == "month":
+        return dia.replace(day=1)
+    return dia
+
+
+def get_series(days=30, granularity="day"):
+    """
+    Entradas correctas por emoción y periodo para los últimos ``days`` días, en
+    formato columnar: (periodos, emociones, series) donde ``series[i][j]`` es el
+    total de ``emociones[i]`` en ``periodos[j]``.
+    """
+    end = timezone.localdate()
+    start = end - timedelta(days=days)
+    rows = EmotionDailyStat.objects.filter(
+        dia__range=(start, end), correctas__gt=0
+    ).values_list("dia", "emocion", "correctas")
+
+    totals = Counter()
+    for dia, emocion, correctas in rows:
+        totals[(period_start(dia, granularity), emocion)] += correctas
+
+    periods = sorted({period for period, _ in totals})
+    emotions = sorted({emocion for _, emocion in totals})
+    series = [[totals[(period, emotion)] for period in periods] for emotion in emotions]
+    return [period.strftime("%Y-%m-%d") for period in periods], emotions, series
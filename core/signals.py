@@ -0,0 +1,43 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import persistence, rollups, trends
+from .models import EmotionalEntry, entradas_creadas_en_bloque
+
+
+@receiver(post_save, sender=EmotionalEntry)
+def entry_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        trends.record_entries([instance])
+        rollups.record_entries([instance])
+    else:
+        previous = getattr(instance, "_valores_cargados", {})
+        trends.record_change(instance, previous)
+        rollups.record_change(instance, previous)
+
+    # Los valores guardados pasan a ser la referencia para el siguiente cambio
+    instance._valores_cargados = {
+        "emocion_primaria": instance.emocion_primaria,
+        "respuesta_correcta": instance.respuesta_correcta,
+        "fecha": instance.fecha,
+    }
+
+
+@receiver(post_delete, sender=EmotionalEntry)
+def entry_deleted(sender, instance, **kwargs):
+    trends.invalidate()
+    rollups.record_deletion(instance)
+
+
+@receiver(entradas_creadas_en_bloque, sender=EmotionalEntry)
+def entries_bulk_created(sender, entries, **kwargs):
+    trends.record_entries(entries)
+    rollups.record_entries(entries)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    persistence.configure_sqlite(connection)
@@ -0,0 +1,242 @@
+"""
+Cliente de Spotify compartido por todo el proceso.
+
+En lugar de crear un ``Spotify`` y pedir un token nuevo en cada petición, se
+reutiliza un único cliente con un pool de conexiones HTTP keep-alive y un
+almacén de tokens (memoria + caché de Django) que renueva el token antes de
+que caduque.
+
+Las búsquedas pasan por ``spotify_search``: un cortocircuito compartido por
+el proceso deja de llamar a Spotify mientras falla, y la sesión recorta el
+timeout de cada llamada a lo que queda del plazo de la petición.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from spotipy import Spotify
+from spotipy.cache_handler import CacheHandler
+from spotipy.exceptions import SpotifyException
+from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOauthError
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from .circuit_breaker import call_timeout, get_breaker, remaining
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "clients_created": 0,
+    "token_refreshes": 0,
+    "new_connections": 0,
+}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def spotify_stats():
+    """Contadores de clientes creados, renovaciones de token y conexiones nuevas."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("new_connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("new_connections")
+        return super()._new_conn()
+
+
+class CountingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """Adaptador HTTP que cuenta las conexiones nuevas que abre el pool."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+class DeadlineSession(requests.Session):
+    """Sesión que recorta el timeout de cada petición HTTP al plazo restante de la petición web."""
+
+    def request(self, method, url, **kwargs):
+        kwargs["timeout"] = call_timeout(kwargs.get("timeout"))
+        return super().request(method, url, **kwargs)
+
+
+class DeadlineRetry(Retry):
+    """
+    Reintentos que respetan el plazo de la petición: no se reintenta si la
+    espera (backoff o ``Retry-After`` de un 429) no deja tiempo para otra llamada.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        left = remaining()
+        if left is not None:
+            wait = new_retry.get_backoff_time()
+            if response is not None and self.respect_retry_after_header:
+                wait = max(wait, new_retry.get_retry_after(response) or 0)
+            if left - wait < getattr(settings, "MOODMATCH_MIN_CALL_TIMEOUT", 0.1):
+                reason = error or ResponseError(f"sin tiempo de la petición para reintentar ({left:.2f} s)")
+                raise MaxRetryError(_pool, url, reason) from reason
+        return new_retry
+
+
+def build_session(pool_size=10, retries=3):
+    """Sesión HTTP keep-alive con reintentos equivalentes a los de spotipy, acotados por el plazo."""
+    retry = DeadlineRetry(
+        total=retries,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=Spotify.default_retry_codes,
+    )
+    adapter = CountingHTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = DeadlineSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SharedTokenCacheHandler(CacheHandler):
+    """
+    Guarda el token en memoria y en la caché de Django, de forma que los
+    workers lo comparten. Un token que caduca en menos de ``refresh_margin``
+    segundos se considera caducado para renovarlo con antelación.
+    """
+
+    def __init__(self, client_id, refresh_margin=300):
+        digest = hashlib.sha1(client_id.encode("utf-8")).hexdigest()[:12]
+        self.key = f"spotify:token:{digest}"
+        self.refresh_margin = refresh_margin
+        self._token = None
+
+    def _fresh(self, token_info):
+        return token_info and token_info.get("expires_at", 0) - time.time() > self.refresh_margin
+
+    def get_cached_token(self):
+        if self._fresh(self._token):
+            return self._token
+        try:
+            token_info = cache.get(self.key)
+        except Exception as e:
+            logger.warning(f"Error leyendo el token de Spotify de la caché: {str(e)}")
+            token_info = None
+        if self._fresh(token_info):
+            self._token = token_info
+            return token_info
+        return None
+
+    def save_token_to_cache(self, token_info):
+        _count("token_refreshes")
+        self._token = token_info
+        timeout = max(1, int(token_info.get("expires_at", 0) - time.time()))
+        try:
+            cache.set(self.key, token_info, timeout)
+        except Exception as e:
+            logger.warning(f"Error guardando el token de Spotify en la caché: {str(e)}")
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_spotify_client():
+    """Cliente de Spotify del proceso; se crea en el primer uso."""
+    global _client, _client_pid
+
+    with _client_lock:
+        # Tras un fork no se comparten sockets con el proceso padre
+        if _client is not None and _client_pid == os.getpid():
+            return _client
+
+        spotify_id = os.getenv("SPOTIPY_CLIENT_ID")
+        spotify_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
+        if not all([spotify_id, spotify_secret]):
+            raise ValueError("Credenciales de Spotify no configuradas")
+
+        timeout = getattr(settings, "SPOTIFY_REQUEST_TIMEOUT", 5)
+        session = build_session(pool_size=getattr(settings, "SPOTIFY_POOL_SIZE", 10))
+        auth_manager = SpotifyClientCredentials(
+            client_id=spotify_id,
+            client_secret=spotify_secret,
+            requests_session=session,
+            requests_timeout=timeout,
+            cache_handler=SharedTokenCacheHandler(
+                spotify_id,
+                refresh_margin=getattr(settings, "SPOTIFY_TOKEN_REFRESH_MARGIN", 300),
+            ),
+        )
+        token_url = getattr(settings, "SPOTIFY_TOKEN_URL", None)
+        if token_url:
+            auth_manager.OAUTH_TOKEN_URL = token_url
+        _client = Spotify(
+            auth_manager=auth_manager,
+            requests_session=session,
+            requests_timeout=timeout,
+        )
+        api_prefix = getattr(settings, "SPOTIFY_API_PREFIX", None)
+        if api_prefix:
+            # Permite apuntar a un servidor local (p. ej. el de los benchmarks)
+            _client.prefix = api_prefix
+        _client_pid = os.getpid()
+        _count("clients_created")
+        return _client
+
+
+def reset_spotify_client():
+    """Descarta el cliente del proceso; el siguiente uso crea uno nuevo con la configuración actual."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def _is_failure_status(status):
+    return status == 429 or (status or 0) >= 500
+
+
+def is_spotify_failure(exc):
+    """
+    Errores de red, 429 y 5xx cuentan como fallo, también al pedir el token; un
+    4xx es una respuesta válida de Spotify. Lo demás (p. ej. ``DeadlineExceeded``)
+    no llegó a Spotify y no cuenta.
+    """
+    if isinstance(exc, SpotifyException):
+        return _is_failure_status(exc.http_status)
+    if isinstance(exc, SpotifyOauthError):
+        # spotipy lo lanza al tratar el HTTPError del endpoint de tokens
+        response = getattr(exc.__context__, "response", None)
+        if response is None:
+            return None
+        return _is_failure_status(response.status_code)
+    if isinstance(exc, requests.exceptions.RequestException):
+        return True
+    return None
+
+
+def spotify_search(sp, **kwargs):
+    """``sp.search`` a través del cortocircuito de Spotify (lanza ``CircuitOpen`` si está abierto)."""
+    return get_breaker("spotify", is_failure=is_spotify_failure).call(sp.search, **kwargs)
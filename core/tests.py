@@ -1,3 +1,1223 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import json
+import logging
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import requests
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from spotipy.exceptions import SpotifyException
+from spotipy.oauth2 import SpotifyOauthError
+
+from . import admission, book_catalog, evaluation, export, model_server, rollups, trends
+from .batching import MicroBatcher
+from .benchmarks.fake_spotify import FakeSpotifyServer
+from .circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, DeadlineExceeded, deadline, get_breaker,
+)
+from .emotion_cache import EmotionResultCache, model_version
+from .inference import EMOTION_MAPPING, InferenceEngine, interpret_prediction
+from .lexicon import DEFAULT_KEYWORDS, get_lexicon, normalize
+from .metrics import Reservoir
+from .model_server import ModelServer, ModelServerClient, ProtocolError, recv_message, send_message
+from .models import EmotionalEntry, EmotionDailyStat, entradas_creadas_en_bloque
+from .persistence import WriteBehindBuffer
+from .spotify import get_spotify_client, is_spotify_failure, reset_spotify_client, spotify_search
+from .views import DEFAULT_SONG, fallback_emotion_analysis, get_emotion
+
+EMOCIONES = ["joy", "sadness", "anger", "fear", "love"]
+
+
+class EmotionalEntryQueryPlanTests(TestCase):
+    """
+    Comprueba con EXPLAIN que las consultas frecuentes sobre EmotionalEntry usan
+    un índice en lugar de recorrer la tabla completa (SQLite y PostgreSQL).
+    """
+
+    ROWS = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(1234)
+        now = timezone.now()
+        # Siembra con bulk_create: las señales solo actualizan los resúmenes
+        EmotionalEntry.objects.bulk_create(
+            [
+                EmotionalEntry(
+                    texto="texto de prueba",
+                    emocion_primaria=rng.choice(EMOCIONES),
+                    emocion_secundaria=rng.choice(EMOCIONES),
+                    respuesta_correcta=rng.random() < 0.8,
+                    fecha=now - timedelta(minutes=i),
+                )
+                for i in range(cls.ROWS)
+            ],
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest(f"Sin comprobación de planes para {connection.vendor}")
+        if connection.vendor == "postgresql":
+            # Con una tabla de prueba el planificador podría preferir un Seq Scan
+            # aunque exista índice; así solo lo usa si no hay alternativa
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            table = EmotionalEntry._meta.db_table
+            full_scans = [
+                line for line in plan.splitlines()
+                if re.search(rf"\bSCAN (TABLE )?{table}\s*$", line)
+            ]
+            self.assertFalse(full_scans, f"Recorrido completo de la tabla:\n{plan}")
+            self.assertIn("USING", plan, plan)
+        else:
+            self.assertNotIn("Seq Scan", plan, plan)
+            self.assertIn("Index", plan, plan)
+
+    def test_ultimas_entradas(self):
+        self.assertUsesIndex(EmotionalEntry.objects.order_by("-fecha")[:5])
+
+    def test_ultima_fecha(self):
+        self.assertUsesIndex(EmotionalEntry.objects.order_by("-fecha").values("fecha")[:1])
+
+    def test_tendencia(self):
+        self.assertUsesIndex(
+            EmotionalEntry.objects.filter(respuesta_correcta=True).order_by("-fecha")[:5]
+        )
+
+    def test_agrupar_por_emocion(self):
+        self.assertUsesIndex(
+            EmotionalEntry.objects.order_by()
+            .values("emocion_primaria")
+            .annotate(total=Count("id"))
+        )
+
+    def test_filtro_admin_emocion_primaria(self):
+        self.assertUsesIndex(EmotionalEntry.objects.filter(emocion_primaria="joy"))
+
+    def test_filtro_admin_emocion_secundaria(self):
+        self.assertUsesIndex(EmotionalEntry.objects.filter(emocion_secundaria="fear"))
+
+    def test_filtro_admin_fecha(self):
+        desde = timezone.now() - timedelta(days=1)
+        self.assertUsesIndex(EmotionalEntry.objects.filter(fecha__gte=desde))
+
+    def test_estadisticas_por_rango(self):
+        hasta = timezone.now()
+        self.assertUsesIndex(
+            EmotionalEntry.objects.filter(
+                fecha__range=(hasta - timedelta(days=3), hasta), respuesta_correcta=True
+            )
+        )
+
+
+@override_settings(
+    EMOTION_BATCHING=True,
+    EMOTION_BATCH_MAX_SIZE=8,
+    EMOTION_BATCH_MAX_WAIT_MS=100,
+    EMOTION_CACHE_ENABLED=False,
+    EMOTION_ADMISSION_CONTROL=True,
+    EMOTION_MAX_CONCURRENCY=2,
+    EMOTION_ADMISSION_QUEUE=16,
+    EMOTION_ADMISSION_WAIT_MS=200,
+)
+class InferenceAdmissionTests(SimpleTestCase):
+    """El control de admisión limita pasadas del modelo, no peticiones en el micro-batcher."""
+
+    def setUp(self):
+        admission._controller = None
+        self.addCleanup(setattr, admission, "_controller", None)
+        self.engine = InferenceEngine("core.benchmarks.stub.StubBackend")
+        self.assertTrue(self.engine.load())
+
+    def test_peticiones_concurrentes_forman_lotes_completos(self):
+        threads = 8
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def worker(n):
+            barrier.wait()
+            try:
+                self.engine.predict(f"texto {n}")
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.engine.batcher.stats()["batch_size_histogram"], {8: 1})
+        stats = admission.get_controller().stats()
+        self.assertEqual(stats["admitted"], 1)
+        self.assertEqual(stats["rejected_queue_full"] + stats["rejected_timeout"], 0)
+
+    def test_sin_plaza_lanza_overloaded(self):
+        controller = admission.get_controller()
+        with controller.admit(), controller.admit():
+            with self.assertRaises(admission.Overloaded):
+                self.engine.predict_many(["a"] * 20)
+
+    def test_sobrecarga_en_el_batcher_rechaza_y_acota_la_latencia(self):
+        # 200 peticiones contra pasadas de 100 ms: sin límite la última esperaría 2,5 s
+        self.engine.backend.batch_latency_ms = 100.0
+        self.engine.backend.item_latency_ms = 0.0
+        threads = 200
+        barrier = threading.Barrier(threads)
+        latencies, rejected, errors = [], [], []
+
+        def worker(n):
+            barrier.wait()
+            start = time.monotonic()
+            try:
+                self.engine.predict(f"texto {n}")
+                latencies.append(time.monotonic() - start)
+            except admission.Overloaded:
+                rejected.append(n)
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertGreater(len(rejected), 150)
+        self.assertGreater(len(latencies), 0)
+        # Plazo de 200 ms hasta empezar el lote más una pasada de 100 ms, con margen
+        self.assertLess(max(latencies), 0.6)
+        stats = self.engine.batcher.stats()
+        self.assertGreater(stats["rejected_queue_full"], 0)
+        self.assertEqual(stats["rejected_queue_full"] + stats["rejected_timeout"], len(rejected))
+        self.assertEqual(stats["queue_depth"], 0)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Las llamadas concurrentes se agrupan y cada una recibe su resultado o el error del lote."""
+
+    def submit_concurrently(self, batcher, texts):
+        results = {}
+
+        def call(text):
+            try:
+                results[text] = batcher.submit(text, timeout=5)
+            except Exception as e:
+                results[text] = e
+
+        threads = [threading.Thread(target=call, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_llamadas_concurrentes_en_una_pasada(self):
+        calls = []
+
+        def predict_batch(texts):
+            calls.append(list(texts))
+            return [text.upper() for text in texts]
+
+        # La ventana es larga: el lote sale al llenarse con las cuatro llamadas
+        batcher = MicroBatcher(predict_batch, max_batch_size=4, max_wait_ms=5000, name="prueba")
+        texts = ["uno", "dos", "tres", "cuatro"]
+        results = self.submit_concurrently(batcher, texts)
+
+        self.assertEqual(len(calls), 1)
+        self.assertCountEqual(calls[0], texts)
+        self.assertEqual(results, {text: text.upper() for text in texts})
+        stats = batcher.stats()
+        self.assertEqual((stats["batches"], stats["items"], stats["batch_size_histogram"]), (1, 4, {4: 1}))
+
+    def test_resultados_en_orden_de_cada_llamador(self):
+        batcher = MicroBatcher(lambda texts: [len(text) for text in texts], max_batch_size=3, max_wait_ms=0)
+
+        self.assertEqual(batcher.submit_many(["a", "bbb", "cc", "dddd", "eeeee"]), [1, 3, 2, 4, 5])
+        self.assertEqual(batcher.stats()["batches"], 2)
+
+    def test_error_del_lote_llega_a_todos(self):
+        error = ValueError("modelo caído")
+
+        def predict_batch(texts):
+            raise error
+
+        batcher = MicroBatcher(predict_batch, max_batch_size=3, max_wait_ms=5000, name="prueba")
+        with self.assertLogs("core.batching", "ERROR"):
+            results = self.submit_concurrently(batcher, ["a", "b", "c"])
+
+        self.assertEqual(len(results), 3)
+        for result in results.values():
+            self.assertIs(result, error)
+        self.assertEqual(batcher.stats()["errors"], 1)
+
+    def test_numero_de_resultados_distinto_es_un_error(self):
+        batcher = MicroBatcher(lambda texts: texts[:1], max_batch_size=2, max_wait_ms=5000)
+        with self.assertLogs("core.batching", "ERROR"):
+            results = self.submit_concurrently(batcher, ["a", "b"])
+
+        for result in results.values():
+            self.assertIsInstance(result, RuntimeError)
+
+
+@override_settings(EMOTION_WARMUP_ON_STARTUP=True)
+class WarmupOnStartupTests(SimpleTestCase):
+    """El proceso padre del autorecargador de runserver no precarga el modelo."""
+
+    def warmed_up(self, argv, run_main=None):
+        with mock.patch("sys.argv", argv), mock.patch.dict(os.environ), \
+                mock.patch("core.inference.get_engine") as get_engine:
+            os.environ.pop("RUN_MAIN", None)
+            if run_main:
+                os.environ["RUN_MAIN"] = run_main
+            apps.get_app_config("core").ready()
+        return get_engine.return_value.warmup.called
+
+    def test_solo_precarga_el_proceso_que_atiende_peticiones(self):
+        self.assertFalse(self.warmed_up(["manage.py", "runserver"]))
+        self.assertTrue(self.warmed_up(["manage.py", "runserver"], run_main="true"))
+        self.assertTrue(self.warmed_up(["manage.py", "runserver", "--noreload"]))
+        self.assertTrue(self.warmed_up(["gunicorn", "moodmatch_project.wsgi"]))
+
+
+class ModelServerTests(SimpleTestCase):
+    """Protocolo con prefijo de longitud, ida y vuelta por el servidor y reconexión del cliente."""
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def start_server(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.engine = InferenceEngine("core.benchmarks.stub.StubBackend")
+        self.assertTrue(self.engine.warmup())
+        server = ModelServer(os.path.join(tmp.name, "modelo.sock"), self.engine)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_mensaje_ida_y_vuelta(self):
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        payload = {"texts": ["¿Qué tal? 😊", "x" * 200_000]}
+
+        # El mensaje grande llega en varios trozos; se envía desde otro hilo para no bloquear
+        sender = threading.Thread(target=send_message, args=(left, payload))
+        sender.start()
+        self.assertEqual(recv_message(right), payload)
+        sender.join()
+
+        left.sendall(model_server.HEADER.pack(model_server.MAX_MESSAGE_SIZE + 1))
+        with self.assertRaises(ProtocolError):
+            recv_message(right)
+        left.close()
+        with self.assertRaises(ConnectionError):
+            recv_message(right)
+
+    def test_clasifica_a_traves_del_servidor(self):
+        server = self.start_server()
+        client = ModelServerClient(server.server_address, timeout=5)
+        texts = ["hoy estoy feliz", "tengo miedo"]
+
+        self.assertEqual(client.classify(texts), self.engine.predict_many(texts))
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(server.server_address)
+            with self.assertLogs("core.model_server", "ERROR"):
+                send_message(sock, {"texts": "no es una lista"})
+                self.assertIn("error", recv_message(sock))
+
+    def test_reconecta_si_la_conexion_quedo_obsoleta(self):
+        server = self.start_server()
+        client = ModelServerClient(server.server_address, timeout=5)
+        # Conexión cuyo otro extremo ya se cerró, como tras reiniciar el servidor
+        stale, peer = socket.socketpair()
+        peer.close()
+        client._local.sock = stale
+
+        self.assertEqual(len(client.classify(["hola"])), 1)
+        self.assertIsNot(client._local.sock, stale)
+        self.assertEqual(stale.fileno(), -1)
+
+    def test_primera_conexion_fallida_no_se_reintenta(self):
+        client = ModelServerClient("/nonexistent/modelo.sock", timeout=1)
+        with self.assertRaises(OSError):
+            client.classify(["hola"])
+        self.assertIsNone(client._local.sock)
+
+    @override_settings(WEB_CONCURRENCY=4, EMOTION_TORCH_THREADS=1, EMOTION_SERVER_THREADS=0)
+    def test_el_servidor_usa_todos_los_nucleos(self):
+        with mock.patch("core.admission.available_cpus", return_value=8):
+            self.assertEqual(admission.server_thread_budget(), 8)
+            with override_settings(EMOTION_SERVER_THREADS=3):
+                self.assertEqual(admission.server_thread_budget(), 3)
+
+        with mock.patch("core.inference.apply_thread_budget") as apply_budget:
+            engine = InferenceEngine("core.benchmarks.stub.StubBackend", num_threads=6)
+            engine.load()
+        apply_budget.assert_called_once_with(engine.backend, 6)
+
+
+class InterpretPredictionTests(SimpleTestCase):
+    def test_etiquetas_menores_no_suman_contra_la_principal(self):
+        distribution = [
+            {"label": "sadness", "score": 0.40},
+            {"label": "others", "score": 0.25},
+            {"label": "disgust", "score": 0.15},
+            {"label": "surprise", "score": 0.12},
+            {"label": "joy", "score": 0.08},
+        ]
+        primary, secondary, scores = interpret_prediction(distribution)
+        self.assertEqual(primary, "sadness")
+        self.assertEqual(secondary, "joy")
+        self.assertEqual(scores["sadness"], 0.4)
+
+    def test_secundaria_es_la_siguiente_categoria_distinta(self):
+        distribution = [
+            {"label": "joy", "score": 0.1},
+            {"label": "others", "score": 0.3},
+            {"label": "surprise", "score": 0.25},
+            {"label": "disgust", "score": 0.2},
+            {"label": "fear", "score": 0.15},
+        ]
+        self.assertEqual(interpret_prediction(distribution)[:2], ("joy", "anger"))
+
+    def test_una_sola_categoria(self):
+        self.assertEqual(interpret_prediction([{"label": "fear", "score": 1.0}])[:2], ("fear", "fear"))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        def is_failure(exc):
+            if isinstance(exc, DeadlineExceeded):
+                return None
+            return not isinstance(exc, LookupError)
+
+        self.breaker = CircuitBreaker("prueba", failure_threshold=2, reset_timeout=0.05, is_failure=is_failure)
+
+    def fail(self, exc=RuntimeError("caído")):
+        def call():
+            raise exc
+        with self.assertRaises(type(exc)):
+            self.breaker.call(call)
+
+    def open_and_wait(self):
+        self.fail()
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_se_abre_y_falla_rapido(self):
+        self.fail()
+        self.fail()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.call(lambda: "ok")
+        stats = self.breaker.stats()
+        self.assertEqual((stats["trips"], stats["short_circuits"]), (1, 1))
+
+    def test_llamada_de_prueba_cierra_o_reabre(self):
+        self.open_and_wait()
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.open_and_wait()
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.stats()["trips"], 3)
+
+    def test_error_ajeno_al_servicio_no_cierra_ni_cuenta(self):
+        self.fail()
+        self.fail(DeadlineExceeded("sin tiempo"))
+        self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        time.sleep(0.06)
+        self.fail(DeadlineExceeded("sin tiempo"))
+        # La plaza de prueba se libera y el estado no cambia
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_respuesta_valida_del_servicio_cuenta_como_exito(self):
+        self.fail()
+        self.fail(KeyError("404"))
+        self.fail()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+class FakeSpotifyMixin:
+    """Cliente de Spotify del proceso apuntando a un ``FakeSpotifyServer``."""
+
+    def start_fake_spotify(self, failure_threshold=100, **kwargs):
+        self.server = FakeSpotifyServer(**kwargs).start()
+        self.addCleanup(self.server.stop)
+        settings_override = override_settings(
+            SPOTIFY_API_PREFIX=f"{self.server.base_url}/v1/",
+            SPOTIFY_TOKEN_URL=f"{self.server.base_url}/api/token",
+            CIRCUIT_BREAKER_FAILURE_THRESHOLD=failure_threshold,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        env = {"SPOTIPY_CLIENT_ID": "prueba", "SPOTIPY_CLIENT_SECRET": "prueba"}
+        previous = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        self.addCleanup(lambda: [
+            os.environ.pop(key) if value is None else os.environ.__setitem__(key, value)
+            for key, value in previous.items()
+        ])
+        reset_spotify_client()
+        self.addCleanup(reset_spotify_client)
+        # Cortocircuito nuevo con el umbral de la prueba
+        breakers = mock.patch.dict("core.circuit_breaker._breakers", clear=True)
+        breakers.start()
+        self.addCleanup(breakers.stop)
+        # Sin token guardado de otras pruebas
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class SpotifyDeadlineTests(FakeSpotifyMixin, SimpleTestCase):
+    """Los reintentos del cliente de Spotify no superan el plazo de la petición."""
+
+    def setUp(self):
+        self.start_fake_spotify(search_status=429, retry_after=2)
+
+    def test_429_con_retry_after_no_reintenta_fuera_de_plazo(self):
+        sp = get_spotify_client()
+        start = time.monotonic()
+        with deadline(1.0), self.assertRaises(SpotifyException) as raised:
+            spotify_search(sp, q="pop", type="track", limit=10)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(raised.exception.http_status, 429)
+        self.assertEqual(self.server.requests["search"], 1)
+
+    def test_sin_plazo_se_reintenta(self):
+        self.server.retry_after = None
+        sp = get_spotify_client()
+        with self.assertRaises(SpotifyException):
+            spotify_search(sp, q="pop", type="track", limit=10)
+        self.assertEqual(self.server.requests["search"], 4)
+
+
+class SpotifyTokenFailureTests(FakeSpotifyMixin, SimpleTestCase):
+    """Los errores del endpoint de tokens cuentan en el cortocircuito de Spotify."""
+
+    def search(self):
+        return spotify_search(get_spotify_client(), q="pop", type="track", limit=10)
+
+    def test_5xx_del_token_abre_el_cortocircuito(self):
+        self.start_fake_spotify(failure_threshold=2, token_status=501)
+        for _ in range(2):
+            with self.assertRaises(SpotifyOauthError):
+                self.search()
+
+        with self.assertRaises(CircuitOpen):
+            self.search()
+        self.assertEqual(self.server.requests, {"token": 2, "search": 0})
+
+    def test_token_reintentado_sin_exito_cuenta_como_fallo(self):
+        self.start_fake_spotify(failure_threshold=1, token_status=503)
+        with self.assertRaises(requests.exceptions.RetryError):
+            self.search()
+        self.assertEqual(get_breaker("spotify").state, OPEN)
+
+    def test_credenciales_rechazadas_no_cuentan_como_fallo(self):
+        self.start_fake_spotify(failure_threshold=1, token_status=400)
+        for _ in range(2):
+            with self.assertRaises(SpotifyOauthError):
+                self.search()
+        self.assertEqual(get_breaker("spotify").state, CLOSED)
+
+    def test_error_oauth_sin_respuesta_no_cuenta(self):
+        self.assertIsNone(is_spotify_failure(SpotifyOauthError("sin respuesta")))
+
+
+class BulkCreateTrendTests(TransactionTestCase):
+    """``bulk_create`` (y la escritura diferida) mantiene la tendencia sin reconstruirla."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def make_entries(self, emotions):
+        return [
+            EmotionalEntry(texto=f"texto {i}", emocion_primaria=emotion, emocion_secundaria=emotion)
+            for i, emotion in enumerate(emotions)
+        ]
+
+    def assertStateMatchesDatabase(self):
+        state = cache.get(trends.STATE_KEY)
+        self.assertIsNotNone(state, "El estado de la tendencia se invalidó")
+        self.assertEqual(state, trends.build_state())
+
+    def test_bulk_create_asigna_ids_en_orden(self):
+        trends.get_state()
+        entries = EmotionalEntry.objects.bulk_create(self.make_entries(["joy", "fear", "sadness"]))
+        self.assertEqual(
+            [(entry.pk, entry.texto) for entry in entries],
+            list(EmotionalEntry.objects.order_by("pk").values_list("pk", "texto")),
+        )
+        self.assertStateMatchesDatabase()
+
+    def test_escritura_diferida_no_invalida_la_tendencia(self):
+        trends.get_state()
+        buffer = WriteBehindBuffer(batch_size=4, flush_interval=0.05)
+        for entry in self.make_entries(["joy", "anger", "joy", "love", "fear", "sadness", "joy"]):
+            buffer.submit(entry)
+        self.assertTrue(buffer.flush())
+        self.assertEqual(buffer.stats()["written"], 7)
+        self.assertStateMatchesDatabase()
+        with self.assertNumQueries(0):
+            self.assertEqual(trends.most_frequent_emotion(), "joy")
+
+    def test_fallo_de_un_receptor_no_repite_la_insercion(self):
+        def failing_receiver(sender, entries, **kwargs):
+            raise RuntimeError("resumen no disponible")
+
+        entradas_creadas_en_bloque.connect(failing_receiver, sender=EmotionalEntry)
+        self.addCleanup(entradas_creadas_en_bloque.disconnect, failing_receiver, sender=EmotionalEntry)
+        trends.get_state()
+        buffer = WriteBehindBuffer(batch_size=4, flush_interval=0.05)
+        with self.assertLogs("core.persistence", "ERROR") as logs:
+            for entry in self.make_entries(["joy", "anger", "joy", "love", "fear"]):
+                buffer.submit(entry)
+            self.assertTrue(buffer.flush())
+        self.assertEqual(EmotionalEntry.objects.count(), 5)
+        stats = buffer.stats()
+        self.assertEqual((stats["written"], stats["failed"]), (5, 0))
+        self.assertTrue(all("resúmenes" in line for line in logs.output))
+        # Los demás receptores sí se ejecutaron
+        self.assertStateMatchesDatabase()
+
+
+class TrendStateRebuildTests(TestCase):
+    """Una reconstrucción de la tendencia no deja en la caché un estado más viejo que otro."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.build_state = trends.build_state
+
+    def test_cambio_durante_la_reconstruccion_descarta_el_estado(self):
+        def build_then_insert():
+            state = self.build_state()
+            with self.captureOnCommitCallbacks(execute=True):
+                EmotionalEntry.objects.create(texto="nueva", emocion_primaria="joy", emocion_secundaria="joy")
+            return state
+
+        with mock.patch.object(trends, "build_state", build_then_insert):
+            self.assertEqual(trends.get_state()["total"], 0)
+        self.assertIsNone(cache.get(trends.STATE_KEY))
+        self.assertEqual(trends.get_state()["total"], 1)
+
+    def test_no_pisa_un_estado_mas_nuevo(self):
+        newer = {"total": 1, "counts": {"joy": 1}, "window": []}
+
+        def build_while_other_worker_saves():
+            state = self.build_state()
+            cache.set(trends.STATE_KEY, newer)
+            return state
+
+        with mock.patch.object(trends, "build_state", build_while_other_worker_saves):
+            trends.get_state()
+        self.assertEqual(cache.get(trends.STATE_KEY), newer)
+
+    def test_se_aplica_al_confirmar_y_no_si_se_deshace(self):
+        trends.get_state()
+        with self.captureOnCommitCallbacks(execute=True):
+            EmotionalEntry.objects.create(texto="confirmada", emocion_primaria="joy", emocion_secundaria="joy")
+        self.assertEqual(cache.get(trends.STATE_KEY)["counts"], {"joy": 1})
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    EmotionalEntry.objects.bulk_create([
+                        EmotionalEntry(texto="deshecha", emocion_primaria="fear", emocion_secundaria="fear"),
+                    ])
+                    raise RuntimeError("el bloque falla")
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(cache.get(trends.STATE_KEY), trends.build_state())
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_cache_local_con_varios_workers_consulta_la_base_de_datos(self):
+        trends.get_state()
+        self.assertIsNone(cache.get(trends.STATE_KEY))
+        EmotionalEntry.objects.create(texto="nueva", emocion_primaria="love", emocion_secundaria="love")
+        self.assertEqual(trends.most_frequent_emotion(), "love")
+
+
+class FailingBackend:
+    """Backend cuyo modelo falla en cada pasada."""
+
+    name = "failing"
+    version = "failing"
+
+    def predict(self, texts):
+        raise RuntimeError("sin memoria")
+
+
+class ClassifyCorpusTests(TestCase):
+    def setUp(self):
+        # Los logs por texto del fallback
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "corpus.csv")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("texto\n" + "".join(f"hoy estoy feliz {i}\n" for i in range(5)))
+
+    def classify(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "classify_corpus", self.path, "--workers", "0", "--batch-size", "2", "--chunk-size", "2",
+            "--backend", "core.tests.FailingBackend", *args, stdout=stdout, stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_errores_del_modelo_se_informan_y_cuentan(self):
+        stdout, stderr = self.classify()
+        self.assertEqual(EmotionalEntry.objects.filter(puntuaciones__isnull=True).count(), 5)
+        self.assertEqual(stderr.count("Error del modelo en un lote"), 1)
+        self.assertIn("RuntimeError: sin memoria", stderr)
+        self.assertIn("5 con fallback (5 por errores del modelo)", stdout)
+
+    def test_strict_aborta_y_conserva_el_punto_de_control(self):
+        with self.assertRaisesMessage(CommandError, "Error del modelo en un lote"):
+            self.classify("--strict")
+        self.assertEqual(EmotionalEntry.objects.count(), 0)
+        self.assertFalse(os.path.exists(f"{self.path}.checkpoint"))
+
+    def write_checkpoint(self, **data):
+        with open(f"{self.path}.checkpoint", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def test_punto_de_control_con_bloque_sin_confirmar_repite_el_bloque(self):
+        # El proceso murió tras escribir el punto de control y antes del commit
+        self.write_checkpoint(processed=4, previous=2, last_pk=999, last_texto="hoy estoy feliz 3")
+        self.classify("--fallback-only")
+        self.assertEqual(
+            sorted(EmotionalEntry.objects.values_list("texto", flat=True)),
+            ["hoy estoy feliz 2", "hoy estoy feliz 3", "hoy estoy feliz 4"],
+        )
+
+    def test_punto_de_control_confirmado_no_duplica(self):
+        self.classify("--fallback-only", "--strict")
+        self.assertEqual(EmotionalEntry.objects.count(), 5)
+        last = EmotionalEntry.objects.get(texto="hoy estoy feliz 3")
+        self.write_checkpoint(processed=4, previous=2, last_pk=last.pk, last_texto=last.texto)
+        self.classify("--fallback-only")
+        self.assertEqual(EmotionalEntry.objects.count(), 6)
+        self.assertEqual(EmotionalEntry.objects.filter(texto="hoy estoy feliz 4").count(), 2)
+
+
+class EvaluationDatasetTests(TestCase):
+    """Solo las etiquetas corregidas por el usuario son referencia salvo que se pidan las confirmadas."""
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        now = timezone.now()
+        for minutes, (texto, emocion, correcta, notas) in enumerate([
+            ("sin revisar", "joy", True, None),
+            ("confirmada", "joy", True, "bien clasificada"),
+            ("corregida", "joy", False, "era sadness"),
+            ("rechazada", "anger", False, None),
+            ("misma etiqueta", "fear", False, "no es fear"),
+        ]):
+            EmotionalEntry.objects.create(
+                texto=texto, emocion_primaria=emocion, emocion_secundaria=emocion,
+                respuesta_correcta=correcta, notas_revision=notas, fecha=now - timedelta(minutes=minutes),
+            )
+
+    def test_por_defecto_solo_etiquetas_corregidas(self):
+        labelled, rejected, confirmed = evaluation.load_dataset()
+
+        self.assertEqual(labelled, [("corregida", "sadness")])
+        self.assertEqual(rejected, [("rechazada", "anger"), ("misma etiqueta", "fear")])
+        self.assertEqual(confirmed, 0)
+
+    def test_confirmadas_van_al_final_y_se_cuentan(self):
+        labelled, _, confirmed = evaluation.load_dataset(include_confirmed=True)
+        self.assertEqual(labelled, [("corregida", "sadness"), ("confirmada", "joy")])
+        self.assertEqual(confirmed, 1)
+
+        labelled, _, confirmed = evaluation.load_dataset(include_unreviewed=True)
+        self.assertEqual(labelled, [("corregida", "sadness"), ("sin revisar", "joy"), ("confirmada", "joy")])
+        self.assertEqual(confirmed, 2)
+
+    def evaluate(self, *args):
+        def run_path(path, texts, *rest):
+            return {
+                "path": path, "version": path, "load_ms": 0.0, "latency_ms": {}, "batch_size": 32,
+                "throughput_texts_per_s": 1.0, "peak_rss_mb": 0.0, "predictions": ["sadness"] * len(texts),
+            }
+
+        out = StringIO()
+        with mock.patch("core.management.commands.evaluate_classifiers.run_path_isolated", run_path):
+            call_command("evaluate_classifiers", "--paths", "fallback", *args, stdout=out)
+        return out.getvalue()
+
+    def test_comando_avisa_del_sesgo_de_las_confirmadas(self):
+        output = self.evaluate()
+        self.assertIn("1 entradas con etiqueta corregida, 0 con etiqueta confirmada", output)
+        self.assertIn("exactitud 1.000", output)
+        self.assertNotIn("sesgada", output)
+
+        output = self.evaluate("--include-confirmed")
+        self.assertIn("1 entradas con etiqueta corregida, 1 con etiqueta confirmada", output)
+        self.assertIn("sesgada a favor de ese modelo", output)
+        self.assertIn("exactitud 0.500", output)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_percentiles_de_las_ultimas_muestras(self):
+        reservoir = Reservoir(size=100)
+        for _ in range(10000):
+            reservoir.add(1000.0)
+        for _ in range(100):
+            reservoir.add(10.0)
+        self.assertEqual(reservoir.quantiles()[0.99], 10.0)
+        self.assertEqual(reservoir.count, 10100)
+        self.assertEqual(reservoir.total, 10001000.0)
+
+
+class MetricsAccessTests(TestCase):
+    @override_settings(MOODMATCH_METRICS_TOKEN="")
+    def test_sin_token_solo_staff(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        user = get_user_model().objects.create_user("ana", password="x")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(MOODMATCH_METRICS_TOKEN="secreto")
+    def test_con_token(self):
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer otro").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secreto")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("moodmatch_stage_duration_ms", response.content.decode())
+
+
+class RefreshTrackPoolTests(SimpleTestCase):
+    def test_exige_cache_compartida(self):
+        with self.assertRaisesMessage(CommandError, "caché compartida"):
+            call_command("refresh_track_pool", stdout=StringIO())
+
+
+class RollupTests(TestCase):
+    def test_borrado_con_contador_desviado_no_baja_de_cero(self):
+        entry = EmotionalEntry.objects.create(texto="hoy", emocion_primaria="joy", emocion_secundaria="joy")
+        stat = EmotionDailyStat.objects.get(emocion="joy")
+        self.assertEqual((stat.total, stat.correctas), (1, 1))
+        # Resumen desviado (p. ej. recalculado sin esta entrada)
+        EmotionDailyStat.objects.filter(pk=stat.pk).update(total=0, correctas=0)
+        entry.delete()
+        stat.refresh_from_db()
+        self.assertEqual((stat.total, stat.correctas), (0, 0))
+
+    def test_rebuild_coincide_con_las_entradas(self):
+        for emotion in ["joy", "joy", "fear"]:
+            EmotionalEntry.objects.create(texto="hoy", emocion_primaria=emotion, emocion_secundaria=emotion)
+        EmotionDailyStat.objects.update(total=7)
+        self.assertEqual(rollups.rebuild(), 2)
+        self.assertEqual(
+            dict(EmotionDailyStat.objects.values_list("emocion", "total")), {"joy": 2, "fear": 1}
+        )
+
+
+class AnalyzeApiTests(TestCase):
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        engine = InferenceEngine("core.benchmarks.stub.StubBackend")
+        patcher = mock.patch("core.views.get_engine", return_value=engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, payload):
+        return self.client.post("/api/analyze/", json.dumps(payload), content_type="application/json")
+
+    @override_settings(EMOTION_API_MAX_TEXTS=2)
+    def test_demasiados_textos_413(self):
+        response = self.post({"texts": ["uno", "dos", "tres"]})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(EmotionalEntry.objects.count(), 0)
+
+    def test_cuerpo_invalido_400(self):
+        self.assertEqual(self.client.post("/api/analyze/", "no es json", content_type="application/json").status_code, 400)
+        self.assertEqual(self.post({"texts": []}).status_code, 400)
+        self.assertEqual(self.post({"texts": "hola"}).status_code, 400)
+
+    def test_lote_con_textos_invalidos(self):
+        response = self.post({"texts": ["  Hoy estoy muy feliz  ", "", "x" * 501, 5, "Tengo miedo"]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[1], {"error": "El texto no puede estar vacío"})
+        self.assertIn("demasiado largo", results[2]["error"])
+        self.assertEqual(results[3], {"error": "El texto debe ser una cadena"})
+
+        for i, text in ((0, "Hoy estoy muy feliz"), (4, "Tengo miedo")):
+            item = results[i]
+            self.assertEqual(
+                set(item), {"texto", "emotion", "secondary_emotion", "scores", "is_fallback"}
+            )
+            self.assertEqual(item["texto"], text)
+            self.assertFalse(item["is_fallback"])
+            distribution = [{"label": label, "score": score} for label, score in item["scores"].items()]
+            self.assertEqual(item["emotion"], interpret_prediction(distribution)[0])
+
+        self.assertEqual(
+            sorted(EmotionalEntry.objects.values_list("texto", "emocion_primaria")),
+            sorted((results[i]["texto"], results[i]["emotion"]) for i in (0, 4)),
+        )
+        self.assertTrue(all(EmotionalEntry.objects.values_list("puntuaciones", flat=True)))
+
+    def test_recomendaciones_emocion_desconocida_400(self):
+        response = self.client.get("/api/recommendations/", {"emotion": "nostalgia"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Emoción desconocida"})
+        response = self.client.get("/api/recommendations/", {"emotion": "joy", "secondary": "nostalgia"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_recomendaciones_sin_spotify(self):
+        with mock.patch("core.api.get_spotify_client", side_effect=ValueError("sin credenciales")), \
+                self.assertLogs("core.api", "ERROR"):
+            response = self.client.get("/api/recommendations/", {"emotion": "joy", "secondary": "love"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["song"], DEFAULT_SONG)
+        self.assertEqual(set(data["book"]), {"title", "author", "url", "description"})
+
+
+class StatsDataViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(admin)
+        self.url = reverse("admin:emotional-stats-data") + "?days=30&granularity=day"
+        EmotionalEntry.objects.create(texto="hoy", emocion_primaria="joy", emocion_secundaria="joy")
+
+    def test_if_none_match_devuelve_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], etag)
+        self.assertEqual(second.content, b"")
+
+    def test_entrada_nueva_cambia_el_etag_y_el_cuerpo(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.json()["series"], [[1]])
+        EmotionalEntry.objects.create(
+            texto="otra", emocion_primaria="joy", emocion_secundaria="joy",
+            fecha=timezone.now() + timedelta(seconds=1),
+        )
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.json()["series"], [[2]])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        texts = ["hoy, estoy \"feliz\"", "línea\ncon salto", "ñandú", "miedo", "amor"]
+        for i, text in enumerate(texts):
+            EmotionalEntry.objects.create(
+                texto=text,
+                emocion_primaria="fear" if i == 3 else "joy",
+                emocion_secundaria="love",
+                notas_revision="revisada" if i == 0 else None,
+                puntuaciones={"joy": 0.9, "fear": 0.1} if i % 2 else None,
+            )
+        self.entries = list(EmotionalEntry.objects.order_by("id"))
+
+    def export(self, fmt, queryset=None):
+        queryset = EmotionalEntry.objects.all() if queryset is None else queryset
+        return b"".join(export.export_chunks(queryset, fmt, chunk_size=2)).decode("utf-8")
+
+    def assertRoundTrip(self, rows):
+        self.assertEqual([row["id"] for row in rows], [entry.pk for entry in self.entries])
+        for row, entry in zip(rows, self.entries):
+            self.assertEqual(row["texto"], entry.texto)
+            self.assertEqual(row["emocion_primaria"], entry.emocion_primaria)
+            self.assertEqual(row["puntuaciones"], entry.puntuaciones)
+            self.assertEqual(row["notas_revision"], entry.notas_revision)
+            self.assertEqual(row["fecha"], timezone.localtime(entry.fecha).isoformat())
+
+    def test_csv_ida_y_vuelta(self):
+        rows = list(csv.DictReader(StringIO(self.export("csv"), newline="")))
+        for row in rows:
+            row["id"] = int(row["id"])
+            row["puntuaciones"] = json.loads(row["puntuaciones"]) if row["puntuaciones"] else None
+            row["notas_revision"] = row["notas_revision"] or None
+            self.assertEqual(row["respuesta_correcta"], "True")
+        self.assertRoundTrip(rows)
+
+    def test_jsonl_ida_y_vuelta(self):
+        lines = self.export("jsonl").splitlines()
+        self.assertEqual(len(lines), 5)
+        rows = [json.loads(line) for line in lines]
+        self.assertTrue(all(row["respuesta_correcta"] is True for row in rows))
+        self.assertRoundTrip(rows)
+
+    def test_comando_con_filtros(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "fear.jsonl")
+        call_command("export_entries", "--format", "jsonl", "--emotion", "fear", "-o", path, stdout=StringIO())
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row["texto"] for row in rows], ["miedo"])
+
+    @skipIf(importlib.util.find_spec("pyarrow"), "pyarrow instalado")
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_accion_parquet_sin_pyarrow_muestra_error(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse("admin:core_emotionalentry_changelist"),
+            {"action": "export_parquet", "_selected_action": [entry.pk for entry in self.entries]},
+            follow=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("requiere pyarrow", [str(message) for message in response.context["messages"]][0])
+
+
+class EmotionCacheTests(SimpleTestCase):
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def make_engine(self):
+        engine = InferenceEngine("core.benchmarks.stub.StubBackend")
+        self.assertTrue(engine.load())
+        return engine
+
+    def test_acierto_no_llama_al_backend(self):
+        engine = self.make_engine()
+        with mock.patch("core.views.get_engine", return_value=engine), \
+                mock.patch.object(engine.backend, "predict", wraps=engine.backend.predict) as predict:
+            first = get_emotion("Hoy estoy muy feliz")
+            second = get_emotion("Hoy estoy muy feliz")
+        self.assertEqual(first, second)
+        self.assertEqual(predict.call_count, 1)
+        self.assertEqual(engine.cache.stats()["local_hits"], 1)
+
+    def test_textos_equivalentes_comparten_clave(self):
+        result_cache = EmotionResultCache("v")
+        key = result_cache.make_key("hoy estoy feliz en el café")
+        self.assertEqual(result_cache.make_key("  Hoy  ESTOY\tfeliz en el cafe\u0301\n"), key)
+        self.assertNotEqual(result_cache.make_key("hoy estoy feliz en el cafe"), key)
+
+    def test_cambio_de_version_o_de_mapeo_invalida(self):
+        result = ("joy", "love", {"joy": 0.9})
+        EmotionResultCache(model_version("stub:1", EMOTION_MAPPING)).set("hola", result)
+        # Solo en la caché compartida, como otro worker
+        self.assertEqual(EmotionResultCache(model_version("stub:1", EMOTION_MAPPING)).get("hola"), result)
+        self.assertIsNone(EmotionResultCache(model_version("stub:2", EMOTION_MAPPING)).get("hola"))
+        self.assertIsNone(
+            EmotionResultCache(model_version("stub:1", {**EMOTION_MAPPING, "surprise": "fear"})).get("hola")
+        )
+
+    def test_el_motor_versiona_con_backend_y_mapeo(self):
+        version = self.make_engine().cache.version
+        with mock.patch.dict(EMOTION_MAPPING, {"surprise": "fear"}):
+            self.assertNotEqual(self.make_engine().cache.version, version)
+        with mock.patch("core.benchmarks.stub.StubBackend.batch_latency_ms", 1.0):
+            self.assertNotEqual(self.make_engine().cache.version, version)
+
+
+def baseline_fallback(text):
+    """El análisis por palabras clave anterior al léxico compilado (coincidencia exacta)."""
+    scores = dict.fromkeys(DEFAULT_KEYWORDS, 0)
+    for word in text.lower().strip().split():
+        for emotion, keywords in DEFAULT_KEYWORDS.items():
+            if word in keywords:
+                scores[emotion] += 1
+    if not any(scores.values()):
+        return "joy", "love"
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return ranked[0][0], ranked[1][0] if ranked[1][1] > 0 else ranked[0][0]
+
+
+class LexiconTests(SimpleTestCase):
+    CORPUS = [
+        "hoy estoy feliz y contento",
+        "me siento mal y triste por todo",
+        "estoy muy enojado con mi jefe",
+        "tengo miedo y estoy preocupada",
+        "te quiero mucho y te adoro",
+        "el dolor y la pena no se van",
+        "todo va bien pero tengo temor",
+        "siento rabia e ira",
+        "un día normal sin nada especial",
+        "compré unos bienes y arreglé sus males",
+        "los amos del bronco",
+        "estoy ansioso pero contenta de verte",
+        "fantástico excelente genial",
+        "amor y cariño para todos",
+    ]
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.lexicon = get_lexicon()
+
+    def test_tildes_y_mayusculas(self):
+        self.assertEqual(normalize("FANTÁSTICO Cariño Melancolía"), "fantastico carino melancolia")
+        for word in ("FANTÁSTICO", "fantastico", "Melancolía", "melancolia", "CARIÑO"):
+            self.assertIsNotNone(self.lexicon.lookup(normalize(word)), word)
+
+    def test_flexiones(self):
+        for word, emotion in [
+            ("enojados", "anger"), ("felices", "joy"), ("preocupadas", "fear"),
+            ("contentas", "joy"), ("penas", "sadness"), ("miedos", "fear"), ("amores", "love"),
+        ]:
+            self.assertEqual(self.lexicon.lookup(word), emotion, word)
+
+    def test_sin_flexiones_de_otras_palabras(self):
+        for word in ("bienes", "males", "amos", "bronco", "peno", "carina", "quieros", "mieda"):
+            self.assertIsNone(self.lexicon.lookup(word), word)
+
+    def test_mismo_resultado_que_el_fallback_anterior(self):
+        for text in self.CORPUS:
+            self.assertEqual(fallback_emotion_analysis(text), baseline_fallback(text), text)
+
+
+class BookCatalogTests(SimpleTestCase):
+    RECORDS = [
+        {"volumeInfo": {"title": "Días felices", "authors": ["Ana"], "categories": ["Humor"],
+                        "infoLink": "https://libros/1", "language": "es"}},
+        {"title": "La casa del miedo", "author": "Luis; Marta", "genres": "Horror, Thriller"},
+        {"title": "Días felices", "authors": ["Ana"], "categories": ["Comedy"]},
+        {"title": "Manual de fontanería", "description": "Tuberías y grifos"},
+        {"title": "Love in Paris", "categories": ["Romance"], "language": "en"},
+        ["no", "es", "un", "objeto"],
+        "texto suelto",
+        42,
+        None,
+        {"volumeInfo": "sin campos"},
+        {"title": ["lista"], "categories": ["Humor"]},
+        {"title": "Autores raros", "authors": [{"nombre": "X"}], "categories": ["Humor"]},
+        {"description": "sin título"},
+    ]
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.reset_catalog()
+        self.addCleanup(self.reset_catalog)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "catalogo.json")
+
+    def reset_catalog(self):
+        book_catalog._catalog = None
+        book_catalog._catalog_mtime = None
+        book_catalog._checked_at = None
+
+    def test_construye_indice_y_cuenta_registros_invalidos(self):
+        catalog = book_catalog.build_catalog(self.RECORDS, language="es")
+
+        self.assertEqual(catalog["stats"], {
+            "records": 13, "invalid": 8, "other_language": 1, "duplicates": 1, "untagged": 1,
+        })
+        titles = {book[0] for book in catalog["books"]}
+        self.assertEqual(titles, {"Días felices", "La casa del miedo"})
+        books = catalog["books"]
+        self.assertEqual(books[catalog["index"]["joy|"][0]][:3], ["Días felices", "Ana", "https://libros/1"])
+        self.assertEqual(books[catalog["index"]["fear|"][0]][1], "Luis, Marta")
+
+    def test_comando_salta_lineas_invalidas(self):
+        source = os.path.join(os.path.dirname(self.path), "libros.jsonl")
+        with open(source, "w", encoding="utf-8") as f:
+            for record in self.RECORDS[:2]:
+                f.write(json.dumps(record) + "\n")
+            f.write("{no es json\n")
+            f.write("[1, 2]\n")
+        out = StringIO()
+
+        with self.assertLogs("core.book_catalog", "WARNING"):
+            call_command("build_book_catalog", source, "--output", self.path, stdout=out)
+
+        self.assertIn("4 registros: 2 inválidos", out.getvalue())
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["books"]), 2)
+
+    def write(self, records, mtime):
+        book_catalog.write_catalog(book_catalog.build_catalog(records), self.path)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_carga_en_la_primera_llamada_aunque_monotonic_sea_pequeno(self):
+        self.write(self.RECORDS[:1], 1_000_000)
+
+        with override_settings(BOOK_CATALOG_PATH=self.path, BOOK_CATALOG_CHECK_INTERVAL=60), \
+                mock.patch("core.book_catalog.time.monotonic", return_value=5.0):
+            book = book_catalog.recommend_book("joy")
+
+        self.assertEqual(book["title"], "Días felices")
+
+    def test_recomienda_y_recarga_si_cambia_el_fichero(self):
+        self.write(self.RECORDS[:2], 1_000_000)
+
+        with override_settings(BOOK_CATALOG_PATH=self.path, BOOK_CATALOG_CHECK_INTERVAL=0):
+            self.assertEqual(book_catalog.recommend_book("joy", "love")["title"], "Días felices")
+            self.assertEqual(book_catalog.recommend_book("fear")["title"], "La casa del miedo")
+            self.assertIsNone(book_catalog.recommend_book("anger"))
+            first = book_catalog.get_catalog()
+            self.assertIs(book_catalog.get_catalog(), first)
+
+            self.write([{"title": "Venganza", "categories": ["Revenge"]}], 2_000_000)
+            self.assertEqual(book_catalog.recommend_book("anger")["title"], "Venganza")
+            self.assertIsNone(book_catalog.recommend_book("joy"))
+
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write("{roto")
+            os.utime(self.path, (3_000_000, 3_000_000))
+            with self.assertLogs("core.book_catalog", "ERROR"):
+                self.assertEqual(book_catalog.recommend_book("anger")["title"], "Venganza")
+
+            os.remove(self.path)
+            self.assertIsNone(book_catalog.get_catalog())
@@ -0,0 +1,188 @@
+"""
+Pools locales de canciones por emoción para no buscar en Spotify en cada petición.
+
+Cada pool (por emoción primaria y por par primaria/secundaria) se llena con
+varias páginas de resultados de búsqueda y se guarda en la caché de Django.
+Para que los workers vean los pools que construye otro proceso la caché debe
+ser compartida (``CACHE_URL`` con Redis, Memcached, base de datos o ficheros);
+con la caché en memoria por defecto cada worker llena sus pools en segundo
+plano en el primer uso. Las peticiones eligen una canción en O(1),
+prefiriendo las que tienen ``preview_url``. Un pool caducado se sigue
+sirviendo mientras se renueva en segundo plano, así que una caída o lentitud
+de Spotify no afecta al camino de la petición.
+
+Los pools se reconstruyen con ``manage.py refresh_track_pool``, que exige
+una caché compartida.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .spotify import spotify_search
+
+logger = logging.getLogger(__name__)
+
+# Mapeo simple de emociones a términos de búsqueda
+SEARCH_TERMS = {
+    "joy": "happy dance pop",
+    "sadness": "sad acoustic",
+    "anger": "rock metal",
+    "fear": "ambient chill",
+    "love": "romantic love songs"
+}
+DEFAULT_SEARCH_TERM = "pop"
+
+PAGE_SIZE = 50
+# Un pool por par con menos canciones que esto no se guarda y se usa el de la primaria
+MIN_PAIR_POOL_SIZE = 10
+
+_local_pools = {}
+_local_lock = threading.Lock()
+_refreshing = set()
+
+
+def search_term(emotion, secondary_emotion=None):
+    term = SEARCH_TERMS.get(emotion, DEFAULT_SEARCH_TERM)
+    if secondary_emotion and secondary_emotion != emotion:
+        term = f"{term} {SEARCH_TERMS.get(secondary_emotion, DEFAULT_SEARCH_TERM)}"
+    return term
+
+
+def pool_key(emotion, secondary_emotion=None):
+    if secondary_emotion and secondary_emotion != emotion:
+        return f"spotify:pool:{emotion}:{secondary_emotion}"
+    return f"spotify:pool:{emotion}"
+
+
+def simplify_track(track):
+    return {
+        "name": track["name"],
+        "artist": track["artists"][0]["name"],
+        "url": track["external_urls"]["spotify"],
+        "preview_url": track.get("preview_url"),
+    }
+
+
+def fetch_tracks(sp, term, pages=2):
+    """Descarga varias páginas de resultados y elimina duplicados."""
+    tracks = {}
+    for page in range(pages):
+        result = spotify_search(sp, q=term, type="track", limit=PAGE_SIZE, offset=page * PAGE_SIZE)
+        items = (result or {}).get("tracks", {}).get("items") or []
+        for item in items:
+            if item and item.get("artists") and item.get("external_urls", {}).get("spotify"):
+                track = simplify_track(item)
+                tracks.setdefault(track["url"], track)
+        if len(items) < PAGE_SIZE:
+            break
+    return list(tracks.values())
+
+
+def make_pool(tracks):
+    # Las canciones con preview se separan al construir el pool para elegir en O(1)
+    return {
+        "fetched_at": time.time(),
+        "tracks": tracks,
+        "preview": [t for t in tracks if t.get("preview_url")],
+    }
+
+
+def store_pool(key, pool):
+    # Sin caducidad: un pool antiguo es mejor que ninguno si Spotify falla
+    cache.set(key, pool, None)
+    with _local_lock:
+        _local_pools[key] = (time.monotonic(), pool)
+
+
+def refresh_pool(sp, emotion, secondary_emotion=None, pages=2):
+    """Reconstruye un pool; devuelve el número de canciones guardadas."""
+    tracks = fetch_tracks(sp, search_term(emotion, secondary_emotion), pages=pages)
+    is_pair = secondary_emotion and secondary_emotion != emotion
+    if not tracks or (is_pair and len(tracks) < MIN_PAIR_POOL_SIZE):
+        return 0
+    store_pool(pool_key(emotion, secondary_emotion), make_pool(tracks))
+    return len(tracks)
+
+
+def refresh_all(sp, pairs=True, pages=2):
+    """Reconstruye los pools de todas las emociones (y pares). Devuelve {clave: tamaño}."""
+    sizes = {}
+    for emotion in SEARCH_TERMS:
+        keys = [(emotion, None)]
+        if pairs:
+            keys += [(emotion, other) for other in SEARCH_TERMS if other != emotion]
+        for primary, secondary in keys:
+            try:
+                sizes[pool_key(primary, secondary)] = refresh_pool(sp, primary, secondary, pages=pages)
+            except Exception as e:
+                logger.error(f"Error renovando el pool {pool_key(primary, secondary)}: {e}")
+                sizes[pool_key(primary, secondary)] = None
+    return sizes
+
+
+def get_pool(key):
+    """Pool desde memoria del proceso o, si ya es antiguo, desde la caché compartida."""
+    local_ttl = getattr(settings, "SPOTIFY_TRACK_POOL_LOCAL_TTL", 60)
+    with _local_lock:
+        entry = _local_pools.get(key)
+    if entry is not None and time.monotonic() - entry[0] < local_ttl:
+        return entry[1]
+
+    try:
+        pool = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Error leyendo el pool {key} de la caché: {e}")
+        pool = None
+    if pool is None:
+        # Mejor el pool local antiguo que ninguno
+        return entry[1] if entry is not None else None
+
+    with _local_lock:
+        _local_pools[key] = (time.monotonic(), pool)
+    return pool
+
+
+def _refresh_in_background(sp, emotion, secondary_emotion):
+    key = pool_key(emotion, secondary_emotion)
+    with _local_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            refresh_pool(sp, emotion, secondary_emotion)
+        except Exception as e:
+            logger.warning(f"Error renovando en segundo plano el pool {key}: {e}")
+        finally:
+            with _local_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name=f"track-pool-{key}", daemon=True).start()
+
+
+def pick_track(emotion, secondary_emotion=None, sp=None):
+    """
+    Elige una canción del pool del par o, si no existe, del de la emoción primaria.
+    Devuelve None si no hay pool; si está caducado y hay cliente, lo renueva en segundo plano.
+    """
+    max_age = getattr(settings, "SPOTIFY_TRACK_POOL_MAX_AGE", 6 * 3600)
+    candidates = [(emotion, secondary_emotion)] if secondary_emotion and secondary_emotion != emotion else []
+    candidates.append((emotion, None))
+
+    for primary, secondary in candidates:
+        pool = get_pool(pool_key(primary, secondary))
+        if not pool or not pool["tracks"]:
+            continue
+        if sp is not None and time.time() - pool["fetched_at"] > max_age:
+            _refresh_in_background(sp, primary, secondary)
+        # Preferir tracks con preview_url
+        return random.choice(pool["preview"] or pool["tracks"])
+
+    if sp is not None:
+        _refresh_in_background(sp, emotion, None)
+    return None
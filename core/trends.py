@@ -0,0 +1,210 @@
+"""
+Estado incremental de la tendencia emocional.
+
+En lugar de consultar el historial en cada petición, se mantiene en la caché
+de Django un estado pequeño con:
+
+- ``total``: número de entradas.
+- ``counts``: entradas por emoción primaria.
+- ``window``: las ``WINDOW_SIZE`` entradas revisadas como correctas más
+  recientes, como ``[timestamp, id, emoción]`` de la más nueva a la más antigua.
+
+Las señales de ``EmotionalEntry`` lo actualizan al crear o revisar entradas,
+cuando se confirma la transacción (``on_commit``): un bloque que se deshace no
+deja contadores de más.
+Si falta en la caché, o un cambio no se puede aplicar de forma incremental
+(p. ej. sale una entrada de la ventana), se reconstruye desde la base de datos
+en la siguiente lectura. Los cambios que llegan sin estado en la caché suben
+una versión; una reconstrucción que ve cambiar la versión mientras consultaba
+la base de datos no deja su estado, que podría no incluirlos.
+
+El estado solo es coherente si todos los workers ven la misma caché. Con una
+caché local del proceso y varios workers (``WEB_CONCURRENCY``) no se usa: cada
+lectura consulta la base de datos.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .emotion_cache import cache_is_shared
+from .models import EmotionalEntry
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "emotion:trend:state"
+LOCK_KEY = "emotion:trend:lock"
+VERSION_KEY = "emotion:trend:version"
+WINDOW_SIZE = 5
+
+
+def _timeout():
+    # La caducidad acota cualquier deriva entre workers: al expirar se reconstruye
+    return getattr(settings, "EMOTION_TREND_STATE_TIMEOUT", 3600)
+
+
+def build_state():
+    """Calcula el estado completo desde la base de datos."""
+    counts = dict(
+        EmotionalEntry.objects.order_by()
+        .values_list("emocion_primaria")
+        .annotate(total=Count("id"))
+    )
+    window = [
+        [fecha.timestamp(), pk, emocion]
+        for pk, fecha, emocion in EmotionalEntry.objects.filter(respuesta_correcta=True)
+        .order_by("-fecha", "-id")
+        .values_list("id", "fecha", "emocion_primaria")[:WINDOW_SIZE]
+    ]
+    return {"total": sum(counts.values()), "counts": counts, "window": window}
+
+
+def incremental():
+    """El estado en caché solo vale si lo comparten todos los workers."""
+    return cache_is_shared() or getattr(settings, "WEB_CONCURRENCY", 1) <= 1
+
+
+def _version():
+    cache.add(VERSION_KEY, 0, None)
+    return cache.get(VERSION_KEY)
+
+
+def _bump_version():
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # La clave desapareció entre add e incr
+        cache.add(VERSION_KEY, 1, None)
+
+
+def get_state():
+    if not incremental():
+        return build_state()
+    state = cache.get(STATE_KEY)
+    if state is None:
+        version = _version()
+        state = build_state()
+        # add y no set: no pisar un estado que otro worker guardó y ya ha actualizado
+        if cache.add(STATE_KEY, state, _timeout()) and _version() != version:
+            # Hubo cambios durante la reconstrucción que este estado puede no incluir
+            cache.delete(STATE_KEY)
+    return state
+
+
+def invalidate():
+    def run():
+        cache.delete(STATE_KEY)
+        _bump_version()
+
+    transaction.on_commit(run)
+
+
+def _update(apply):
+    """
+    Aplica ``apply(state)`` bajo un cerrojo en la caché cuando se confirma la
+    transacción en curso. ``apply`` devuelve False si el cambio no es
+    incremental; entonces se invalida el estado.
+    """
+    if incremental():
+        transaction.on_commit(lambda: _apply(apply))
+
+
+def _apply(apply):
+    for _ in range(20):
+        if cache.add(LOCK_KEY, 1, 5):
+            break
+        time.sleep(0.005)
+    else:
+        # Sin cerrojo no se puede modificar sin perder cambios: reconstruir después
+        invalidate()
+        return
+
+    try:
+        state = cache.get(STATE_KEY)
+        if state is None:
+            # Una reconstrucción en curso puede no ver este cambio
+            _bump_version()
+            return
+        if apply(state) is False:
+            invalidate()
+        else:
+            cache.set(STATE_KEY, state, _timeout())
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _insert_in_window(window, entry):
+    item = [entry.fecha.timestamp(), entry.pk, entry.emocion_primaria]
+    if len(window) >= WINDOW_SIZE and item[:2] < window[-1][:2]:
+        return
+    window.append(item)
+    window.sort(key=lambda x: (x[0], x[1]), reverse=True)
+    del window[WINDOW_SIZE:]
+
+
+def record_entries(entries):
+    """Registra entradas nuevas (creadas una a una o con bulk_create)."""
+    entries = list(entries)
+    if not entries:
+        return
+
+    def apply(state):
+        for entry in entries:
+            state["total"] += 1
+            state["counts"][entry.emocion_primaria] = state["counts"].get(entry.emocion_primaria, 0) + 1
+            if entry.respuesta_correcta:
+                if entry.pk is None:
+                    # Sin id (p. ej. bulk_create en algunos motores) no se puede ordenar
+                    return False
+                _insert_in_window(state["window"], entry)
+
+    _update(apply)
+
+
+def record_change(entry, previous):
+    """Registra la revisión de una entrada existente; ``previous`` son los valores cargados."""
+    old_emotion = previous.get("emocion_primaria", entry.emocion_primaria)
+    old_correct = previous.get("respuesta_correcta", entry.respuesta_correcta)
+    old_fecha = previous.get("fecha", entry.fecha)
+    if (old_emotion, old_correct, old_fecha) == (entry.emocion_primaria, entry.respuesta_correcta, entry.fecha):
+        return
+
+    def apply(state):
+        if old_emotion != entry.emocion_primaria:
+            counts = state["counts"]
+            counts[old_emotion] = counts.get(old_emotion, 1) - 1
+            if counts[old_emotion] <= 0:
+                del counts[old_emotion]
+            counts[entry.emocion_primaria] = counts.get(entry.emocion_primaria, 0) + 1
+
+        window = state["window"]
+        in_window = any(item[1] == entry.pk for item in window)
+        if in_window:
+            if not entry.respuesta_correcta or old_fecha != entry.fecha:
+                # Hay que buscar qué entrada ocupa su lugar
+                return False
+            for item in window:
+                if item[1] == entry.pk:
+                    item[2] = entry.emocion_primaria
+        elif entry.respuesta_correcta:
+            _insert_in_window(window, entry)
+
+    _update(apply)
+
+
+def has_entries():
+    return get_state()["total"] > 0
+
+
+def most_frequent_emotion():
+    counts = get_state()["counts"]
+    return max(counts, key=counts.get) if counts else None
+
+
+def get_tendencia():
+    """Equivalente a ``EmotionalEntry.get_tendencia`` sin consultas."""
+    return EmotionalEntry.calcular_tendencia([item[2] for item in get_state()["window"]])
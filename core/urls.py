@@ -1,6 +1,16 @@
+from django.conf import settings
 from django.urls import path
+from .api import analyze_api, recommendations_api
+from .metrics import metrics_view
 from .views import mood_match
 
+if getattr(settings, "MOODMATCH_ASYNC_VIEW", False):
+    # Despliegues ASGI: etapas independientes en paralelo
+    from .async_views import mood_match_async as mood_match
+
 urlpatterns = [
     path('', mood_match, name='moodmatch'),
+    path('api/analyze/', analyze_api, name='analyze-api'),
+    path('api/recommendations/', recommendations_api, name='recommendations-api'),
+    path('metrics', metrics_view, name='metrics'),
 ]
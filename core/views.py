@@ -1,18 +1,19 @@
 from django.shortcuts import render
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyClientCredentials
 import requests
-import os
 import logging
 import random
-import time
-from django.core.validators import MaxLengthValidator
 from django.core.exceptions import ValidationError
 from dotenv import load_dotenv
-from spotipy.exceptions import SpotifyException
-from .models import EmotionalEntry
-from django.db.models import Count
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+from django.conf import settings
+from .admission import Overloaded, overload_policy
+from .book_catalog import recommend_book
+from .inference import get_engine, interpret_prediction
+from .lexicon import get_lexicon
+from .persistence import save_entry
+from .circuit_breaker import CircuitOpen, DeadlineExceeded
+from .spotify import get_spotify_client, spotify_search
+from . import metrics, trends
+from .track_pool import pick_track, search_term, simplify_track
 
 # Cargar variables de entorno
 load_dotenv()
@@ -20,23 +21,6 @@ load_dotenv()
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-# Inicializar el modelo de análisis de emociones
-try:
-    logger.info("Cargando modelo de Hugging Face...")
-    model_name = "pysentimiento/robertuito-emotion-analysis"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    emotion_classifier = pipeline(
-        "text-classification",
-        model=model,
-        tokenizer=tokenizer,
-        device="cpu"  # Forzar CPU para evitar errores de CUDA
-    )
-    logger.info("Modelo de Hugging Face cargado correctamente")
-except Exception as e:
-    logger.error(f"Error al cargar el modelo de Hugging Face: {str(e)}", exc_info=True)
-    emotion_classifier = None
-
 def validate_text(text):
     if not text or len(text.strip()) == 0:
         raise ValidationError("El texto no puede estar vacío")
@@ -44,93 +28,114 @@ def validate_text(text):
         raise ValidationError("El texto es demasiado largo (máximo 500 caracteres)")
     return text.strip()
 
-def get_emotion(text, max_retries=3):
+def get_emotion(text):
     """
     Intenta obtener la emoción usando Hugging Face.
     Si falla, usa el análisis de fallback.
+
+    Devuelve (primaria, secundaria, puntuaciones); las puntuaciones son None
+    cuando el resultado viene del análisis de fallback.
     """
     logger.info("="*50)
     logger.info(f"INICIO análisis de texto: '{text}'")
     
-    if emotion_classifier is None:
+    engine = get_engine()
+    if not engine.available:
         logger.warning("Modelo de Hugging Face no disponible, usando fallback")
-        return fallback_emotion_analysis(text)
+        metrics.record_classification(None)
+        with metrics.timed("fallback"):
+            return (*fallback_emotion_analysis(text), None)
+
+    if engine.cache is not None:
+        with metrics.timed("cache"):
+            cached = engine.cache.get(text)
+        if cached is not None:
+            logger.info(f"Resultado en caché: primaria={cached[0]}, secundaria={cached[1]}")
+            metrics.record_classification(cached[2])
+            return cached
 
     try:
-        # Obtener predicciones del modelo
+        # Obtener la distribución completa del modelo en una sola pasada
         logger.info("Intentando usar Hugging Face...")
-        prediction = emotion_classifier(text)
+        with metrics.timed("inferencia"):
+            prediction = engine.predict(text)
         logger.info(f"ÉXITO - Predicción de Hugging Face: {prediction}")
 
-        # Mapear las etiquetas del modelo a nuestras categorías
-        emotion_mapping = {
-            "joy": "joy",
-            "sadness": "sadness",
-            "anger": "anger",
-            "fear": "fear",
-            "surprise": "joy",  # Mapeamos surprise a joy por defecto
-            "others": "joy"     # Cualquier otra emoción la mapeamos a joy
-        }
-
-        # Obtener la emoción principal
-        primary_label = prediction[0]['label']
-        score = prediction[0]['score']
-        logger.info(f"Emoción detectada: {primary_label} con confianza: {score:.2f}")
-        
-        primary_emotion = emotion_mapping.get(primary_label, "joy")
-        
-        # Para la emoción secundaria, usamos el fallback
-        _, secondary_emotion = fallback_emotion_analysis(text)
+        primary_emotion, secondary_emotion, scores = interpret_prediction(prediction)
+        logger.info(f"Emoción detectada: {prediction[0]['label']} con confianza: {prediction[0]['score']:.2f}")
 
         logger.info(f"Emociones FINALES - HF primaria: {primary_emotion}, secundaria: {secondary_emotion}")
         logger.info("="*50)
-        return primary_emotion, secondary_emotion
+        if engine.cache is not None:
+            engine.cache.set(text, (primary_emotion, secondary_emotion, scores))
+        metrics.record_classification(scores)
+        return primary_emotion, secondary_emotion, scores
+
+    except Overloaded as e:
+        # Sin capacidad de inferencia: degradar o rechazar según la política
+        metrics.increment("inference_shed")
+        if overload_policy() == "reject":
+            raise
+        logger.warning(f"Inferencia saturada, usando fallback: {str(e)}")
+        metrics.record_classification(None)
+        with metrics.timed("fallback"):
+            return (*fallback_emotion_analysis(text), None)
 
     except Exception as e:
         logger.error(f"ERROR al usar Hugging Face: {str(e)}", exc_info=True)
         logger.info("Cayendo al análisis fallback")
-        return fallback_emotion_analysis(text)
+        metrics.record_classification(None)
+        with metrics.timed("fallback"):
+            return (*fallback_emotion_analysis(text), None)
+
+def get_emotions(texts):
+    """
+    Versión por lotes de get_emotion: consulta la caché y clasifica el resto en
+    una sola llamada al modelo. Devuelve una lista de (primaria, secundaria, puntuaciones).
+    """
+    results = [None] * len(texts)
+    engine = get_engine()
+
+    pending = list(range(len(texts)))
+    if engine.available:
+        if engine.cache is not None:
+            pending = []
+            for i, text in enumerate(texts):
+                results[i] = engine.cache.get(text)
+                if results[i] is None:
+                    pending.append(i)
+
+        if pending:
+            try:
+                with metrics.timed("inferencia"):
+                    predictions = engine.predict_many([texts[i] for i in pending])
+                for i, prediction in zip(pending, predictions):
+                    results[i] = interpret_prediction(prediction)
+                    if engine.cache is not None:
+                        engine.cache.set(texts[i], results[i])
+                pending = []
+            except Overloaded as e:
+                metrics.increment("inference_shed")
+                if overload_policy() == "reject":
+                    raise
+                logger.warning(f"Inferencia saturada, usando fallback en lote: {str(e)}")
+            except Exception as e:
+                logger.error(f"ERROR al usar Hugging Face en lote: {str(e)}", exc_info=True)
+
+    with metrics.timed("fallback"):
+        for i in pending:
+            results[i] = (*fallback_emotion_analysis(texts[i]), None)
+    for result in results:
+        metrics.record_classification(result[2])
+    return results
 
 def fallback_emotion_analysis(text):
     """Análisis simple de emociones basado en palabras clave"""
     text = text.lower().strip()
     logger.info(f"INICIO análisis fallback para: '{text}'")
 
-    # Diccionario simplificado de emociones y palabras clave
-    emotion_keywords = {
-        "joy": [
-            "feliz", "contento", "contenta", "alegre", "genial",
-            "fantástico", "fantástica", "excelente", "bien", "bueno", "buena"
-        ],
-        "sadness": [
-            "triste", "mal", "deprimido", "deprimida", "dolor",
-            "pena", "melancolía", "melancolico", "melancolica"
-        ],
-        "anger": [
-            "enojado", "enojada", "molesto", "molesta", "furioso",
-            "furiosa", "rabia", "ira", "bronca"
-        ],
-        "fear": [
-            "miedo", "asustado", "asustada", "temor", "terror",
-            "preocupado", "preocupada", "ansioso", "ansiosa"
-        ],
-        "love": [
-            "amor", "enamorado", "enamorada", "quiero", "adoro",
-            "cariño", "amo"
-        ]
-    }
-
-    # Contar coincidencias
-    emotion_scores = {emotion: 0 for emotion in emotion_keywords}
-    words = text.split()
-    
-    for word in words:
-        logger.info(f"Analizando palabra: '{word}'")
-        for emotion, keywords in emotion_keywords.items():
-            if word in keywords:
-                emotion_scores[emotion] += 1
-                logger.info(f"¡Coincidencia encontrada!: {word} -> {emotion}")
-
+    # Contar coincidencias con el léxico compilado
+    emotion_scores = get_lexicon().score(text)
     logger.info(f"Puntajes finales del fallback: {emotion_scores}")
 
     # Si no hay coincidencias, usar joy como default
@@ -146,37 +151,43 @@ def fallback_emotion_analysis(text):
     logger.info(f"Emociones FINALES del fallback: primaria={primary}, secundaria={secondary}")
     return primary, secondary
 
+DEFAULT_SONG = {
+    "name": "No se pudo obtener canción",
+    "artist": "Intente más tarde",
+    "url": "#",
+    "preview_url": None
+}
+
 def get_spotify_recommendations(emotion, secondary_emotion, sp):
     """
     Obtiene recomendaciones musicales de Spotify basadas en la emoción.
+    Se sirven desde el pool local de canciones; solo se busca en vivo si aún no existe.
     """
+    with metrics.timed("spotify"):
+        return _spotify_recommendation(emotion, secondary_emotion, sp)
+
+def _spotify_recommendation(emotion, secondary_emotion, sp):
     try:
-        # Mapeo simple de emociones a términos de búsqueda
-        search_terms = {
-            "joy": "happy dance pop",
-            "sadness": "sad acoustic",
-            "anger": "rock metal",
-            "fear": "ambient chill",
-            "love": "romantic love songs"
-        }
+        track = pick_track(emotion, secondary_emotion, sp)
+        if track is not None:
+            return track
 
         # Usar búsqueda simple en lugar de recomendaciones
-        search_term = search_terms.get(emotion, "pop")
-        logger.info(f"Buscando canciones con término: {search_term}")
+        term = search_term(emotion)
+        logger.info(f"Pool vacío, buscando canciones con término: {term}")
         
         try:
-            result = sp.search(q=search_term, type="track", limit=10)
+            with metrics.timed("spotify_busqueda"):
+                result = spotify_search(sp, q=term, type="track", limit=10)
             if result and result['tracks']['items']:
                 tracks = result['tracks']['items']
                 # Preferir tracks con preview_url
                 valid_tracks = [t for t in tracks if t.get('preview_url')]
-                track = random.choice(valid_tracks if valid_tracks else tracks)
-                return {
-                    "name": track["name"],
-                    "artist": track["artists"][0]["name"],
-                    "url": track["external_urls"]["spotify"],
-                    "preview_url": track.get("preview_url"),
-                }
+                return simplify_track(random.choice(valid_tracks if valid_tracks else tracks))
+        except (CircuitOpen, DeadlineExceeded) as e:
+            # Respuesta por defecto al instante, sin esperar al timeout HTTP
+            metrics.increment("spotify_skipped")
+            logger.info(f"Búsqueda de Spotify omitida: {e}")
         except Exception as e:
             logger.error(f"Error en búsqueda de Spotify: {e}")
 
@@ -184,17 +195,16 @@ def get_spotify_recommendations(emotion, secondary_emotion, sp):
         logger.error(f"Error general de Spotify: {e}")
     
     # Si algo falla, retornar respuesta por defecto
-    return {
-        "name": "No se pudo obtener canción",
-        "artist": "Intente más tarde",
-        "url": "#",
-        "preview_url": None
-    }
+    return dict(DEFAULT_SONG)
 
 def get_book_recommendation(emotion, secondary_emotion):
     """
-    Por ahora retornamos un libro hardcodeado mientras arreglamos la API.
+    Libro del catálogo local (``manage.py build_book_catalog``), sin llamadas externas.
+    Si no hay catálogo o no tiene libros para la emoción, se devuelve un aviso.
     """
+    book = recommend_book(emotion, secondary_emotion)
+    if book is not None:
+        return book
     return {
         "title": "Temporalmente no disponible",
         "author": "Intente más tarde",
@@ -238,21 +248,12 @@ def get_psychological_advice(emotion):
     return advice_mapping.get(emotion, advice_mapping["joy"])
 
 def get_emotional_trend_message(emotion):
-    """Genera un mensaje basado en el historial emocional"""
-    ultimas_entradas = EmotionalEntry.objects.all().order_by('-fecha')[:5]
-    
-    if not ultimas_entradas:
+    """Genera un mensaje basado en el historial emocional (estado incremental, sin consultas)"""
+    if not trends.has_entries():
         return None
-        
-    # Contar frecuencia de emociones
-    emociones_frecuentes = EmotionalEntry.objects.values('emocion_primaria')\
-        .annotate(total=Count('emocion_primaria'))\
-        .order_by('-total')[:1]
-    
-    emocion_mas_frecuente = emociones_frecuentes[0]['emocion_primaria'] if emociones_frecuentes else None
     
     # Obtener tendencia
-    tendencia = EmotionalEntry.get_tendencia()
+    tendencia = trends.get_tendencia()
     
     # Generar mensaje personalizado
     mensajes = {
@@ -277,6 +278,30 @@ def get_emotional_trend_message(emotion):
         return mensajes[tendencia].get(emotion, mensajes[tendencia]["default"])
     return None
 
+def save_entry_and_get_trend(texto, primary_emotion, secondary_emotion, scores):
+    """Guarda la entrada emocional y devuelve el mensaje de tendencia (o None)."""
+    with metrics.timed("guardado"):
+        # Con EMOTION_WRITE_BEHIND solo se encola; un hilo la guarda por lotes
+        save_entry(
+            texto=texto,
+            emocion_primaria=primary_emotion,
+            emocion_secundaria=secondary_emotion,
+            puntuaciones=scores
+        )
+    with metrics.timed("tendencia"):
+        return get_emotional_trend_message(primary_emotion)
+
+def overloaded_response(request):
+    """503 rápido cuando la inferencia está saturada y la política es rechazar."""
+    response = render(
+        request,
+        "core/moodmatch.html",
+        {"error": "Hay mucha demanda en este momento. Inténtalo de nuevo en unos segundos."},
+        status=503,
+    )
+    response["Retry-After"] = "5"
+    return response
+
 def mood_match(request):
     # Inicializar contexto vacío para peticiones GET
     if request.method == "GET":
@@ -291,21 +316,15 @@ def mood_match(request):
         try:
             texto = validate_text(texto)
             try:
-                primary_emotion, secondary_emotion = get_emotion(texto)
-                context["is_fallback"] = False
+                with metrics.timed("clasificacion"):
+                    primary_emotion, secondary_emotion, scores = get_emotion(texto)
             except requests.exceptions.RequestException:
                 primary_emotion, secondary_emotion = fallback_emotion_analysis(texto)
-                context["is_fallback"] = True
+                scores = None
+            context["is_fallback"] = scores is None
 
-            # Guardar entrada emocional
-            EmotionalEntry.objects.create(
-                texto=texto,
-                emocion_primaria=primary_emotion,
-                emocion_secundaria=secondary_emotion
-            )
-
-            # Obtener mensaje de tendencia
-            trend_message = get_emotional_trend_message(primary_emotion)
+            # Guardar entrada emocional y obtener mensaje de tendencia
+            trend_message = save_entry_and_get_trend(texto, primary_emotion, secondary_emotion, scores)
             if trend_message:
                 context["trend_message"] = trend_message
 
@@ -313,20 +332,16 @@ def mood_match(request):
             psychological_advice = get_psychological_advice(primary_emotion)
             context["advice"] = psychological_advice
 
-            # SPOTIFY
-            spotify_id = os.getenv("SPOTIPY_CLIENT_ID")
-            spotify_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
-            
-            if not all([spotify_id, spotify_secret]):
-                raise ValueError("Credenciales de Spotify no configuradas")
+            if getattr(settings, "MOODMATCH_DEFERRED_RECOMMENDATIONS", True):
+                # La página pide canción y libro a /api/recommendations/ tras mostrar el análisis
+                context["deferred_recommendations"] = True
+            else:
+                # SPOTIFY
+                sp = get_spotify_client()
 
-            sp = Spotify(auth_manager=SpotifyClientCredentials(
-                client_id=spotify_id,
-                client_secret=spotify_secret
-            ))
-            
-            context["song"] = get_spotify_recommendations(primary_emotion, secondary_emotion, sp)
-            context["book"] = get_book_recommendation(primary_emotion, secondary_emotion)
+                context["song"] = get_spotify_recommendations(primary_emotion, secondary_emotion, sp)
+                with metrics.timed("libro"):
+                    context["book"] = get_book_recommendation(primary_emotion, secondary_emotion)
             
             context["emotion"] = primary_emotion
             context["secondary_emotion"] = secondary_emotion
@@ -335,6 +350,8 @@ def mood_match(request):
         except ValidationError as e:
             logger.warning(f"Error de validación: {str(e)}")
             context["error"] = str(e)
+        except Overloaded:
+            return overloaded_response(request)
         except ValueError as e:
             logger.error(f"Error de configuración: {str(e)}")
             context["error"] = f"Error de configuración: {str(e)}"
@@ -342,5 +359,6 @@ def mood_match(request):
             logger.exception("Error inesperado")
             context["error"] = "Lo sentimos, ha ocurrido un error inesperado"
 
-    return render(request, "core/moodmatch.html", context)
+    with metrics.timed("plantilla"):
+        return render(request, "core/moodmatch.html", context)
         
\ No newline at end of file
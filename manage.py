@@ -7,6 +7,9 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moodmatch_project.settings")
+    # Los comandos de administración no precargan el modelo; runserver sí, porque atiende tráfico
+    if sys.argv[1:2] != ["runserver"]:
+        os.environ["EMOTION_WARMUP_ON_STARTUP"] = "false"
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.server_timing_middleware",
+    "core.circuit_breaker.request_deadline_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -142,6 +144,109 @@ SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 HF_TOKEN = os.getenv("HF_TOKEN")
 
+# Cliente de Spotify compartido: timeouts, pool de conexiones y renovación del token
+SPOTIFY_REQUEST_TIMEOUT = env.float("SPOTIFY_REQUEST_TIMEOUT", default=5.0)
+SPOTIFY_POOL_SIZE = env.int("SPOTIFY_POOL_SIZE", default=10)
+SPOTIFY_TOKEN_REFRESH_MARGIN = env.int("SPOTIFY_TOKEN_REFRESH_MARGIN", default=300)
+
+# Pools de canciones por emoción (manage.py refresh_track_pool)
+SPOTIFY_TRACK_POOL_MAX_AGE = env.int("SPOTIFY_TRACK_POOL_MAX_AGE", default=6 * 3600)
+SPOTIFY_TRACK_POOL_LOCAL_TTL = env.int("SPOTIFY_TRACK_POOL_LOCAL_TTL", default=60)
+
+# URLs de la API de Spotify; vacías usan las oficiales (los benchmarks apuntan a un servidor local)
+SPOTIFY_API_PREFIX = env("SPOTIFY_API_PREFIX", default="")
+SPOTIFY_TOKEN_URL = env("SPOTIFY_TOKEN_URL", default="")
+
+# Cortocircuito de Spotify: fallos seguidos para abrirlo y segundos hasta la llamada de prueba
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = env.int("CIRCUIT_BREAKER_FAILURE_THRESHOLD", default=5)
+CIRCUIT_BREAKER_RESET_TIMEOUT = env.float("CIRCUIT_BREAKER_RESET_TIMEOUT", default=30.0)
+# Presupuesto de tiempo por petición para las llamadas externas (0 = sin plazo) y mínimo para intentar una
+MOODMATCH_REQUEST_BUDGET = env.float("MOODMATCH_REQUEST_BUDGET", default=4.0)
+MOODMATCH_MIN_CALL_TIMEOUT = env.float("MOODMATCH_MIN_CALL_TIMEOUT", default=0.1)
+
+# Catálogo local de libros por emoción (manage.py build_book_catalog) y cada cuántos segundos se comprueba si cambió
+BOOK_CATALOG_PATH = env("BOOK_CATALOG_PATH", default=str(BASE_DIR / "book_catalog.json"))
+BOOK_CATALOG_CHECK_INTERVAL = env.int("BOOK_CATALOG_CHECK_INTERVAL", default=60)
+
+# Análisis de emociones: backend del clasificador ("pytorch", "onnx" o "remote")
+EMOTION_BACKEND = env("EMOTION_BACKEND", default="pytorch")
+EMOTION_MODEL_NAME = env("EMOTION_MODEL_NAME", default="pysentimiento/robertuito-emotion-analysis")
+EMOTION_ONNX_MODEL_DIR = env("EMOTION_ONNX_MODEL_DIR", default=str(BASE_DIR / "onnx_model"))
+EMOTION_ONNX_QUANTIZED = env.bool("EMOTION_ONNX_QUANTIZED", default=True)
+# Hilos intra-op de ONNX Runtime; 0 usa el mismo reparto por worker que torch
+EMOTION_ONNX_THREADS = env.int("EMOTION_ONNX_THREADS", default=0)
+
+# Servidor local de inferencia (manage.py runmodelserver) para EMOTION_BACKEND="remote"
+EMOTION_SERVER_SOCKET = env("EMOTION_SERVER_SOCKET", default="/tmp/moodmatch-model.sock")
+EMOTION_SERVER_BACKEND = env("EMOTION_SERVER_BACKEND", default="pytorch")
+EMOTION_SERVER_TIMEOUT = env.float("EMOTION_SERVER_TIMEOUT", default=2.0)
+# Hilos de cómputo del servidor; 0 usa todos los núcleos (un solo proceso atiende a todos los workers)
+EMOTION_SERVER_THREADS = env.int("EMOTION_SERVER_THREADS", default=0)
+
+# Cargar el modelo al arrancar el proceso en lugar de en la primera petición.
+# Activar solo en los workers web; manage.py lo desactiva en todos los comandos salvo runserver
+# y, con autorecarga, solo precarga el proceso hijo que atiende peticiones.
+EMOTION_WARMUP_ON_STARTUP = env.bool("EMOTION_WARMUP_ON_STARTUP", default=False)
+
+# Análisis de emociones: micro-batching de la inferencia
+EMOTION_BATCHING = env.bool("EMOTION_BATCHING", default=True)
+EMOTION_BATCH_MAX_SIZE = env.int("EMOTION_BATCH_MAX_SIZE", default=8)
+EMOTION_BATCH_MAX_WAIT_MS = env.float("EMOTION_BATCH_MAX_WAIT_MS", default=10.0)
+
+# Caché de resultados de emociones: LRU en proceso + caché de Django.
+# Para compartirla entre workers use un backend compartido, p. ej.
+# CACHE_URL=rediscache://127.0.0.1:6379/1 (obligatorio para manage.py refresh_track_pool)
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+EMOTION_CACHE_ENABLED = env.bool("EMOTION_CACHE_ENABLED", default=True)
+EMOTION_CACHE_MAX_ENTRIES = env.int("EMOTION_CACHE_MAX_ENTRIES", default=1024)
+EMOTION_CACHE_TIMEOUT = env.int("EMOTION_CACHE_TIMEOUT", default=86400)
+
+# Canción y libro en una petición aparte (/api/recommendations/) tras mostrar el análisis
+MOODMATCH_DEFERRED_RECOMMENDATIONS = env.bool("MOODMATCH_DEFERRED_RECOMMENDATIONS", default=True)
+
+# Vista asíncrona de mood_match (solo con ASGI) y timeouts por etapa, en segundos
+MOODMATCH_ASYNC_VIEW = env.bool("MOODMATCH_ASYNC_VIEW", default=False)
+EMOTION_INFERENCE_WORKERS = env.int("EMOTION_INFERENCE_WORKERS", default=2)
+MOODMATCH_INFERENCE_TIMEOUT = env.float("MOODMATCH_INFERENCE_TIMEOUT", default=5.0)
+MOODMATCH_DB_TIMEOUT = env.float("MOODMATCH_DB_TIMEOUT", default=3.0)
+MOODMATCH_RECOMMENDATION_TIMEOUT = env.float("MOODMATCH_RECOMMENDATION_TIMEOUT", default=3.0)
+
+# Métricas: últimas muestras por etapa para los percentiles y token de /metrics
+# (sin token, /metrics solo responde a usuarios de staff)
+MOODMATCH_METRICS_RESERVOIR_SIZE = env.int("MOODMATCH_METRICS_RESERVOIR_SIZE", default=1024)
+MOODMATCH_METRICS_TOKEN = env("MOODMATCH_METRICS_TOKEN", default="")
+
+# Control de admisión de la inferencia (pasadas del modelo simultáneas por proceso) y política ante saturación:
+# "fallback" usa el análisis por palabras clave, "reject" responde 503
+EMOTION_ADMISSION_CONTROL = env.bool("EMOTION_ADMISSION_CONTROL", default=True)
+EMOTION_MAX_CONCURRENCY = env.int("EMOTION_MAX_CONCURRENCY", default=2)
+EMOTION_ADMISSION_QUEUE = env.int("EMOTION_ADMISSION_QUEUE", default=16)
+EMOTION_ADMISSION_WAIT_MS = env.int("EMOTION_ADMISSION_WAIT_MS", default=200)
+EMOTION_OVERLOAD_POLICY = env("EMOTION_OVERLOAD_POLICY", default="fallback")
+# Hilos de torch por worker; 0 reparte los núcleos entre WEB_CONCURRENCY workers
+EMOTION_TORCH_THREADS = env.int("EMOTION_TORCH_THREADS", default=0)
+WEB_CONCURRENCY = env.int("WEB_CONCURRENCY", default=1)
+
+# Escritura diferida de entradas (cola acotada + hilo que guarda por lotes)
+EMOTION_WRITE_BEHIND = env.bool("EMOTION_WRITE_BEHIND", default=False)
+EMOTION_WRITE_BEHIND_MAX_QUEUE = env.int("EMOTION_WRITE_BEHIND_MAX_QUEUE", default=10000)
+EMOTION_WRITE_BEHIND_BATCH_SIZE = env.int("EMOTION_WRITE_BEHIND_BATCH_SIZE", default=200)
+EMOTION_WRITE_BEHIND_FLUSH_INTERVAL = env.float("EMOTION_WRITE_BEHIND_FLUSH_INTERVAL", default=1.0)
+
+# SQLite: modo WAL (lectores y escritor concurrentes) y espera ante bloqueos
+SQLITE_WAL = env.bool("SQLITE_WAL", default=True)
+SQLITE_BUSY_TIMEOUT_MS = env.int("SQLITE_BUSY_TIMEOUT_MS", default=5000)
+
+# API JSON de análisis por lotes: máximo de textos por petición
+EMOTION_API_MAX_TEXTS = env.int("EMOTION_API_MAX_TEXTS", default=100)
+
+# Estado incremental de la tendencia emocional (se reconstruye al caducar). Solo se usa
+# con una caché compartida o un único worker; si no, la tendencia se consulta en la base de datos
+EMOTION_TREND_STATE_TIMEOUT = env.int("EMOTION_TREND_STATE_TIMEOUT", default=3600)
+
+# Léxico externo para el análisis fallback (JSON o CSV palabra,emoción)
+EMOTION_LEXICON_PATH = env("EMOTION_LEXICON_PATH", default=None)
+
 # Configuración de logging
 LOGGING = {
     'version': 1,